@@ -6,7 +6,7 @@ from pathlib import Path
 # Add the project root to the Python path
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
-from models import Base
+from models import MIGRATION_ONLY_INDEXES, Base
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
@@ -14,14 +14,13 @@ from sqlalchemy import pool
 from alembic import context
 
 
-from settings import settings
+from database import make_database_url
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
 # Set the database URL from settings
-db_url = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
-config.set_main_option("sqlalchemy.url", db_url)
+config.set_main_option("sqlalchemy.url", make_database_url())
 
 
 # Interpret the config file for Python logging.
@@ -35,6 +34,12 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    # their definition depends on -x arguments of the migration that built them
+    return not (type_ == "index" and name in MIGRATION_ONLY_INDEXES)
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -57,6 +62,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -80,7 +86,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
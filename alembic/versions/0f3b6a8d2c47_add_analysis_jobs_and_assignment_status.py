@@ -0,0 +1,56 @@
+"""Add analysis_jobs queue and assignments.status
+
+Revision ID: 0f3b6a8d2c47
+Revises: d5a7e3b1c9f2
+Create Date: 2026-10-17 13:41:07.915620
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0f3b6a8d2c47'
+down_revision: Union[str, Sequence[str], None] = 'd5a7e3b1c9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('assignments', sa.Column('status', sa.Text(), nullable=True))
+    op.execute(
+        "UPDATE assignments SET status = 'completed' "
+        "WHERE id IN (SELECT assignment_id FROM analysis_results)"
+    )
+
+    op.create_table('analysis_jobs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('assignment_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Text(), server_default='queued', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('locked_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('email', sa.Text(), nullable=False),
+    sa.Column('file_path', sa.Text(), nullable=True),
+    sa.Column('filename', sa.Text(), nullable=True),
+    sa.Column('content_type', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['assignment_id'], ['assignments.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_analysis_jobs_assignment_id', 'analysis_jobs', ['assignment_id'], unique=False)
+    op.create_index('ix_analysis_jobs_status_run_after', 'analysis_jobs', ['status', 'run_after'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_analysis_jobs_status_run_after', table_name='analysis_jobs')
+    op.drop_index('ix_analysis_jobs_assignment_id', table_name='analysis_jobs')
+    op.drop_table('analysis_jobs')
+    op.drop_column('assignments', 'status')
@@ -0,0 +1,46 @@
+"""Add MinHash signatures and LSH buckets for plagiarism detection
+
+Revision ID: 3a9c5e1f7b20
+Revises: 0f3b6a8d2c47
+Create Date: 2026-10-17 15:02:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9c5e1f7b20'
+down_revision: Union[str, Sequence[str], None] = '0f3b6a8d2c47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('source_signatures',
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('window_index', sa.Integer(), nullable=False),
+    sa.Column('signature', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['source_id'], ['academic_sources.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('source_id', 'window_index')
+    )
+    op.create_table('source_lsh_buckets',
+    sa.Column('band', sa.SmallInteger(), nullable=False),
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('window_index', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['source_id'], ['academic_sources.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('band', 'bucket', 'source_id', 'window_index')
+    )
+    op.create_index('ix_source_lsh_buckets_source_id', 'source_lsh_buckets', ['source_id'], unique=False)
+    # existing sources are indexed with `python plagiarism.py --rebuild`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_source_lsh_buckets_source_id', table_name='source_lsh_buckets')
+    op.drop_table('source_lsh_buckets')
+    op.drop_table('source_signatures')
@@ -0,0 +1,50 @@
+"""Add source_chunks table for passage retrieval
+
+Revision ID: 6e2f8b4d1a93
+Revises: 3a9c5e1f7b20
+Create Date: 2026-10-17 16:21:09.734512
+
+Existing sources are chunked and embedded with `python ingest_data.py --rechunk`.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import pgvector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e2f8b4d1a93'
+down_revision: Union[str, Sequence[str], None] = '3a9c5e1f7b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('source_chunks',
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('chunk_index', sa.Integer(), nullable=False),
+    sa.Column('start_char', sa.Integer(), nullable=False),
+    sa.Column('end_char', sa.Integer(), nullable=False),
+    sa.Column('token_count', sa.Integer(), nullable=False),
+    sa.Column('embedding', pgvector.sqlalchemy.vector.VECTOR(dim=1536), nullable=False),
+    sa.ForeignKeyConstraint(['source_id'], ['academic_sources.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('source_id', 'chunk_index')
+    )
+    op.create_index(
+        'ix_source_chunks_embedding',
+        'source_chunks',
+        ['embedding'],
+        unique=False,
+        postgresql_using='hnsw',
+        postgresql_with={'m': 16, 'ef_construction': 64},
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_source_chunks_embedding', table_name='source_chunks')
+    op.drop_table('source_chunks')
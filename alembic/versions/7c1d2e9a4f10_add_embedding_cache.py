@@ -0,0 +1,36 @@
+"""Add embedding_cache table
+
+Revision ID: 7c1d2e9a4f10
+Revises: 4356eba0249a
+Create Date: 2026-10-17 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import pgvector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1d2e9a4f10'
+down_revision: Union[str, Sequence[str], None] = '4356eba0249a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('embedding_cache',
+    sa.Column('key', sa.Text(), nullable=False),
+    sa.Column('model', sa.Text(), nullable=False),
+    sa.Column('dimension', sa.Integer(), nullable=False),
+    sa.Column('embedding', pgvector.sqlalchemy.vector.VECTOR(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('embedding_cache')
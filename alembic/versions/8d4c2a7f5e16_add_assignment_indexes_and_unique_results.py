@@ -0,0 +1,38 @@
+"""Add assignment listing index and unique analysis_results.assignment_id
+
+Revision ID: 8d4c2a7f5e16
+Revises: 6e2f8b4d1a93
+Create Date: 2026-10-17 17:48:22.406153
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d4c2a7f5e16'
+down_revision: Union[str, Sequence[str], None] = '6e2f8b4d1a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # id breaks ties between uploads with the same timestamp, see GET /assignments
+    op.create_index(
+        'ix_assignments_student_id_uploaded_at', 'assignments', ['student_id', 'uploaded_at', 'id'], unique=False
+    )
+
+    # duplicate n8n callbacks left several results per assignment, keep the latest one
+    op.execute(
+        "DELETE FROM analysis_results a USING analysis_results b "
+        "WHERE a.assignment_id = b.assignment_id AND a.id < b.id"
+    )
+    op.create_index('ix_analysis_results_assignment_id', 'analysis_results', ['assignment_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_analysis_results_assignment_id', table_name='analysis_results')
+    op.drop_index('ix_assignments_student_id_uploaded_at', table_name='assignments')
@@ -0,0 +1,49 @@
+"""Replace the MinHash signatures of sources with their shingle hashes
+
+Revision ID: 9e4a6c2d8b15
+Revises: f2b9d4e7a358
+Create Date: 2026-10-18 09:41:07.562918
+
+Candidates of the LSH lookup are verified by exact shingle overlap, which needs
+the shingle hashes of a source, not its MinHash signatures (the band buckets in
+source_lsh_buckets are all a lookup reads). Storing the hashes spares every
+plagiarism check the re-tokenization of each candidate's full text. Fill the new
+table with `python plagiarism.py --rebuild`; until then candidates without
+stored hashes are fingerprinted from their text.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4a6c2d8b15'
+down_revision: Union[str, Sequence[str], None] = 'f2b9d4e7a358'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('source_shingles',
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('hashes', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['source_id'], ['academic_sources.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('source_id')
+    )
+    op.drop_table('source_signatures')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # the signatures are not recomputed, run `python plagiarism.py --rebuild` on the old code
+    op.create_table('source_signatures',
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('window_index', sa.Integer(), nullable=False),
+    sa.Column('signature', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['source_id'], ['academic_sources.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('source_id', 'window_index')
+    )
+    op.drop_table('source_shingles')
@@ -0,0 +1,50 @@
+"""Add generated search_vector with a GIN index to academic_sources
+
+Revision ID: a17e5c3b9d42
+Revises: 8d4c2a7f5e16
+Create Date: 2026-10-17 18:37:51.092634
+
+Adding the stored generated column rewrites academic_sources, the GIN index is
+then built without blocking writes.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a17e5c3b9d42'
+down_revision: Union[str, Sequence[str], None] = '8d4c2a7f5e16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# same expression as models.SEARCH_VECTOR_EXPRESSION at the time of this revision
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(authors, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(abstract, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(full_text, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'academic_sources',
+        sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True), nullable=True),
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_academic_sources_search_vector "
+            "ON academic_sources USING gin (search_vector)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_academic_sources_search_vector")
+    op.drop_column('academic_sources', 'search_vector')
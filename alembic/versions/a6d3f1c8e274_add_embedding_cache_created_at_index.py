@@ -0,0 +1,36 @@
+"""Index embedding_cache.created_at for expiry and pruning
+
+Revision ID: a6d3f1c8e274
+Revises: 9e4a6c2d8b15
+Create Date: 2026-10-18 10:26:53.184027
+
+Lookups skip rows older than EMBEDDING_CACHE_PERSIST_TTL_SECONDS and the pruning
+job (`python embedding_cache.py --prune`) deletes them and all but the newest
+EMBEDDING_CACHE_PERSIST_MAX_ROWS rows, both by created_at.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d3f1c8e274'
+down_revision: Union[str, Sequence[str], None] = '9e4a6c2d8b15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = 'ix_embedding_cache_created_at'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # build without blocking cache writes on a large table
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON embedding_cache (created_at)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
@@ -0,0 +1,62 @@
+"""Add ANN index on academic_sources.embedding
+
+Revision ID: b84f0c2d6e31
+Revises: 7c1d2e9a4f10
+Create Date: 2026-10-17 10:03:18.227415
+
+The index type and operator class can be chosen at upgrade time:
+
+    alembic -x vector_index=ivfflat -x vector_metric=cosine -x ivfflat_lists=100 upgrade head
+
+`vector_metric` must match the metric used by `rag_service.find_relevant_sources`
+(cosine by default), otherwise Postgres falls back to a sequential scan.
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b84f0c2d6e31'
+down_revision: Union[str, Sequence[str], None] = '7c1d2e9a4f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = 'ix_academic_sources_embedding'
+OPERATOR_CLASSES = {
+    'cosine': 'vector_cosine_ops',
+    'l2': 'vector_l2_ops',
+    'inner_product': 'vector_ip_ops',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    x_args = context.get_x_argument(as_dictionary=True)
+    index_type = x_args.get('vector_index', 'hnsw')
+    metric = x_args.get('vector_metric', 'cosine')
+    if index_type not in ('hnsw', 'ivfflat'):
+        raise ValueError(f"vector_index must be 'hnsw' or 'ivfflat', got {index_type!r}")
+    if metric not in OPERATOR_CLASSES:
+        raise ValueError(f"vector_metric must be one of {sorted(OPERATOR_CLASSES)}, got {metric!r}")
+
+    if index_type == 'hnsw':
+        with_options = f"m = {int(x_args.get('hnsw_m', 16))}, ef_construction = {int(x_args.get('hnsw_ef_construction', 64))}"
+    else:
+        # pgvector recommends rows / 1000 lists up to 1M rows
+        with_options = f"lists = {int(x_args.get('ivfflat_lists', 100))}"
+
+    # build without blocking writes on an existing corpus
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} "
+            f"ON academic_sources USING {index_type} (embedding {OPERATOR_CLASSES[metric]}) "
+            f"WITH ({with_options})"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
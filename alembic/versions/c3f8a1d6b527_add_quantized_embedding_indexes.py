@@ -0,0 +1,61 @@
+"""Add halfvec and binary quantized HNSW indexes on academic_sources.embedding
+
+Revision ID: c3f8a1d6b527
+Revises: a17e5c3b9d42
+Create Date: 2026-10-17 21:12:40.518306
+
+The quantized vectors are index expressions, only the indexes store them. Either
+index can be skipped at upgrade time:
+
+    alembic -x quantized_indexes=binary upgrade head
+
+Requires pgvector 0.7 or later (halfvec, binary_quantize).
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8a1d6b527'
+down_revision: Union[str, Sequence[str], None] = 'a17e5c3b9d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# same expressions as models.halfvec_embedding / models.binary_embedding
+INDEXES = {
+    'halfvec': (
+        'ix_academic_sources_embedding_halfvec',
+        '(embedding::halfvec(1536)) halfvec_cosine_ops',
+    ),
+    'binary': (
+        'ix_academic_sources_embedding_binary',
+        '(binary_quantize(embedding)::bit(1536)) bit_hamming_ops',
+    ),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    x_args = context.get_x_argument(as_dictionary=True)
+    selected = [name for name in x_args.get('quantized_indexes', 'halfvec,binary').split(',') if name]
+    unknown = set(selected) - set(INDEXES)
+    if unknown:
+        raise ValueError(f"quantized_indexes must be a subset of {sorted(INDEXES)}, got {sorted(unknown)}")
+
+    # build without blocking writes on an existing corpus
+    with op.get_context().autocommit_block():
+        for name in selected:
+            index_name, expression = INDEXES[name]
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                f"ON academic_sources USING hnsw ({expression}) WITH (m = 16, ef_construction = 64)"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for index_name, _ in INDEXES.values():
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
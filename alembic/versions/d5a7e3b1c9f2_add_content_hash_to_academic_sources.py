@@ -0,0 +1,67 @@
+"""Add content_hash to academic_sources
+
+Revision ID: d5a7e3b1c9f2
+Revises: b84f0c2d6e31
+Create Date: 2026-10-17 11:26:54.871302
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a7e3b1c9f2'
+down_revision: Union[str, Sequence[str], None] = 'b84f0c2d6e31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def _content_hash(full_text: str) -> str:
+    # frozen copy of ingest_data.content_hash at the time of this revision
+    return hashlib.sha256(" ".join(full_text.split()).encode("utf-8")).hexdigest()
+
+
+def _backfill_content_hashes(connection) -> None:
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.text(
+                "SELECT id, full_text FROM academic_sources "
+                "WHERE id > :last_id AND full_text IS NOT NULL ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE},
+        ).all()
+        if not rows:
+            return
+        connection.execute(
+            sa.text("UPDATE academic_sources SET content_hash = :content_hash WHERE id = :id"),
+            [{"id": row.id, "content_hash": _content_hash(row.full_text)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('academic_sources', sa.Column('content_hash', sa.Text(), nullable=True))
+
+    # backfilled in Python: Postgres has no equivalent of str.split() (Unicode whitespace)
+    _backfill_content_hashes(op.get_bind())
+
+    # earlier re-runs of the ingestion inserted duplicates, keep the oldest copy
+    op.execute(
+        "DELETE FROM academic_sources a USING academic_sources b "
+        "WHERE a.content_hash = b.content_hash AND a.id > b.id"
+    )
+
+    op.create_unique_constraint('academic_sources_content_hash_key', 'academic_sources', ['content_hash'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('academic_sources_content_hash_key', 'academic_sources', type_='unique')
+    op.drop_column('academic_sources', 'content_hash')
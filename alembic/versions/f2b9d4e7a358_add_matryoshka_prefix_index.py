@@ -0,0 +1,49 @@
+"""Add HNSW index on the Matryoshka prefix of academic_sources.embedding
+
+Revision ID: f2b9d4e7a358
+Revises: c3f8a1d6b527
+Create Date: 2026-10-17 22:04:51.730194
+
+The prefix is an index expression, `subvector(embedding, 1, n)`, so existing
+sources need no backfill and new ones are indexed on insert. The dimension must
+match the MATRYOSHKA_DIMENSION setting:
+
+    alembic -x matryoshka_dimension=256 upgrade head
+
+Requires pgvector 0.7 or later (subvector).
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b9d4e7a358'
+down_revision: Union[str, Sequence[str], None] = 'c3f8a1d6b527'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = 'ix_academic_sources_embedding_prefix'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    x_args = context.get_x_argument(as_dictionary=True)
+    dimension = int(x_args.get('matryoshka_dimension', 256))
+    if not 1 <= dimension < 1536:
+        raise ValueError(f"matryoshka_dimension must be between 1 and 1535, got {dimension}")
+
+    # build without blocking writes on an existing corpus
+    with op.get_context().autocommit_block():
+        op.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON academic_sources "
+            f"USING hnsw ((subvector(embedding, 1, {dimension})::vector({dimension})) vector_cosine_ops) "
+            f"WITH (m = 16, ef_construction = 64)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
@@ -1,15 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.security.api_key import APIKeyHeader
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-import bcrypt
+import hmac
 import logging
+import time
 
+from cache import TTLCache
 from models import Student, StudentCreate, StudentLogin, Token
 from settings import settings
-from database import get_db
+from database import get_async_db
+from passwords import PasswordHasherBusy, needs_rehash, password_hasher
 
 # --- initialization ---
 auth_router = APIRouter(prefix="/auth", tags=["auth"])
@@ -27,6 +32,63 @@ AUTH_HEADER = APIKeyHeader(
 
 
 
+# --- principal cache ---
+@dataclass(frozen=True)
+class Principal:
+    """
+    Identity of an authenticated student, safe to share between requests unlike a Student row.
+    """
+    id: int
+    email: str
+    full_name: str | None
+    student_id: str | None
+
+
+# verified token signature -> (token, decoded payload), entries never outlive the token's exp
+token_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_ENTRIES, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+# email -> Principal, dropped whenever the student row changes in this process
+principal_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_ENTRIES, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def decode_token(token: str) -> dict:
+    """
+    Verifies a JWT and returns its payload, from the token cache when it was verified before.
+
+    Raises:
+        JWTError: The token is invalid or expired.
+    """
+    signature = token.rsplit(".", 1)[-1]
+    cached = token_cache.get(signature)
+    if cached is not None:
+        cached_token, payload = cached
+        # the signature is only the key, the whole token has to match
+        if hmac.compare_digest(cached_token, token) and payload["exp"] > time.time():
+            return payload
+
+    payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[ALGORITHM])
+    remaining = payload["exp"] - time.time() if "exp" in payload else settings.AUTH_CACHE_TTL_SECONDS
+    payload.setdefault("exp", time.time() + remaining)
+    token_cache.set(signature, (token, payload), ttl=min(settings.AUTH_CACHE_TTL_SECONDS, remaining))
+    return payload
+
+
+def invalidate_student(email: str):
+    principal_cache.pop(email)
+
+
+@event.listens_for(Student, "after_update")
+@event.listens_for(Student, "after_delete")
+def _invalidate_changed_student(mapper, connection, target):
+    invalidate_student(target.email)
+    # the history is still available during the flush, an email change also drops the old address
+    for email in inspect(target).attrs.email.history.deleted or ():
+        invalidate_student(email)
+
+
+def get_auth_cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "principals": principal_cache.stats()}
+
+
 # --- route dependents ---
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -53,41 +115,60 @@ def get_token(auth: str = Depends(AUTH_HEADER)):
     return auth.split(" ", 1)[1]
 
 
-def get_current_user(
-    token: str = Depends(get_token), db: Session = Depends(get_db)
-):
+async def get_current_user(
+    token: str = Depends(get_token), db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    """
+    Authenticates the bearer token. Verified tokens and student identities are cached,
+    so repeated requests (e.g. polling /analysis) do not touch the database.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(
-            token, settings.JWT_SECRET_KEY, algorithms=[ALGORITHM]
-        )
+        payload = decode_token(token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(Student).filter(Student.email == email).first()
+
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+
+    result = await db.execute(select(Student).where(Student.email == email))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal(
+        id=user.id, email=user.email, full_name=user.full_name, student_id=user.student_id
+    )
+    principal_cache.set(email, principal)
+    return principal
 
 
 # -- routes ---
+def _busy_exception(e: PasswordHasherBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+    )
+
+
 @auth_router.post("/register", response_model=Token)
-def register(student: StudentCreate, db: Session = Depends(get_db)):
+async def register(student: StudentCreate, db: AsyncSession = Depends(get_async_db)):
     # check if user with same email or student ID already exists
-    existing_user = (
-        db.query(Student)
-        .filter(
+    result = await db.execute(
+        select(Student).where(
             (Student.email == student.email)
             | (Student.student_id == student.student_id)
         )
-        .first()
     )
+    existing_user = result.scalars().first()
 
     if existing_user:
         raise HTTPException(
@@ -95,21 +176,20 @@ def register(student: StudentCreate, db: Session = Depends(get_db)):
             detail="A user with this email or student ID already exists",
         )
 
-    # hashing the password
-    salt = bcrypt.gensalt(rounds=12)
-    hashed_password = bcrypt.hashpw(
-        student.password.encode("utf-8"), salt
-    ).decode("utf-8")
+    # hashing the password, on the dedicated pool
+    try:
+        hashed_password = await password_hasher.hash(student.password)
+    except PasswordHasherBusy as e:
+        raise _busy_exception(e)
 
     db_student = Student(
         email=student.email,
-        password_hash=hashed_password,  # store the hash as text not bytes that way we decoded to utf-8
+        password_hash=hashed_password,
         full_name=student.full_name,
         student_id=student.student_id,
     )
     db.add(db_student)
-    db.commit()
-    db.refresh(db_student)
+    await db.commit()
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -119,29 +199,36 @@ def register(student: StudentCreate, db: Session = Depends(get_db)):
 
 
 @auth_router.post("/login", response_model=Token)
-def login(
+async def login(
     login_data: StudentLogin,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    logger.info(f"Login data: {login_data}")
-
-    student = (
-        db.query(Student).filter(Student.email == login_data.email).first()
-    )
-    logger.info(f"Student: {student}")
+    result = await db.execute(select(Student).where(Student.email == login_data.email))
+    student = result.scalars().first()
     if not student:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    is_password_correct = bcrypt.checkpw(
-        login_data.password.encode("utf-8"),
-        student.password_hash.encode("utf-8"),
-    )
+    try:
+        is_password_correct = await password_hasher.verify(
+            login_data.password, student.password_hash
+        )
+    except PasswordHasherBusy as e:
+        raise _busy_exception(e)
     if not is_password_correct:
+        logger.debug(f"Failed login for student {student.id}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
         )
 
+    # upgrade the stored hash when BCRYPT_ROUNDS changed, the login already succeeded
+    if needs_rehash(student.password_hash):
+        try:
+            student.password_hash = await password_hasher.hash(login_data.password)
+            await db.commit()
+        except PasswordHasherBusy:
+            logger.info(f"Skipped password rehash for student {student.id}, hashing pool is busy")
+
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": student.email}, expires_delta=access_token_expires
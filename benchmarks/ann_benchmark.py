@@ -0,0 +1,179 @@
+"""
+Recall@k and latency of the pgvector ANN index against exact search.
+
+Loads a synthetic clustered corpus into a scratch table, measures exact search
+(sequential scan), then builds an HNSW or IVFFlat index and sweeps its
+query-time parameter (`hnsw.ef_search` / `ivfflat.probes`).
+
+    python benchmarks/ann_benchmark.py --rows 20000 --index hnsw --sweep 20 40 80 160
+    python benchmarks/ann_benchmark.py --rows 20000 --index ivfflat --lists 100 --sweep 1 5 10 20
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from database import create_db_engine
+
+# index builds and exact scans on a large corpus outlive the API statement timeout
+engine = create_db_engine(name="ann_benchmark", statement_timeout_ms=0, pool_size=1)
+
+TABLE = "ann_benchmark_vectors"
+OPERATOR_CLASSES = {"cosine": "vector_cosine_ops", "l2": "vector_l2_ops"}
+OPERATORS = {"cosine": "<=>", "l2": "<->"}
+
+
+def make_corpus(rows: int, dim: int, clusters: int, seed: int):
+    """
+    Gaussian clusters around random centers, closer to real embeddings than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(corpus, queries, k: int, metric: str):
+    if metric == "cosine":
+        distances = -(queries @ corpus.T)
+    else:
+        distances = (
+            (queries ** 2).sum(axis=1, keepdims=True)
+            - 2 * queries @ corpus.T
+            + (corpus ** 2).sum(axis=1)
+        )
+    top = np.argpartition(distances, k, axis=1)[:, :k]
+    # ids in the table are 1-based
+    return [set((row + 1).tolist()) for row in top]
+
+
+def load_corpus(conn, corpus, batch_size: int = 1000):
+    dim = corpus.shape[1]
+    conn.execute(sa.text(f"DROP TABLE IF EXISTS {TABLE}"))
+    conn.execute(sa.text(f"CREATE TABLE {TABLE} (id integer PRIMARY KEY, embedding vector({dim}))"))
+    table = sa.table(TABLE, sa.column("id", sa.Integer), sa.column("embedding", Vector(dim)))
+    for start in range(0, len(corpus), batch_size):
+        batch = corpus[start:start + batch_size]
+        conn.execute(
+            sa.insert(table),
+            [{"id": start + i + 1, "embedding": vector} for i, vector in enumerate(batch)],
+        )
+    conn.execute(sa.text(f"ANALYZE {TABLE}"))
+
+
+def run_queries(conn, queries, k: int, metric: str, settings_sql: list[str]):
+    statement = sa.text(
+        f"SELECT id FROM {TABLE} ORDER BY embedding {OPERATORS[metric]} :query LIMIT :k"
+    ).bindparams(sa.bindparam("query", type_=Vector(queries.shape[1])))
+
+    results, latencies = [], []
+    for query in queries:
+        with conn.begin():
+            for sql in settings_sql:
+                conn.execute(sa.text(sql))
+            started = time.perf_counter()
+            ids = conn.execute(statement, {"query": query, "k": k}).scalars().all()
+            latencies.append((time.perf_counter() - started) * 1000)
+        results.append(set(ids))
+    return results, np.array(latencies)
+
+
+def summarize(label: str, results, truth, latencies, k: int):
+    recall = float(np.mean([len(r & t) / k for r, t in zip(results, truth)]))
+    row = {
+        "config": label,
+        f"recall@{k}": round(recall, 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+    }
+    print(f"{label:<28} recall@{k}={row[f'recall@{k}']:.4f}  p50={row['p50_ms']:.2f}ms  p95={row['p95_ms']:.2f}ms")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--metric", choices=sorted(OPERATORS), default="cosine")
+    parser.add_argument("--index", choices=["hnsw", "ivfflat"], default="hnsw")
+    parser.add_argument("--m", type=int, default=16, help="HNSW m")
+    parser.add_argument("--ef-construction", type=int, default=64, help="HNSW ef_construction")
+    parser.add_argument("--lists", type=int, default=100, help="IVFFlat lists")
+    parser.add_argument("--sweep", type=int, nargs="+", default=None,
+                        help="ef_search (hnsw) or probes (ivfflat) values to test")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch table afterwards")
+    args = parser.parse_args()
+
+    sweep = args.sweep or ([20, 40, 80, 160] if args.index == "hnsw" else [1, 5, 10, 20])
+    param = "hnsw.ef_search" if args.index == "hnsw" else "ivfflat.probes"
+
+    corpus = make_corpus(args.rows, args.dim, args.clusters, args.seed)
+    queries = make_corpus(args.queries, args.dim, args.clusters, args.seed + 1)
+    truth = exact_top_k(corpus, queries, args.k, args.metric)
+
+    report = {"args": vars(args), "results": []}
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.execute(sa.text("CREATE EXTENSION IF NOT EXISTS vector"))
+            print(f"Loading {args.rows} x {args.dim} vectors into {TABLE} ...")
+            load_corpus(conn, corpus)
+
+        try:
+            results, latencies = run_queries(
+                conn, queries, args.k, args.metric,
+                ["SET LOCAL enable_indexscan = off", "SET LOCAL enable_bitmapscan = off"],
+            )
+            report["results"].append(summarize("exact (seq scan)", results, truth, latencies, args.k))
+
+            if args.index == "hnsw":
+                with_options = f"m = {args.m}, ef_construction = {args.ef_construction}"
+            else:
+                with_options = f"lists = {args.lists}"
+            started = time.perf_counter()
+            with conn.begin():
+                conn.execute(sa.text(
+                    f"CREATE INDEX ON {TABLE} USING {args.index} "
+                    f"(embedding {OPERATOR_CLASSES[args.metric]}) WITH ({with_options})"
+                ))
+            build_seconds = time.perf_counter() - started
+            with conn.begin():
+                index_bytes = conn.execute(
+                    sa.text("SELECT pg_indexes_size(:table)"), {"table": TABLE}
+                ).scalar()
+            print(f"Built {args.index} index in {build_seconds:.1f}s ({index_bytes / 2**20:.1f} MiB)")
+            report["index"] = {"build_seconds": round(build_seconds, 2), "size_bytes": index_bytes}
+
+            for value in sweep:
+                results, latencies = run_queries(
+                    conn, queries, args.k, args.metric, [f"SET LOCAL {param} = {int(value)}"]
+                )
+                report["results"].append(
+                    summarize(f"{args.index} {param}={value}", results, truth, latencies, args.k)
+                )
+        finally:
+            if not args.keep:
+                with conn.begin():
+                    conn.execute(sa.text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Login throughput under an auth storm, and the latency other endpoints see meanwhile.
+
+Registers --users throwaway students, then fires --logins logins at --concurrency
+while a probe keeps calling `GET /` and the sync `POST /internal/analysis-results`
+(with an unknown assignment, so it only does one lookup on the threadpool). Run it
+with and without the storm to see how much the logins slow everything else down:
+
+    python benchmarks/auth_benchmark.py --url http://localhost:8000 --logins 500 --concurrency 50
+    python benchmarks/auth_benchmark.py --logins 0 --output baseline.json
+
+Rejected logins (503 from the hashing pool's admission control) are counted
+separately from errors.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import aiohttp
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+PASSWORD = "benchmark-password"
+PROBE_RESULT = {
+    "assignment_id": 0,
+    "suggested_sources": [],
+    "plagiarism_score": 0.0,
+    "research_suggestions": "",
+    "citation_recommendations": "",
+    "confidence_score": 0.0,
+    "original_text": "",
+    "topic": "",
+    "academic_level": "",
+    "word_count": 0,
+}
+
+
+def summarize(latencies: list[float]) -> dict:
+    values = np.array(latencies) if latencies else np.array([0.0])
+    return {
+        "count": len(latencies),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+async def register_users(session, url: str, count: int) -> list[str]:
+    run = uuid.uuid4().hex[:8]
+    emails = []
+    for i in range(count):
+        email = f"bench-{run}-{i}@example.com"
+        async with session.post(
+            f"{url}/auth/register",
+            json={"email": email, "password": PASSWORD, "full_name": "Benchmark", "student_id": f"B{run}{i}"},
+        ) as response:
+            await response.read()
+            if response.status == 200:
+                emails.append(email)
+    return emails
+
+
+async def run_storm(url: str, api_key: str, users: int, logins: int, concurrency: int, probe_interval: float):
+    connector = aiohttp.TCPConnector(limit=concurrency + 2)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        emails = await register_users(session, url, users)
+        if logins and not emails:
+            raise RuntimeError("Could not register any benchmark user")
+
+        semaphore = asyncio.Semaphore(concurrency)
+        login_latencies = []
+        statuses: dict[int, int] = {}
+        probes = {"root": [], "analysis_results": []}
+        storm_done = asyncio.Event()
+
+        async def one_login(i):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with session.post(
+                        f"{url}/auth/login", json={"email": emails[i % len(emails)], "password": PASSWORD}
+                    ) as response:
+                        await response.read()
+                        statuses[response.status] = statuses.get(response.status, 0) + 1
+                        if response.status == 200:
+                            login_latencies.append((time.perf_counter() - started) * 1000)
+                except aiohttp.ClientError:
+                    statuses[0] = statuses.get(0, 0) + 1
+
+        async def probe():
+            while not storm_done.is_set():
+                for name, request in (
+                    ("root", session.get(f"{url}/")),
+                    ("analysis_results", session.post(
+                        f"{url}/internal/analysis-results", json=PROBE_RESULT, headers={"X-API-Key": api_key}
+                    )),
+                ):
+                    started = time.perf_counter()
+                    async with request as response:
+                        await response.read()
+                    probes[name].append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(probe_interval)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        if logins:
+            await asyncio.gather(*(one_login(i) for i in range(logins)))
+        else:
+            await asyncio.sleep(5)  # baseline: probes only
+        elapsed = time.perf_counter() - started
+        storm_done.set()
+        await probe_task
+
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "login_throughput_rps": round(len(login_latencies) / elapsed, 2) if logins else None,
+        "login_statuses": statuses,
+        "login_latency": summarize(login_latencies),
+        "probe_latency": {name: summarize(values) for name, values in probes.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--api-key", help="Internal API key (default: settings.INTERNAL_API_KEY)")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="Seconds between probe rounds")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    api_key = args.api_key
+    if api_key is None:
+        from settings import settings
+        api_key = settings.INTERNAL_API_KEY
+
+    result = asyncio.run(
+        run_storm(args.url, api_key, args.users, args.logins, args.concurrency, args.probe_interval)
+    )
+    login = result["login_latency"]
+    print(
+        f"logins={args.logins} concurrency={args.concurrency} "
+        f"{result['login_throughput_rps']} logins/s  p50={login['p50_ms']}ms  p95={login['p95_ms']}ms  "
+        f"statuses={result['login_statuses']}"
+    )
+    for name, probe in result["probe_latency"].items():
+        print(f"probe {name:<17} n={probe['count']:<5} p50={probe['p50_ms']}ms  p95={probe['p95_ms']}ms  p99={probe['p99_ms']}ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": args.url, **result}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
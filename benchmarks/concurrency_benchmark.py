@@ -0,0 +1,111 @@
+"""
+Throughput and latency of /internal/sources under parallel load.
+
+Run it against a running backend before and after a change and compare the output:
+
+    python benchmarks/concurrency_benchmark.py --url http://localhost:8000 --requests 500 --concurrency 50
+    python benchmarks/concurrency_benchmark.py --distinct-queries --output after.json
+
+With --distinct-queries every request uses a new query string, so the embedding
+cache cannot hide the cost of the Gemini call.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import aiohttp
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+TOPICS = [
+    "machine learning in healthcare",
+    "climate change and agriculture",
+    "ethics of artificial intelligence",
+    "history of the printing press",
+    "renewable energy storage",
+]
+
+
+async def run_load(url: str, api_key: str, total: int, concurrency: int, distinct: bool):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(session, i):
+        nonlocal errors
+        query = TOPICS[i % len(TOPICS)]
+        if distinct:
+            query = f"{query} {uuid.uuid4().hex[:8]}"
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with session.get(
+                    f"{url}/internal/sources", params={"q": query}, headers={"X-API-Key": api_key}
+                ) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        return
+            except aiohttp.ClientError:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(session, i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = np.array(latencies) if latencies else np.array([0.0])
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round((total - errors) / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--api-key", help="Internal API key (default: settings.INTERNAL_API_KEY)")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--distinct-queries", action="store_true")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    api_key = args.api_key
+    if api_key is None:
+        from settings import settings
+        api_key = settings.INTERNAL_API_KEY
+
+    results = []
+    for concurrency in args.concurrency:
+        row = asyncio.run(run_load(args.url, api_key, args.requests, concurrency, args.distinct_queries))
+        print(
+            f"concurrency={concurrency:<4} {row['throughput_rps']:>8.1f} req/s  "
+            f"p50={row['p50_ms']:.1f}ms  p95={row['p95_ms']:.1f}ms  p99={row['p99_ms']:.1f}ms  "
+            f"errors={row['errors']}"
+        )
+        results.append(row)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": args.url, "distinct_queries": args.distinct_queries, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Embedding throughput of the providers in embeddings.py.
+
+Embeds the synthetic sources of generate_papers.py (or the lines of --input) with
+every --provider, for every --concurrency value, through `aembed_many` (the API
+path) and reports texts per second and the p50/p95 latency of a single call.
+Run the Gemini provider against benchmarks/stubs.py (GEMINI_BASE_URL) to measure
+the client and batching overhead without quota.
+
+    python benchmarks/embedding_benchmark.py --provider hashing gemini --texts 2000 --concurrency 1 4 16
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from embeddings import PROVIDERS, create_embedding_provider
+from generate_papers import synthetic_source
+
+
+def load_texts(args) -> list[str]:
+    if args.input:
+        with open(args.input) as f:
+            return [line.strip() for line in f if line.strip()][:args.texts]
+    return [synthetic_source(args.seed, i)["full_text"] for i in range(args.texts)]
+
+
+async def run(provider, texts: list[str], batch_size: int) -> dict:
+    latencies = []
+
+    async def one(batch):
+        started = time.perf_counter()
+        await provider.aembed_many(batch)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)))
+    elapsed = time.perf_counter() - started
+    return {
+        "texts_per_second": round(len(texts) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", nargs="+", choices=sorted(PROVIDERS), default=["hashing"])
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--input", help="Embed the lines of this file instead of synthetic sources")
+    parser.add_argument("--batch-size", type=int, default=100, help="Texts per embed_many call")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="EMBEDDING_MAX_CONCURRENCY values")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    texts = load_texts(args)
+    report = {"args": vars(args), "results": []}
+    print(f"{'provider':<10} {'concurrency':>11} {'texts/s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+    for name in args.provider:
+        for concurrency in args.concurrency:
+            provider = create_embedding_provider(name, max_concurrency=concurrency)
+            row = {"provider": name, "concurrency": concurrency, **asyncio.run(run(provider, texts, args.batch_size))}
+            report["results"].append(row)
+            print(
+                f"{name:<10} {concurrency:>11} {row['texts_per_second']:>10.1f} "
+                f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Load scenarios against a running backend, with a machine-readable results file
+and a comparison mode.
+
+Typical offline run: generate a corpus, start the stubs and a backend pointed at
+them (see benchmarks/stubs.py), ingest the sources, then run the scenarios:
+
+    python generate_papers.py --synthetic --sources 10000 --assignments 500 --output-dir /tmp/corpus
+    python ingest_data.py /tmp/corpus/sources.jsonl
+    python benchmarks/load_test.py run --corpus-dir /tmp/corpus --output before.json
+    python benchmarks/load_test.py run --corpus-dir /tmp/corpus --scenarios sources --output after.json
+    python benchmarks/load_test.py compare before.json after.json
+
+Scenarios:
+  login      POST /auth/login
+  upload     POST /upload with the PDFs of <corpus-dir>/assignments
+  sources    GET /internal/sources with synthetic topic queries
+  analysis   uploads, then long-polls GET /analysis/{id} until it is Completed or
+             Failed; reports the upload latency (`analysis_upload`), the time the
+             server held each poll (`analysis_poll_hold`) and the time from upload
+             to the finished analysis (`analysis_time_to_completion`)
+
+Every scenario reports throughput and p50/p95/p99 latency; `compare` prints the
+relative change of every metric and exits with 1 when a p95 latency regressed by
+more than --fail-on-regression percent.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import aiohttp
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_papers import SUBJECTS
+
+PASSWORD = "load-test-password"
+SCENARIOS = ["login", "upload", "sources", "analysis"]
+FINAL_STATUSES = {"Completed", "Failed"}
+COMPARED_METRICS = ["throughput_rps", "p50_ms", "p95_ms", "p99_ms", "errors"]
+# failed requests, recorded by the scenarios as status 0; ClientTimeout raises asyncio.TimeoutError
+REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class Recorder:
+    """
+    Latencies and status codes of one scenario. Failed requests (status 0 for client
+    errors and timeouts) are kept out of the percentiles, their latencies are reported
+    separately as `error_p95_ms`.
+    """
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.error_latencies: list[float] = []
+        self.statuses: dict[str, int] = {}
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def record(self, status: int, started: float, ok: bool = True):
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        latency = (time.perf_counter() - started) * 1000
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.errors += 1
+            self.error_latencies.append(latency)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def summary(self) -> dict:
+        values = np.array(self.latencies) if self.latencies else np.array([0.0])
+        return {
+            "requests": len(self.latencies) + self.errors,
+            "errors": self.errors,
+            "statuses": self.statuses,
+            "elapsed_s": round(self.elapsed, 3),
+            "throughput_rps": round(len(self.latencies) / self.elapsed, 2) if self.elapsed else 0.0,
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+            "error_p95_ms": round(float(np.percentile(self.error_latencies, 95)), 2) if self.errors else None,
+        }
+
+
+async def run_bounded(count: int, concurrency: int, one):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(i):
+        async with semaphore:
+            await one(i)
+
+    await asyncio.gather(*(bounded(i) for i in range(count)))
+
+
+# --- setup ---
+async def register_users(session, url: str, count: int) -> list[tuple[str, str]]:
+    """
+    Registers throwaway students, returns (email, access token) pairs.
+    """
+    run = uuid.uuid4().hex[:8]
+    users = []
+    for i in range(count):
+        email = f"load-{run}-{i}@example.com"
+        async with session.post(
+            f"{url}/auth/register",
+            json={"email": email, "password": PASSWORD, "full_name": "Load Test", "student_id": f"L{run}{i}"},
+        ) as response:
+            body = await response.json(content_type=None)
+            if response.status == 200:
+                users.append((email, body["access_token"]))
+    if not users:
+        raise RuntimeError("Could not register any load-test user")
+    return users
+
+
+# --- scenarios ---
+async def scenario_login(session, args, users, recorder: Recorder):
+    async def one(i):
+        email, _ = users[i % len(users)]
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{args.url}/auth/login", json={"email": email, "password": PASSWORD}) as response:
+                await response.read()
+                recorder.record(response.status, started, response.status == 200)
+        except REQUEST_ERRORS:
+            recorder.record(0, started, ok=False)
+
+    await run_bounded(args.requests, args.concurrency, one)
+
+
+async def upload_one(session, args, token: str, path: Path, recorder: Recorder) -> int | None:
+    data = aiohttp.FormData()
+    data.add_field("file", path.read_bytes(), filename=path.name, content_type="application/pdf")
+    started = time.perf_counter()
+    try:
+        async with session.post(
+            f"{args.url}/upload", data=data, headers={"Authorization": f"Bearer {token}"}
+        ) as response:
+            body = await response.json(content_type=None)
+            recorder.record(response.status, started, response.status == 200)
+            return body.get("assignment_id") if response.status == 200 else None
+    except REQUEST_ERRORS:
+        recorder.record(0, started, ok=False)
+        return None
+
+
+def assignment_files(corpus_dir: str) -> list[Path]:
+    files = sorted((Path(corpus_dir) / "assignments").glob("*.pdf"))
+    if not files:
+        raise RuntimeError(f"No assignment PDFs in {corpus_dir}/assignments, run generate_papers.py --synthetic first")
+    return files
+
+
+async def scenario_upload(session, args, users, recorder: Recorder):
+    files = assignment_files(args.corpus_dir)
+
+    async def one(i):
+        _, token = users[i % len(users)]
+        await upload_one(session, args, token, files[i % len(files)], recorder)
+
+    await run_bounded(args.requests, args.concurrency, one)
+
+
+async def scenario_sources(session, args, users, recorder: Recorder):
+    rng = random.Random(args.seed)
+    queries = [
+        f"{rng.choice(SUBJECTS)} {rng.choice(SUBJECTS)}" + (f" {uuid.uuid4().hex[:6]}" if args.distinct_queries else "")
+        for _ in range(args.requests)
+    ]
+
+    async def one(i):
+        started = time.perf_counter()
+        try:
+            async with session.get(
+                f"{args.url}/internal/sources",
+                params={"q": queries[i], "mode": args.search_mode},
+                headers={"X-API-Key": args.api_key},
+            ) as response:
+                await response.read()
+                recorder.record(response.status, started, response.status == 200)
+        except REQUEST_ERRORS:
+            recorder.record(0, started, ok=False)
+
+    await run_bounded(args.requests, args.concurrency, one)
+
+
+ANALYSIS_METRICS = ["analysis_upload", "analysis_poll_hold", "analysis_time_to_completion"]
+
+
+async def scenario_analysis(session, args, users, recorders: dict[str, Recorder]):
+    """
+    Fills the recorders of ANALYSIS_METRICS. A poll is held by the server until the
+    analysis finishes or `wait` runs out, so its latency measures the hold, not the
+    response time; the completion time is the time from the start of the upload until
+    a poll returned the finished analysis.
+    """
+    files = assignment_files(args.corpus_dir)
+    uploads, polls, completion = (recorders[name] for name in ANALYSIS_METRICS)
+
+    async def one(i):
+        _, token = users[i % len(users)]
+        uploaded = time.perf_counter()
+        assignment_id = await upload_one(session, args, token, files[i % len(files)], uploads)
+        if assignment_id is None:
+            completion.record(0, uploaded, ok=False)
+            return
+        headers = {"Authorization": f"Bearer {token}"}
+        deadline = uploaded + args.analysis_timeout
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with session.get(
+                    f"{args.url}/analysis/{assignment_id}", params={"wait": 30}, headers=headers
+                ) as response:
+                    body = await response.json(content_type=None)
+                    polls.record(response.status, started, response.status == 200)
+            except REQUEST_ERRORS:
+                polls.record(0, started, ok=False)
+                await asyncio.sleep(1)
+                continue
+            if response.status == 200 and body.get("status") in FINAL_STATUSES:
+                completion.record(200, uploaded, body["status"] == "Completed")
+                return
+        completion.record(0, uploaded, ok=False)  # timed out
+
+    await run_bounded(args.requests, args.concurrency, one)
+
+
+async def run_scenarios(args) -> dict:
+    connector = aiohttp.TCPConnector(limit=args.concurrency + 2)
+    timeout = aiohttp.ClientTimeout(total=120)
+    results = {}
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        users = await register_users(session, args.url, args.users)
+        for name in args.scenarios:
+            if name == "analysis":
+                recorders = {metric: Recorder() for metric in ANALYSIS_METRICS}
+                await scenario_analysis(session, args, users, recorders)
+            else:
+                recorders = {name: Recorder()}
+                await SCENARIO_FUNCTIONS[name](session, args, users, recorders[name])
+            for metric, recorder in recorders.items():
+                recorder.finish()
+                results[metric] = recorder.summary()
+                print_summary(metric, results[metric])
+    return results
+
+
+SCENARIO_FUNCTIONS = {
+    "login": scenario_login,
+    "upload": scenario_upload,
+    "sources": scenario_sources,
+}
+
+
+def print_summary(name: str, row: dict):
+    print(
+        f"{name:<28} {row['throughput_rps']:>8.1f} req/s  p50={row['p50_ms']:.1f}ms  "
+        f"p95={row['p95_ms']:.1f}ms  p99={row['p99_ms']:.1f}ms  errors={row['errors']}"
+    )
+
+
+# --- comparison ---
+def compare(base: dict, new: dict, fail_on_regression: float | None) -> int:
+    regressions = []
+    print(f"{'scenario':<28} {'metric':<15} {'base':>10} {'new':>10} {'change':>9}")
+    for name in sorted(set(base["scenarios"]) | set(new["scenarios"])):
+        before, after = base["scenarios"].get(name), new["scenarios"].get(name)
+        if before is None or after is None:
+            print(f"{name:<28} only in {'new' if before is None else 'base'} run")
+            continue
+        for metric in COMPARED_METRICS:
+            old_value, new_value = before[metric], after[metric]
+            change = (new_value - old_value) / old_value * 100 if old_value else float("nan")
+            print(f"{name:<28} {metric:<15} {old_value:>10} {new_value:>10} {change:>+8.1f}%")
+            if metric == "p95_ms" and fail_on_regression is not None and change > fail_on_regression:
+                regressions.append(f"{name} p95 {change:+.1f}%")
+    if regressions:
+        print("Regressions: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run load scenarios against a backend")
+    run.add_argument("--url", default="http://localhost:8000")
+    run.add_argument("--api-key", help="Internal API key (default: settings.INTERNAL_API_KEY)")
+    run.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    run.add_argument("--corpus-dir", default="/app/generated_corpus", help="Output of generate_papers.py --synthetic")
+    run.add_argument("--users", type=int, default=10)
+    run.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    run.add_argument("--concurrency", type=int, default=20)
+    run.add_argument("--search-mode", choices=["vector", "lexical", "hybrid"], default="vector")
+    run.add_argument("--distinct-queries", action="store_true", help="Defeat the embedding cache")
+    run.add_argument("--analysis-timeout", type=float, default=300.0, help="Seconds until an analysis counts as failed")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--output", help="Write results as JSON to this path")
+
+    diff = commands.add_parser("compare", help="Compare two results files")
+    diff.add_argument("base")
+    diff.add_argument("new")
+    diff.add_argument("--fail-on-regression", type=float, help="Exit with 1 if a p95 grew by more than this percent")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.base) as f, open(args.new) as g:
+            sys.exit(compare(json.load(f), json.load(g), args.fail_on_regression))
+
+    if args.api_key is None:
+        from settings import settings
+        args.api_key = settings.INTERNAL_API_KEY
+
+    started_at = datetime.now(tz=timezone.utc).isoformat()
+    scenarios = asyncio.run(run_scenarios(args))
+    if args.output:
+        meta = {key: value for key, value in vars(args).items() if key not in ("api_key", "command")}
+        with open(args.output, "w") as f:
+            json.dump({"started_at": started_at, "args": meta, "scenarios": scenarios}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Two-tier Matryoshka search against 1536-d-only search.
+
+Builds the full HNSW index and the prefix index used by `rag_service.nearest_sources`
+(`subvector(embedding, 1, --prefix-dim)`) on a scratch table, then reports both
+index sizes and recall@k and latency of: the full index, the prefix index alone,
+and the prefix index re-ranked with the full vectors for every --candidates value.
+
+Random clustered vectors carry no Matryoshka structure, so the synthetic corpus
+concentrates its variance in the leading dimensions (--decay). `--from-db` uses
+the real embeddings of academic_sources instead, holding --queries of them out
+as queries.
+
+    python benchmarks/matryoshka_benchmark.py --rows 50000 --prefix-dim 256 --candidates 50 100 200
+    python benchmarks/matryoshka_benchmark.py --from-db --prefix-dim 128 256 512
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import sqlalchemy as sa
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ann_benchmark import TABLE, engine, exact_top_k, load_corpus, summarize
+from quantization_benchmark import build_index, run_queries
+
+
+def make_matryoshka_corpus(rows: int, dim: int, clusters: int, decay: float, seed: int):
+    """
+    Clustered vectors whose per-dimension scale falls off as (1 + i / 64) ** -decay.
+    """
+    rng = np.random.default_rng(seed)
+    scale = ((1 + np.arange(dim) / 64) ** -decay).astype(np.float32)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    vectors = (centers[labels] + 0.35 * rng.standard_normal((rows, dim)).astype(np.float32)) * scale
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_source_embeddings(rows: int, queries: int, seed: int):
+    with engine.connect() as conn:
+        embeddings = conn.execute(
+            sa.text(
+                "SELECT CAST(embedding AS real[]) FROM academic_sources "
+                "WHERE embedding IS NOT NULL ORDER BY id LIMIT :limit"
+            ),
+            {"limit": rows + queries},
+        ).scalars().all()
+    if len(embeddings) <= queries:
+        raise RuntimeError(f"academic_sources has only {len(embeddings)} embeddings")
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    order = np.random.default_rng(seed).permutation(len(vectors))
+    return vectors[order[queries:]], vectors[order[:queries]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--prefix-dim", type=int, nargs="+", default=[256])
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--decay", type=float, default=1.0, help="Per-dimension variance falloff of the synthetic corpus")
+    parser.add_argument("--from-db", action="store_true", help="Use the embeddings of academic_sources")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[50, 100, 200],
+                        help="Prefix candidates re-ranked with the full vectors")
+    parser.add_argument("--ef-search", type=int, default=40, help="HNSW ef_search (raised to the candidates)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.from_db:
+        corpus, queries = load_source_embeddings(args.rows, args.queries, args.seed)
+    else:
+        vectors = make_matryoshka_corpus(args.rows + args.queries, args.dim, args.clusters, args.decay, args.seed)
+        corpus, queries = vectors[:args.rows], vectors[args.rows:]
+    dim = corpus.shape[1]
+    truth = exact_top_k(corpus / np.linalg.norm(corpus, axis=1, keepdims=True), queries, args.k, "cosine")
+
+    report = {"args": vars(args), "indexes": {}, "results": []}
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.execute(sa.text("CREATE EXTENSION IF NOT EXISTS vector"))
+            print(f"Loading {len(corpus)} x {dim} vectors into {TABLE} ...")
+            load_corpus(conn, corpus)
+        try:
+            report["indexes"]["vector"] = build_index(conn, f"{TABLE}_vector", "embedding vector_cosine_ops")
+            full = sa.text(f"SELECT id FROM {TABLE} ORDER BY embedding <=> :query LIMIT :k")
+            results, latencies = run_queries(conn, full, queries, {"k": args.k}, args.ef_search)
+            report["results"].append(summarize(f"{dim}-d ef_search={args.ef_search}", results, truth, latencies, args.k))
+
+            for prefix_dim in args.prefix_dim:
+                prefix = f"subvector(embedding, 1, {prefix_dim})::vector({prefix_dim})"
+                query_prefix = f"subvector(CAST(:query AS vector), 1, {prefix_dim})::vector({prefix_dim})"
+                report["indexes"][f"prefix_{prefix_dim}"] = build_index(
+                    conn, f"{TABLE}_prefix_{prefix_dim}", f"({prefix}) vector_cosine_ops"
+                )
+
+                coarse_only = sa.text(f"SELECT id FROM {TABLE} ORDER BY {prefix} <=> {query_prefix} LIMIT :k")
+                results, latencies = run_queries(conn, coarse_only, queries, {"k": args.k}, args.ef_search)
+                report["results"].append(
+                    summarize(f"{prefix_dim}-d only", results, truth, latencies, args.k)
+                )
+
+                two_tier = sa.text(
+                    f"SELECT id FROM (SELECT id, embedding FROM {TABLE} "
+                    f"ORDER BY {prefix} <=> {query_prefix} LIMIT :candidates) AS c "
+                    f"ORDER BY embedding <=> :query LIMIT :k"
+                )
+                for candidates in args.candidates:
+                    results, latencies = run_queries(
+                        conn, two_tier, queries, {"k": args.k, "candidates": candidates},
+                        max(args.ef_search, candidates),
+                    )
+                    report["results"].append(
+                        summarize(f"{prefix_dim}-d rerank {candidates}", results, truth, latencies, args.k)
+                    )
+                # only one prefix index at a time, so the planner cannot pick another one
+                with conn.begin():
+                    conn.execute(sa.text(f"DROP INDEX {TABLE}_prefix_{prefix_dim}"))
+        finally:
+            with conn.begin():
+                conn.execute(sa.text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
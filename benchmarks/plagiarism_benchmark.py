@@ -0,0 +1,150 @@
+"""
+Accuracy and throughput of the local MinHash/LSH plagiarism detector.
+
+Accuracy: indexes the sample sources and scores the PDFs in generated_papers/,
+files named `plagiarized_*` must score at or above --threshold and every other
+file below it (exit code 1 otherwise).
+
+Throughput: grows a synthetic corpus through the --sizes steps and reports indexing
+and scoring speed in documents per second, plus the recall of planted copies.
+Both parts use the in-memory index, which shares shingling, banding and exact
+verification with the persisted one; the database adds one indexed bucket lookup.
+
+    python benchmarks/plagiarism_benchmark.py
+    python benchmarks/plagiarism_benchmark.py --sizes 1000 10000 50000 --queries 200 --output plagiarism.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from extraction import PDF_MIME_TYPE, extract_text
+from plagiarism import InMemoryLSHIndex
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def check_accuracy(sources_path: Path, papers_dir: Path, threshold: float) -> dict:
+    index = InMemoryLSHIndex()
+    with open(sources_path) as f:
+        for source_id, source in enumerate(json.load(f), start=1):
+            index.add(source_id, source.get("title"), source.get("full_text") or "")
+
+    results = []
+    for path in sorted(papers_dir.glob("*.pdf")):
+        text, _ = extract_text(str(path), PDF_MIME_TYPE)
+        report = index.detect(text)
+        expected = path.name.startswith("plagiarized_")
+        detected = report.score >= threshold
+        results.append({
+            "file": path.name,
+            "score": report.score,
+            "expected_plagiarized": expected,
+            "correct": expected == detected,
+            "matches": [{"source_id": m.source_id, "similarity": m.similarity} for m in report.matches],
+        })
+        print(f"{'ok  ' if expected == detected else 'FAIL'} {report.score:.3f} {path.name}")
+    return {"threshold": threshold, "papers": results, "passed": all(r["correct"] for r in results)}
+
+
+def make_document(rng, vocabulary, words: int) -> str:
+    # Zipf-like word frequencies, so shingles collide roughly as often as in real prose
+    ranks = np.minimum(rng.zipf(1.3, size=words), len(vocabulary)) - 1
+    return " ".join(vocabulary[ranks])
+
+
+def make_query(rng, vocabulary, corpus: list[str], words: int):
+    """
+    Half of the queries embed a passage copied from a random corpus document.
+    """
+    text = make_document(rng, vocabulary, words)
+    if rng.random() < 0.5:
+        return text, None
+    source_id = int(rng.integers(len(corpus)))
+    source_words = corpus[source_id].split()
+    length = min(len(source_words), words // 3)
+    start = int(rng.integers(len(source_words) - length + 1))
+    passage = " ".join(source_words[start:start + length])
+    head, tail = text.split()[: words // 3], text.split()[words // 3:]
+    return " ".join(head + [passage] + tail), source_id + 1
+
+
+def run_throughput(sizes: list[int], queries: int, doc_words: int, seed: int) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"w{i}" for i in range(50000)])
+    index = InMemoryLSHIndex()
+    corpus: list[str] = []
+    results = []
+
+    for size in sorted(sizes):
+        new_docs = [make_document(rng, vocabulary, doc_words) for _ in range(size - len(corpus))]
+        started = time.perf_counter()
+        for offset, text in enumerate(new_docs, start=len(corpus) + 1):
+            index.add(offset, None, text)
+        index_seconds = time.perf_counter() - started
+        corpus.extend(new_docs)
+
+        workload = [make_query(rng, vocabulary, corpus, doc_words) for _ in range(queries)]
+        found = planted = 0
+        started = time.perf_counter()
+        for text, source_id in workload:
+            report = index.detect(text)
+            if source_id is not None:
+                planted += 1
+                found += any(match.source_id == source_id for match in report.matches)
+        query_seconds = time.perf_counter() - started
+
+        result = {
+            "corpus_size": size,
+            "index_docs_per_second": round(len(new_docs) / index_seconds, 1) if new_docs else None,
+            "query_docs_per_second": round(queries / query_seconds, 1),
+            "query_ms_avg": round(query_seconds / queries * 1000, 2),
+            "planted_recall": round(found / planted, 4) if planted else None,
+            "buckets": len(index.buckets),
+        }
+        results.append(result)
+        print(
+            f"corpus={size:>7} index={result['index_docs_per_second']} docs/s "
+            f"query={result['query_docs_per_second']} docs/s ({result['query_ms_avg']} ms) "
+            f"recall={result['planted_recall']}"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", default=str(ROOT / "data" / "sample_academic_sources.json"))
+    parser.add_argument("--papers", default=str(ROOT / "generated_papers"))
+    parser.add_argument("--threshold", type=float, default=0.1, help="Score from which a paper counts as plagiarized")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--doc-words", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-throughput", action="store_true")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = {"args": vars(args)}
+    print("Accuracy on generated_papers/:")
+    report["accuracy"] = check_accuracy(Path(args.sources), Path(args.papers), args.threshold)
+    if not args.skip_throughput:
+        print("Throughput:")
+        report["throughput"] = run_throughput(args.sizes, args.queries, args.doc_words, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if not report["accuracy"]["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
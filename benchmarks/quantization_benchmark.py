@@ -0,0 +1,178 @@
+"""
+Memory and recall of quantized embeddings with full-precision re-ranking.
+
+Loads a synthetic clustered corpus into a scratch table and builds the full
+precision HNSW index plus the halfvec and binary expression indexes used by
+`rag_service.nearest_sources`. Reports every index size, then recall@k and
+latency of the full index and of each quantized coarse pass re-ranked with the
+full vectors, for every --candidates value. The float32 and int8 embedding
+snapshots (vector_snapshot.py) are measured the same way.
+
+    python benchmarks/quantization_benchmark.py --rows 50000 --candidates 40 100 200
+    python benchmarks/quantization_benchmark.py --rows 200000 --skip-pgvector
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import vector_snapshot
+from settings import settings
+
+# same corpus and result table as the ANN benchmark
+from ann_benchmark import TABLE, engine, exact_top_k, load_corpus, make_corpus, summarize
+
+# representation -> (index expression and operator class, coarse ORDER BY expression)
+COARSE = {
+    "halfvec": (
+        "(embedding::halfvec({dim})) halfvec_cosine_ops",
+        "embedding::halfvec({dim}) <=> CAST(:query AS vector)::halfvec({dim})",
+    ),
+    "binary": (
+        "(binary_quantize(embedding)::bit({dim})) bit_hamming_ops",
+        "binary_quantize(embedding)::bit({dim}) <~> binary_quantize(CAST(:query AS vector))::bit({dim})",
+    ),
+}
+
+
+def run_queries(conn, statement, queries, params: dict, ef_search: int):
+    statement = statement.bindparams(sa.bindparam("query", type_=Vector(queries.shape[1])))
+    results, latencies = [], []
+    for query in queries:
+        with conn.begin():
+            conn.execute(sa.text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+            started = time.perf_counter()
+            ids = conn.execute(statement, {"query": query, **params}).scalars().all()
+            latencies.append((time.perf_counter() - started) * 1000)
+        results.append(set(ids))
+    return results, np.array(latencies)
+
+
+def build_index(conn, name: str, definition: str) -> dict:
+    started = time.perf_counter()
+    with conn.begin():
+        conn.execute(sa.text(f"CREATE INDEX {name} ON {TABLE} USING hnsw ({definition})"))
+    build_seconds = time.perf_counter() - started
+    with conn.begin():
+        size = conn.execute(sa.text("SELECT pg_relation_size(:name)"), {"name": name}).scalar()
+    print(f"Built {name} in {build_seconds:.1f}s ({size / 2**20:.1f} MiB)")
+    return {"build_seconds": round(build_seconds, 2), "size_bytes": size}
+
+
+def benchmark_pgvector(args, corpus, queries, truth, report):
+    dim = corpus.shape[1]
+    with engine.connect() as conn:
+        with conn.begin():
+            conn.execute(sa.text("CREATE EXTENSION IF NOT EXISTS vector"))
+            print(f"Loading {args.rows} x {dim} vectors into {TABLE} ...")
+            load_corpus(conn, corpus)
+        try:
+            with conn.begin():
+                report["table_bytes"] = conn.execute(
+                    sa.text("SELECT pg_table_size(:table)"), {"table": TABLE}
+                ).scalar()
+            report["indexes"] = {
+                "vector": build_index(conn, f"{TABLE}_vector", "embedding vector_cosine_ops"),
+                **{
+                    name: build_index(conn, f"{TABLE}_{name}", definition.format(dim=dim))
+                    for name, (definition, _) in COARSE.items()
+                },
+            }
+
+            full = sa.text(f"SELECT id FROM {TABLE} ORDER BY embedding <=> :query LIMIT :k")
+            results, latencies = run_queries(conn, full, queries, {"k": args.k}, args.ef_search)
+            report["results"].append(
+                summarize(f"vector ef_search={args.ef_search}", results, truth, latencies, args.k)
+            )
+
+            for name, (_, order_by) in COARSE.items():
+                statement = sa.text(
+                    f"SELECT id FROM (SELECT id, embedding FROM {TABLE} "
+                    f"ORDER BY {order_by.format(dim=dim)} LIMIT :candidates) AS c "
+                    f"ORDER BY embedding <=> :query LIMIT :k"
+                )
+                for candidates in args.candidates:
+                    results, latencies = run_queries(
+                        conn, statement, queries, {"k": args.k, "candidates": candidates},
+                        max(args.ef_search, candidates),
+                    )
+                    report["results"].append(
+                        summarize(f"{name} rerank {candidates}", results, truth, latencies, args.k)
+                    )
+        finally:
+            with conn.begin():
+                conn.execute(sa.text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+
+def benchmark_snapshot(args, corpus, queries, truth, report):
+    ids = np.arange(1, len(corpus) + 1)
+    for quantization in ("none", "int8"):
+        with tempfile.TemporaryDirectory() as tmp:
+            segment = vector_snapshot.write_segment(
+                tmp, "segment-000001", len(corpus), corpus.shape[1], [(ids, corpus)], quantization=quantization
+            )
+            vector_snapshot._write_manifest(Path(tmp), {"generation": 1, "dimension": corpus.shape[1], "segments": [segment]})
+            sizes = {f.name.split(".")[1]: f.stat().st_size for f in Path(tmp).glob("*.npy")}
+            report["snapshots"][quantization] = sizes
+            print(f"snapshot {quantization}: " + ", ".join(f"{name} {size / 2**20:.1f} MiB" for name, size in sizes.items()))
+
+            snapshot = vector_snapshot.VectorSnapshot(tmp, reload_seconds=3600)
+            candidate_counts = args.candidates if quantization == "int8" else [None]
+            for candidates in candidate_counts:
+                if candidates is not None:
+                    settings.QUANTIZED_RERANK_CANDIDATES = candidates
+                snapshot.search(queries[0], args.k)  # warm the page cache
+                results, latencies = [], []
+                for query in queries:
+                    started = time.perf_counter()
+                    found, _ = snapshot.search(query, args.k)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    results.append(set(found.tolist()))
+                label = "snapshot float32" if candidates is None else f"snapshot int8 rerank {candidates}"
+                report["results"].append(summarize(label, results, truth, np.array(latencies), args.k))
+            del snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[40, 100, 200],
+                        help="Coarse candidates re-ranked with the full vectors")
+    parser.add_argument("--ef-search", type=int, default=40, help="HNSW ef_search (raised to the candidates)")
+    parser.add_argument("--skip-pgvector", action="store_true", help="Only measure the embedding snapshots")
+    parser.add_argument("--skip-snapshot", action="store_true", help="Only measure pgvector")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.rows, args.dim, args.clusters, args.seed)
+    queries = make_corpus(args.queries, args.dim, args.clusters, args.seed + 1)
+    truth = exact_top_k(corpus, queries, args.k, "cosine")
+
+    report = {"args": vars(args), "results": [], "snapshots": {}}
+    if not args.skip_snapshot:
+        benchmark_snapshot(args, corpus, queries, truth, report)
+    if not args.skip_pgvector:
+        benchmark_pgvector(args, corpus, queries, truth, report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
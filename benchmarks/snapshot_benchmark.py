@@ -0,0 +1,127 @@
+"""
+Exact search over the memory-mapped embedding snapshot against pgvector.
+
+Writes a synthetic clustered corpus as a snapshot (see vector_snapshot.py) and
+measures the in-process NumPy search, then loads the same corpus into a scratch
+table and measures pgvector exact search (sequential scan) and its HNSW index.
+Latencies include the database round trip for pgvector and nothing but the
+matmul for NumPy, which is the point of the comparison.
+
+    python benchmarks/snapshot_benchmark.py --rows 100000 --ef-search 40 100
+    python benchmarks/snapshot_benchmark.py --rows 300000 --skip-pgvector --segments 4
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vector_snapshot import VectorSnapshot, _write_manifest, write_segment
+
+# same corpus and result table as the ANN benchmark
+from ann_benchmark import make_corpus, summarize
+
+
+def write_snapshot(path: Path, corpus, segments: int, batch_size: int = 10000) -> dict:
+    """
+    Splits the corpus into `segments` segments, as successive refreshes would. Ids are 1-based.
+    """
+    entries = []
+    bounds = np.linspace(0, len(corpus), segments + 1, dtype=int)
+    for number, (start, end) in enumerate(zip(bounds[:-1].tolist(), bounds[1:].tolist()), start=1):
+        batches = (
+            (np.arange(s + 1, min(s + batch_size, end) + 1), corpus[s:min(s + batch_size, end)])
+            for s in range(start, end, batch_size)
+        )
+        entries.append(write_segment(path, f"segment-{number:06d}", end - start, corpus.shape[1], batches))
+    _write_manifest(path, {"generation": 1, "dimension": corpus.shape[1], "segments": entries})
+    return {"segments": len(entries), "size_bytes": sum(f.stat().st_size for f in path.glob("*.npy"))}
+
+
+def run_snapshot_queries(snapshot: VectorSnapshot, queries, k: int):
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        ids, _ = snapshot.search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(set(ids.tolist()))
+    return results, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--segments", type=int, default=1, help="Snapshot segments, as left by refreshes")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[40, 100], help="HNSW ef_search values")
+    parser.add_argument("--skip-pgvector", action="store_true", help="Only measure the NumPy snapshot")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.rows, args.dim, args.clusters, args.seed)
+    queries = make_corpus(args.queries, args.dim, args.clusters, args.seed + 1)
+    top = np.argpartition(-(queries @ corpus.T), args.k, axis=1)[:, :args.k]
+    truth = [set((row + 1).tolist()) for row in top]
+
+    report = {"args": vars(args), "results": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        report["snapshot"] = write_snapshot(Path(tmp), corpus, args.segments)
+        report["snapshot"]["write_seconds"] = round(time.perf_counter() - started, 2)
+        print(
+            f"Wrote {args.rows} x {args.dim} snapshot in {report['snapshot']['write_seconds']}s "
+            f"({report['snapshot']['size_bytes'] / 2**20:.1f} MiB, {args.segments} segments)"
+        )
+        snapshot = VectorSnapshot(tmp, reload_seconds=3600)
+        snapshot.search(queries[0], args.k)  # maps the files and warms the page cache
+        results, latencies = run_snapshot_queries(snapshot, queries, args.k)
+        report["results"].append(summarize("numpy snapshot (exact)", results, truth, latencies, args.k))
+        del snapshot
+
+    if not args.skip_pgvector:
+        import sqlalchemy as sa
+        from ann_benchmark import TABLE, engine, load_corpus, run_queries
+
+        with engine.connect() as conn:
+            with conn.begin():
+                conn.execute(sa.text("CREATE EXTENSION IF NOT EXISTS vector"))
+                print(f"Loading {args.rows} x {args.dim} vectors into {TABLE} ...")
+                load_corpus(conn, corpus)
+            try:
+                results, latencies = run_queries(
+                    conn, queries, args.k, "cosine",
+                    ["SET LOCAL enable_indexscan = off", "SET LOCAL enable_bitmapscan = off"],
+                )
+                report["results"].append(summarize("pgvector exact (seq scan)", results, truth, latencies, args.k))
+
+                with conn.begin():
+                    conn.execute(sa.text(f"CREATE INDEX ON {TABLE} USING hnsw (embedding vector_cosine_ops)"))
+                for value in args.ef_search:
+                    results, latencies = run_queries(
+                        conn, queries, args.k, "cosine", [f"SET LOCAL hnsw.ef_search = {int(value)}"]
+                    )
+                    report["results"].append(
+                        summarize(f"pgvector hnsw ef_search={value}", results, truth, latencies, args.k)
+                    )
+            finally:
+                with conn.begin():
+                    conn.execute(sa.text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
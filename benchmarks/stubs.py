@@ -0,0 +1,191 @@
+"""
+Local stand-ins for the Gemini embedding API and the n8n webhook, for load tests
+without external calls.
+
+    python benchmarks/stubs.py --api-url http://localhost:8000 --gemini-latency-ms 80 --n8n-delay 2
+
+and start the backend against them:
+
+    GEMINI_BASE_URL=http://localhost:8081 N8N_WEBHOOK_URL=http://localhost:8082/webhook/analysis uvicorn main:app
+
+Gemini: `POST /{version}/models/{model}:batchEmbedContents` answers with deterministic
+unit vectors derived from a hash of each text (same text, same vector), after
+--gemini-latency-ms and failing --gemini-error-rate of the calls with a 503.
+
+n8n: the webhook acknowledges at once and, --n8n-delay seconds later, posts a
+canned analysis result back to the API. Results are flushed in batches through
+`POST /internal/analysis-results/batch`, like a bulk re-analysis would.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import random
+import sys
+from pathlib import Path
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+logger = logging.getLogger("stubs")
+
+DEFAULT_DIMENSION = 3072  # Gemini's default output size
+RESULTS_PER_BATCH = 1000  # the API's default ANALYSIS_RESULTS_BATCH_MAX
+
+
+def stub_embedding(text: str, dimension: int) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+# --- Gemini ---
+def make_gemini_app(latency_ms: float, error_rate: float) -> web.Application:
+    stats = {"calls": 0, "texts": 0, "errors": 0}
+
+    async def batch_embed_contents(request: web.Request):
+        await asyncio.sleep(latency_ms / 1000)
+        stats["calls"] += 1
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            return web.json_response(
+                {"error": {"code": 503, "message": "stub overloaded", "status": "UNAVAILABLE"}}, status=503
+            )
+        body = await request.json()
+        embeddings = []
+        for item in body.get("requests", []):
+            text = " ".join(part.get("text", "") for part in item.get("content", {}).get("parts", []))
+            dimension = int(item.get("outputDimensionality") or DEFAULT_DIMENSION)
+            embeddings.append({"values": stub_embedding(text, dimension)})
+        stats["texts"] += len(embeddings)
+        return web.json_response({"embeddings": embeddings})
+
+    async def get_stats(request: web.Request):
+        return web.json_response(stats)
+
+    app = web.Application(client_max_size=64 * 2**20)
+    app.router.add_post("/{version}/models/{model}:batchEmbedContents", batch_embed_contents)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+# --- n8n ---
+def analysis_result(payload: dict) -> dict:
+    """
+    The fields the real workflow posts to /internal/analysis-results.
+    """
+    return {
+        "assignment_id": payload["assignment_id"],
+        "suggested_sources": [],
+        "plagiarism_score": payload.get("plagiarism_score") or 0.0,
+        "research_suggestions": "Stub research suggestions.",
+        "citation_recommendations": "Stub citation recommendations.",
+        "confidence_score": 0.5,
+        "original_text": payload.get("original_text") or "",
+        "topic": "Stub topic",
+        "academic_level": "Undergraduate",
+        "word_count": payload.get("word_count") or 0,
+    }
+
+
+def make_n8n_app(api_url: str, api_key: str, delay: float, flush_interval: float) -> web.Application:
+    stats = {"received": 0, "posted": 0, "post_errors": 0}
+    pending: list[dict] = []
+
+    async def webhook(request: web.Request):
+        payload = await request.json()
+        stats["received"] += 1
+
+        async def later():
+            await asyncio.sleep(delay)
+            pending.append(analysis_result(payload))
+
+        asyncio.create_task(later())
+        return web.json_response({"message": "Workflow was started"})
+
+    async def flush_results(app: web.Application):
+        session: aiohttp.ClientSession = app["session"]
+        while True:
+            await asyncio.sleep(flush_interval)
+            if not pending:
+                continue
+            batch = pending[:RESULTS_PER_BATCH]
+            del pending[:len(batch)]
+            try:
+                async with session.post(
+                    f"{api_url}/internal/analysis-results/batch", json=batch, headers={"X-API-Key": api_key}
+                ) as response:
+                    await response.read()
+                    response.raise_for_status()
+                stats["posted"] += len(batch)
+            except aiohttp.ClientError as e:
+                stats["post_errors"] += len(batch)
+                logger.warning(f"Posting {len(batch)} results failed: {e!r}")
+
+    async def lifecycle(app: web.Application):
+        app["session"] = aiohttp.ClientSession()
+        flusher = asyncio.create_task(flush_results(app))
+        yield
+        flusher.cancel()
+        await asyncio.gather(flusher, return_exceptions=True)
+        await app["session"].close()
+
+    async def get_stats(request: web.Request):
+        return web.json_response({**stats, "pending": len(pending)})
+
+    app = web.Application(client_max_size=64 * 2**20)
+    app.router.add_post("/webhook/{name}", webhook)
+    app.router.add_get("/stats", get_stats)
+    app.cleanup_ctx.append(lifecycle)
+    return app
+
+
+async def serve(args):
+    runners = []
+    for app, port in (
+        (make_gemini_app(args.gemini_latency_ms, args.gemini_error_rate), args.gemini_port),
+        (make_n8n_app(args.api_url, args.api_key, args.n8n_delay, args.flush_interval), args.n8n_port),
+    ):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, args.host, port).start()
+        runners.append(runner)
+    print(f"Gemini stub on http://{args.host}:{args.gemini_port}, n8n stub on http://{args.host}:{args.n8n_port}/webhook/analysis")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--gemini-port", type=int, default=8081)
+    parser.add_argument("--gemini-latency-ms", type=float, default=50.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--n8n-port", type=int, default=8082)
+    parser.add_argument("--n8n-delay", type=float, default=1.0, help="Seconds before a result is posted back")
+    parser.add_argument("--flush-interval", type=float, default=0.5, help="Seconds between result batches")
+    parser.add_argument("--api-url", default="http://localhost:8000")
+    parser.add_argument("--api-key", help="Internal API key (default: settings.INTERNAL_API_KEY)")
+    args = parser.parse_args()
+
+    if args.api_key is None:
+        from settings import settings
+        args.api_key = settings.INTERNAL_API_KEY
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)  # one line per request otherwise
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Token-aware chunking of academic sources into overlapping passages.
+
+Chunks are cut on tiktoken token boundaries so their size tracks what the embedding
+model actually sees, and every chunk keeps the character offsets of its passage in
+`full_text`, so search results can point at (and quote) the matching passage.
+
+Changing the encoding, chunk size or overlap only affects newly ingested sources;
+re-chunk existing ones with `python ingest_data.py --rechunk`.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import tiktoken
+
+from settings import settings
+
+
+@dataclass
+class Chunk:
+    index: int
+    start_char: int  # [start_char, end_char) offsets in the source text
+    end_char: int
+    token_count: int
+    text: str
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(name)
+
+
+def chunk_text(
+    text: str,
+    chunk_tokens: int | None = None,
+    overlap_tokens: int | None = None,
+    encoding: tiktoken.Encoding | None = None,
+) -> list[Chunk]:
+    """
+    Splits a text into chunks of at most `chunk_tokens` tokens, consecutive chunks sharing
+    `overlap_tokens` tokens so a passage cut at a boundary is still whole in one of them.
+
+    Args:
+        text: The text to split.
+        chunk_tokens: Tokens per chunk (default `settings.CHUNK_TOKENS`).
+        overlap_tokens: Tokens shared by consecutive chunks (default `settings.CHUNK_OVERLAP_TOKENS`).
+        encoding: tiktoken encoding (default `settings.CHUNK_ENCODING`).
+
+    Returns:
+        The chunks in text order, an empty list for a blank text.
+    """
+    chunk_tokens = chunk_tokens or settings.CHUNK_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    if not 0 <= overlap_tokens < chunk_tokens:
+        raise ValueError("overlap_tokens must be at least 0 and smaller than chunk_tokens")
+    encoding = encoding or get_encoding(settings.CHUNK_ENCODING)
+
+    if not text.strip():
+        return []
+    tokens = encoding.encode(text, disallowed_special=())
+    # character offset of the start of every token, tiktoken round-trips any str exactly
+    _, offsets = encoding.decode_with_offsets(tokens)
+    offsets.append(len(text))
+
+    chunks = []
+    step = chunk_tokens - overlap_tokens
+    for start in range(0, len(tokens), step):
+        end = min(start + chunk_tokens, len(tokens))
+        start_char, end_char = offsets[start], offsets[end]
+        passage = text[start_char:end_char]
+        if passage.strip():
+            chunks.append(Chunk(
+                index=len(chunks),
+                start_char=start_char,
+                end_char=end_char,
+                token_count=end - start,
+                text=passage,
+            ))
+        if end == len(tokens):
+            break
+    return chunks
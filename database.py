@@ -1,15 +1,302 @@
-from sqlalchemy import create_engine
+import logging
+import threading
+import time
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from settings import settings
+from metrics import instrument_engine
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def make_database_url(driver: str = "postgresql+psycopg2") -> str:
+    return f"{driver}://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+
+SQLALCHEMY_DATABASE_URL = make_database_url()
+ASYNC_SQLALCHEMY_DATABASE_URL = make_database_url("postgresql+asyncpg")
+
+
+# --- pool metrics ---
+class PoolMetrics:
+    """
+    Contention counters for one engine's connection pool.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, wait: float, overflowed: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            if overflowed:
+                self.overflow_events += 1
+        if wait * 1000 >= settings.DB_POOL_SLOW_CHECKOUT_MS:
+            logger.warning(
+                f"Slow connection checkout on '{self.name}' pool: waited {wait * 1000:.0f} ms "
+                f"({self.pool.checkedout()} checked out, overflow {self.pool.overflow()})"
+            )
+
+    def record_timeout(self, wait: float):
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.pool.size(),
+            "checked_out": self.pool.checkedout(),
+            "checked_in": self.pool.checkedin(),
+            "overflow": self.pool.overflow(),
+            "checkouts": self.checkouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "overflow_events": self.overflow_events,
+            "timeouts": self.timeouts,
+        }
+
+
+pool_metrics: dict[str, PoolMetrics] = {}
+
+
+class _InstrumentedPoolMixin:
+    """
+    Times every checkout from the pool, including the wait for a free connection.
+    """
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        overflow_before = self._overflow
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - started)
+            raise
+        overflowed = self._overflow > overflow_before and self._overflow > 0
+        self.metrics.pool = self  # follows pool.recreate() after engine.dispose()
+        self.metrics.record_checkout(time.perf_counter() - started, overflowed)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+# --- slow query log ---
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+SLOW_QUERY_STATEMENT_CHARS = 2000  # multi-row VALUES statements get long
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = 60  # per statement text, so a slow hot path explains once a minute
+
+
+def _value_shape(value) -> str:
+    if value is None:
+        return "None"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}({len(value)})"
+    if hasattr(value, "shape"):  # numpy arrays (embeddings)
+        return f"{type(value).__name__}{tuple(value.shape)}"
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """
+    Types and sizes of the bound parameters, never their values (they hold emails and texts).
+    """
+    if executemany:
+        return f"{len(parameters)} parameter sets"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {_value_shape(value)}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(_value_shape(value) for value in parameters) + ")"
+    return _value_shape(parameters)
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+class SlowQueryLog:
+    """
+    Logs every statement of an engine that runs longer than DB_SLOW_QUERY_MS, with the
+    shape of its parameters and, with DB_SLOW_QUERY_EXPLAIN, its plan. The plan is a plain
+    EXPLAIN (nothing is executed again) on a second cursor of the same connection and
+    transaction, so it sees the same data and settings.
+    """
+
+    def __init__(self, name: str, threshold_ms: int, explain: bool):
+        self.name = name
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.slow_queries = 0
+        self._explained_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context.slow_query_started = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "slow_query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold:
+            return
+
+        with self._lock:
+            self.slow_queries += 1
+        plan = self._plan(conn, statement, parameters) if self.explain and not executemany else None
+        text = statement if len(statement) <= SLOW_QUERY_STATEMENT_CHARS else statement[:SLOW_QUERY_STATEMENT_CHARS] + " ..."
+        logger.warning(
+            f"Slow query on '{self.name}' engine: {elapsed * 1000:.0f} ms\n{text}\n"
+            f"parameters: {parameter_shape(parameters, executemany)}"
+            + (f"\nplan:\n{plan}" if plan else "")
+        )
+
+    def _plan(self, conn, statement: str, parameters) -> str | None:
+        if not statement.lstrip(" (\n").upper().startswith(EXPLAINABLE):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained_at.get(statement, -SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS) < SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS:
+                return None
+            self._explained_at[statement] = now
+            if len(self._explained_at) > 1000:
+                self._explained_at.clear()
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(f"EXPLAIN {statement}", parameters)
+                return "\n".join(str(row[0]) for row in cursor.fetchall())
+            finally:
+                cursor.close()
+        except Exception as e:
+            # e.g. an aborted transaction, the log line still goes out
+            return f"(EXPLAIN failed: {e!r})"
+
+
+slow_query_logs: dict[str, SlowQueryLog] = {}
+
+
+def _log_slow_queries(engine, name: str):
+    if settings.DB_SLOW_QUERY_MS > 0:
+        slow_query_logs[name] = SlowQueryLog(name, settings.DB_SLOW_QUERY_MS, settings.DB_SLOW_QUERY_EXPLAIN)
+        slow_query_logs[name].attach(engine)
+
+
+# --- engine factory ---
+def _engine_options(name: str, pool_class, overrides: dict) -> dict:
+    metrics = pool_metrics.setdefault(name, PoolMetrics(name))
+    pool_class = type(f"{pool_class.__name__}_{name}", (pool_class,), {"metrics": metrics})
+    options = {
+        "poolclass": pool_class,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    options.update(overrides)
+    return options
+
+
+def _server_settings(statement_timeout_ms: int | None, lock_timeout_ms: int | None) -> dict:
+    statement_timeout_ms = settings.DB_STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+    lock_timeout_ms = settings.DB_LOCK_TIMEOUT_MS if lock_timeout_ms is None else lock_timeout_ms
+    return {"statement_timeout": str(statement_timeout_ms), "lock_timeout": str(lock_timeout_ms)}
+
+
+def create_db_engine(
+    name: str = "sync",
+    url: str = SQLALCHEMY_DATABASE_URL,
+    statement_timeout_ms: int | None = None,
+    lock_timeout_ms: int | None = None,
+    **overrides,
+):
+    """
+    Builds a psycopg2 engine with the pool and timeout settings from `settings`.
+
+    Args:
+        name: Label of the engine in the pool metrics.
+        url: Database URL.
+        statement_timeout_ms: Server-side statement timeout (0 disables it, None uses the setting).
+        lock_timeout_ms: Server-side lock wait timeout (0 disables it, None uses the setting).
+        **overrides: Any other `create_engine` keyword, e.g. `pool_size`.
+    """
+    server_settings = _server_settings(statement_timeout_ms, lock_timeout_ms)
+    options = " ".join(f"-c {key}={value}" for key, value in server_settings.items())
+    engine = create_engine(
+        url,
+        connect_args={"options": options},
+        **_engine_options(name, InstrumentedQueuePool, overrides),
+    )
+    pool_metrics[name].pool = engine.pool
+    instrument_engine(engine, name)
+    _log_slow_queries(engine, name)
+    return engine
+
+
+def create_async_db_engine(
+    name: str = "async",
+    url: str = ASYNC_SQLALCHEMY_DATABASE_URL,
+    statement_timeout_ms: int | None = None,
+    lock_timeout_ms: int | None = None,
+    **overrides,
+):
+    """
+    asyncpg counterpart of `create_db_engine`.
+    """
+    engine = create_async_engine(
+        url,
+        connect_args={"server_settings": _server_settings(statement_timeout_ms, lock_timeout_ms)},
+        **_engine_options(name, InstrumentedAsyncAdaptedQueuePool, overrides),
+    )
+    pool_metrics[name].pool = engine.pool
+    instrument_engine(engine.sync_engine, name)
+    _log_slow_queries(engine.sync_engine, name)
+    return engine
+
+
+def get_pool_stats() -> dict:
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# asyncpg-backed engine for the async route handlers, so they never block the event loop
+async_engine = create_async_db_engine()
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,248 @@
+"""
+Query embedding cache: an in-process LRU with TTL in front of the `embedding_cache` table.
+
+Rows of the table expire after EMBEDDING_CACHE_PERSIST_TTL_SECONDS: lookups ignore
+them and the next write replaces them. A pruning job deletes expired rows and all
+but the newest EMBEDDING_CACHE_PERSIST_MAX_ROWS; every API worker runs it each
+EMBEDDING_CACHE_PRUNE_INTERVAL_SECONDS (one at a time, behind an advisory lock),
+or from cron:
+
+    python embedding_cache.py --prune
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from database import AsyncSessionLocal, SessionLocal
+from models import EmbeddingCacheEntry
+from settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+PRUNE_LOCK_KEY = 7318402001  # pg_try_advisory_xact_lock key, one pruning worker at a time
+# keeps the newest :max_rows rows, uses ix_embedding_cache_created_at
+PRUNE_OVER_CAP_SQL = text(
+    """
+    DELETE FROM embedding_cache
+    WHERE key IN (SELECT key FROM embedding_cache ORDER BY created_at DESC OFFSET :max_rows)
+    """
+)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses all whitespace (newlines included) so trivially different inputs share one embedding.
+    """
+    return " ".join(text.split())
+
+
+def make_cache_key(text: str, model: str, dimension: int) -> str:
+    """
+    Builds the cache key for an embedding: a SHA-256 of (normalized text, model, dimension).
+    """
+    raw = f"{model}\x1f{dimension}\x1f{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _expired_before():
+    return func.now() - timedelta(seconds=settings.EMBEDDING_CACHE_PERSIST_TTL_SECONDS)
+
+
+def _lookup_statement(key: str):
+    statement = select(EmbeddingCacheEntry.embedding).where(EmbeddingCacheEntry.key == key)
+    if settings.EMBEDDING_CACHE_PERSIST_TTL_SECONDS is not None:
+        statement = statement.where(EmbeddingCacheEntry.created_at > _expired_before())
+    return statement
+
+
+def _insert_statement(key: str, model: str, dimension: int, embedding: list[float]):
+    statement = insert(EmbeddingCacheEntry).values(key=key, model=model, dimension=dimension, embedding=embedding)
+    if settings.EMBEDDING_CACHE_PERSIST_TTL_SECONDS is None:
+        return statement.on_conflict_do_nothing(index_elements=["key"])
+    # an expired row is replaced and its TTL restarts, a live one is kept
+    return statement.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"embedding": statement.excluded.embedding, "created_at": func.now()},
+        where=EmbeddingCacheEntry.created_at <= _expired_before(),
+    )
+
+
+def prune_persistent(db: Session) -> int:
+    """
+    Deletes expired rows and all but the newest EMBEDDING_CACHE_PERSIST_MAX_ROWS in the
+    caller's transaction. Returns the number of deleted rows, 0 when another session is
+    pruning at the same time.
+    """
+    if not db.execute(select(func.pg_try_advisory_xact_lock(PRUNE_LOCK_KEY))).scalar():
+        return 0
+    deleted = 0
+    if settings.EMBEDDING_CACHE_PERSIST_TTL_SECONDS is not None:
+        deleted += db.execute(
+            delete(EmbeddingCacheEntry).where(EmbeddingCacheEntry.created_at <= _expired_before())
+        ).rowcount
+    if settings.EMBEDDING_CACHE_PERSIST_MAX_ROWS is not None:
+        deleted += db.execute(PRUNE_OVER_CAP_SQL, {"max_rows": settings.EMBEDDING_CACHE_PERSIST_MAX_ROWS}).rowcount
+    return deleted
+
+
+class EmbeddingCache:
+    """
+    Two-level embedding cache: an in-process LRU with TTL in front of an optional
+    `embedding_cache` table, so warm entries survive restarts and are shared across workers.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None, persist: bool):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.persist = persist
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+        self.persistent_errors = 0
+        self.pruned = 0
+        self._prune_task: asyncio.Task | None = None
+
+    def get(self, key: str):
+        embedding = self.memory.get(key)
+        if embedding is not None or not self.persist:
+            return embedding
+
+        try:
+            with SessionLocal() as db:
+                stored = db.execute(_lookup_statement(key)).scalar_one_or_none()
+                embedding = [float(x) for x in stored] if stored is not None else None
+        except Exception as e:
+            # the cache must never break a search, fall back to the API
+            self.persistent_errors += 1
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return None
+
+        if embedding is None:
+            self.persistent_misses += 1
+            return None
+
+        self.persistent_hits += 1
+        self.memory.set(key, embedding)
+        return embedding
+
+    def put(self, key: str, model: str, dimension: int, embedding):
+        embedding = list(embedding)
+        self.memory.set(key, embedding)
+        if not self.persist:
+            return
+
+        try:
+            with SessionLocal() as db:
+                db.execute(_insert_statement(key, model, dimension, embedding))
+                db.commit()
+        except Exception as e:
+            self.persistent_errors += 1
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    async def aget(self, key: str):
+        """
+        Async variant of `get` for the request path, the persistent lookup goes through asyncpg.
+        """
+        embedding = self.memory.get(key)
+        if embedding is not None or not self.persist:
+            return embedding
+
+        try:
+            async with AsyncSessionLocal() as db:
+                stored = (await db.execute(_lookup_statement(key))).scalar_one_or_none()
+                embedding = [float(x) for x in stored] if stored is not None else None
+        except Exception as e:
+            self.persistent_errors += 1
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return None
+
+        if embedding is None:
+            self.persistent_misses += 1
+            return None
+
+        self.persistent_hits += 1
+        self.memory.set(key, embedding)
+        return embedding
+
+    async def aput(self, key: str, model: str, dimension: int, embedding):
+        embedding = list(embedding)
+        self.memory.set(key, embedding)
+        if not self.persist:
+            return
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(_insert_statement(key, model, dimension, embedding))
+                await db.commit()
+        except Exception as e:
+            self.persistent_errors += 1
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def start_pruning(self):
+        if self.persist and settings.EMBEDDING_CACHE_PRUNE_INTERVAL_SECONDS and self._prune_task is None:
+            self._prune_task = asyncio.create_task(self._prune_loop(), name="embedding-cache-pruning")
+
+    async def stop_pruning(self):
+        if self._prune_task is not None:
+            self._prune_task.cancel()
+            await asyncio.gather(self._prune_task, return_exceptions=True)
+            self._prune_task = None
+
+    async def _prune_loop(self):
+        while True:
+            await asyncio.sleep(settings.EMBEDDING_CACHE_PRUNE_INTERVAL_SECONDS)
+            try:
+                async with AsyncSessionLocal() as db:
+                    deleted = await db.run_sync(prune_persistent)
+                    await db.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Embedding cache pruning failed: {e!r}")
+                continue
+            self.pruned += deleted
+            if deleted:
+                logger.info(f"Pruned {deleted} embedding cache rows")
+
+    def clear(self):
+        """
+        Drops the in-process entries only; the persistent table is left untouched.
+        """
+        self.memory.clear()
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "persistent": {
+                "enabled": self.persist,
+                "hits": self.persistent_hits,
+                "misses": self.persistent_misses,
+                "errors": self.persistent_errors,
+                "pruned": self.pruned,
+            },
+        }
+
+
+embedding_cache = EmbeddingCache(
+    maxsize=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    ttl=settings.EMBEDDING_CACHE_TTL_SECONDS,
+    persist=settings.EMBEDDING_CACHE_PERSIST,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the persistent embedding cache.")
+    parser.add_argument("--prune", action="store_true", help="Delete expired rows and rows over the row cap")
+    args = parser.parse_args()
+    if args.prune:
+        with SessionLocal() as db:
+            deleted = prune_persistent(db)
+            db.commit()
+        print(f"Deleted {deleted} embedding cache rows.")
+    else:
+        parser.print_help()
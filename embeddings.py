@@ -0,0 +1,245 @@
+import asyncio
+import functools
+import hashlib
+import re
+import threading
+import time
+
+import numpy as np
+from google import genai
+from google.genai import types
+
+from embedding_cache import normalize_text
+from metrics import embedding_call_duration, embedding_call_errors
+from models import EMBEDDING_DIMENSION
+from settings import settings
+
+
+class EmbeddingTimeout(Exception):
+    """
+    Raised when an embedding call, including its wait for a concurrency slot, exceeds the timeout.
+    """
+
+
+# --- providers ---
+class EmbeddingProvider:
+    """
+    Turns texts into `dimension`-d vectors. `embed_many` splits the texts into calls of at
+    most `max_batch_size` texts; at most `max_concurrency` calls are in flight per process
+    (sync and async callers have separate limits), and every call, with its wait for a
+    slot, fails with `EmbeddingTimeout` after `timeout` seconds.
+
+    Subclasses implement `_embed_batch` and, when they have a native async client,
+    `_aembed_batch`; the default runs `_embed_batch` in a thread.
+    """
+
+    name = "base"
+    max_batch_size = 100
+
+    def __init__(self, model: str, dimension: int, max_concurrency: int, timeout: float):
+        self.model = model
+        self.dimension = dimension
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._sync_slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots: asyncio.Semaphore | None = None
+        self.calls = 0
+        self.texts = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.seconds = 0.0
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    async def _aembed_batch(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self._embed_batch, texts)
+
+    def _batches(self, texts: list[str]) -> list[list[str]]:
+        texts = [normalize_text(text) for text in texts]
+        return [texts[start:start + self.max_batch_size] for start in range(0, len(texts), self.max_batch_size)]
+
+    def _record(self, texts: int, started: float, error: Exception | None = None):
+        elapsed = time.perf_counter() - started
+        self.calls += 1
+        self.texts += texts
+        self.seconds += elapsed
+        embedding_call_duration.labels(self.name).observe(elapsed)
+        if isinstance(error, (EmbeddingTimeout, asyncio.TimeoutError)):
+            self.timeouts += 1
+            embedding_call_errors.labels(self.name, "timeout").inc()
+        elif error is not None:
+            self.errors += 1
+            embedding_call_errors.labels(self.name, "error").inc()
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeds `texts` with one call per `max_batch_size` texts, made one after another
+        (concurrent callers, e.g. ingestion threads, share the concurrency limit).
+
+        Returns:
+            A list of embedding vectors, in the same order as `texts`.
+        """
+        embeddings = []
+        for batch in self._batches(texts):
+            if not self._sync_slots.acquire(timeout=self.timeout):
+                self.timeouts += 1
+                embedding_call_errors.labels(self.name, "timeout").inc()
+                raise EmbeddingTimeout(f"Timed out waiting for an embedding slot ({self.name})")
+            started = time.perf_counter()
+            try:
+                embeddings.extend(self._embed_batch(batch))
+            except Exception as e:
+                self._record(len(batch), started, e)
+                raise
+            finally:
+                self._sync_slots.release()
+            self._record(len(batch), started)
+        return embeddings
+
+    async def _aembed_limited(self, batch: list[str]) -> list[list[float]]:
+        async with self._async_slots:
+            return await self._aembed_batch(batch)
+
+    async def _aembed_one(self, batch: list[str]) -> list[list[float]]:
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        started = time.perf_counter()
+        try:
+            embeddings = await asyncio.wait_for(self._aembed_limited(batch), timeout=self.timeout)
+        except asyncio.TimeoutError as e:
+            self._record(len(batch), started, e)
+            raise EmbeddingTimeout(f"Embedding call timed out after {self.timeout}s ({self.name})") from e
+        except Exception as e:
+            self._record(len(batch), started, e)
+            raise
+        self._record(len(batch), started)
+        return embeddings
+
+    async def aembed_many(self, texts: list[str]) -> list[list[float]]:
+        """
+        Async variant of `embed_many`: the calls run concurrently, up to `max_concurrency`.
+        """
+        results = await asyncio.gather(*(self._aembed_one(batch) for batch in self._batches(texts)))
+        return [embedding for batch in results for embedding in batch]
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_many([text])[0]
+
+    async def aembed(self, text: str) -> list[float]:
+        return (await self.aembed_many([text]))[0]
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.name,
+            "model": self.model,
+            "dimension": self.dimension,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "texts": self.texts,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "mean_call_ms": round(self.seconds / self.calls * 1000, 2) if self.calls else None,
+        }
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """
+    Google Gemini embeddings. The client is created on the first call, not at import.
+    """
+
+    name = "gemini"
+    max_batch_size = 100  # texts per embed_content call accepted by the API
+
+    def __init__(self, model: str, dimension: int, max_concurrency: int, timeout: float):
+        super().__init__(model, dimension, max_concurrency, timeout)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = genai.Client(
+                        api_key=settings.GEMINI_API_KEY,
+                        http_options=types.HttpOptions(
+                            base_url=settings.GEMINI_BASE_URL,
+                            timeout=int(self.timeout * 1000),  # milliseconds
+                        ),
+                    )
+        return self._client
+
+    def _config(self):
+        return types.EmbedContentConfig(output_dimensionality=self.dimension)
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        result = self.client.models.embed_content(model=self.model, contents=texts, config=self._config())
+        return [embedding.values for embedding in result.embeddings]
+
+    async def _aembed_batch(self, texts: list[str]) -> list[list[float]]:
+        result = await self.client.aio.models.embed_content(model=self.model, contents=texts, config=self._config())
+        return [embedding.values for embedding in result.embeddings]
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+BIGRAM_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)  # odd 64-bit constant, mixes the first word of a bigram
+
+
+@functools.lru_cache(maxsize=200_000)
+def _word_hash(word: str) -> int:
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic local embeddings: the lower-cased words and word bigrams of a text are
+    hashed into `dimension` signed buckets and the counts normalized to unit length.
+    Texts sharing vocabulary get similar vectors, which is enough for offline runs, load
+    tests and plagiarism checks on synthetic corpora; it knows nothing about meaning.
+    """
+
+    name = "hashing"
+    max_batch_size = 1000
+
+    def _embed_text(self, text: str) -> np.ndarray:
+        words = np.array(list(map(_word_hash, TOKEN_PATTERN.findall(text.lower()))), dtype=np.uint64)
+        features = np.concatenate([words, words[:-1] * BIGRAM_MULTIPLIER ^ words[1:]])
+        buckets = (features % np.uint64(self.dimension)).astype(np.intp)
+        signs = np.where(features >> np.uint64(63), -1.0, 1.0)
+        vector = np.bincount(buckets, weights=signs, minlength=self.dimension).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed_text(text).tolist() for text in texts]
+
+
+PROVIDERS = {
+    "gemini": GeminiEmbeddingProvider,
+    "hashing": HashingEmbeddingProvider,
+}
+
+
+def create_embedding_provider(
+    name: str | None = None,
+    model: str | None = None,
+    dimension: int | None = None,
+    max_concurrency: int | None = None,
+    timeout: float | None = None,
+) -> EmbeddingProvider:
+    """
+    Builds a provider from the settings, any argument overrides its setting.
+    """
+    name = name or settings.EMBEDDING_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider {name!r}, expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name](
+        model=model or (settings.EMBEDDING_MODEL if name == "gemini" else f"{name}-v1"),
+        dimension=dimension or EMBEDDING_DIMENSION,
+        max_concurrency=max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY,
+        timeout=timeout or settings.EMBEDDING_TIMEOUT_SECONDS,
+    )
+
+
+embedding_provider = create_embedding_provider()
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from settings import settings
+
+# --- constants ---
+PDF_MIME_TYPE = "application/pdf"
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+WORD_PATTERN = re.compile(r"\b\w[\w'-]*\b")
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class ExtractionUnavailable(ExtractionError):
+    """
+    Raised when the extraction pool broke (a worker crashed or was killed), the file itself may be fine.
+    """
+
+
+# --- parsers (run inside the worker processes) ---
+def _extract_pdf(file_path: str) -> str:
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def _extract_docx(file_path: str) -> str:
+    import docx
+
+    document = docx.Document(file_path)
+    paragraphs = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            paragraphs.append(" ".join(cell.text for cell in row.cells))
+    return "\n".join(paragraphs)
+
+
+EXTRACTORS = {
+    PDF_MIME_TYPE: _extract_pdf,
+    DOCX_MIME_TYPE: _extract_docx,
+}
+
+
+def count_words(text: str) -> int:
+    return len(WORD_PATTERN.findall(text))
+
+
+def extract_text(file_path: str, content_type: str) -> tuple[str, int]:
+    """
+    Extracts the plain text of a PDF or DOCX file. CPU-bound, meant to run in the process pool.
+
+    Returns:
+        The extracted text and its word count.
+    """
+    extractor = EXTRACTORS.get(content_type)
+    if extractor is None:
+        raise ExtractionError(f"Unsupported content type: {content_type}")
+    try:
+        text = extractor(file_path)
+    except Exception as e:
+        raise ExtractionError(f"Could not parse {content_type} file: {e}") from e
+    # pypdf can emit NUL characters, which Postgres rejects in text columns
+    text = text.replace("\x00", "").strip()
+    return text, count_words(text)
+
+
+# --- process pool ---
+_pool: ProcessPoolExecutor | None = None
+
+
+def start_extraction_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.EXTRACTION_WORKERS)
+    return _pool
+
+
+def shutdown_extraction_pool(kill: bool = False):
+    """
+    Shuts the pool down, the next extraction starts a new one. With `kill`, running
+    parses are terminated too (a stuck parse never returns on its own).
+    """
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        # the executor has no public way to stop busy workers
+        processes = list((pool._processes or {}).values()) if kill else []
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+
+async def extract_text_async(file_path: str, content_type: str) -> tuple[str, int]:
+    """
+    Runs `extract_text` in the process pool so parsing never blocks the event loop.
+    A parse running longer than EXTRACTION_TIMEOUT_SECONDS raises `ExtractionError`;
+    its worker is killed with the pool, which is rebuilt on the next call, as after a
+    crashed worker (`ExtractionUnavailable`).
+    """
+    loop = asyncio.get_running_loop()
+    pool = start_extraction_pool()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(pool, extract_text, file_path, content_type),
+            timeout=settings.EXTRACTION_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Text extraction of {content_type} timed out, restarting the extraction pool")
+        if _pool is pool:
+            shutdown_extraction_pool(kill=True)
+        raise ExtractionError(f"Text extraction timed out after {settings.EXTRACTION_TIMEOUT_SECONDS}s")
+    except BrokenProcessPool as e:
+        logger.warning(f"Extraction pool broke, restarting it: {e!r}")
+        if _pool is pool:
+            shutdown_extraction_pool()
+        raise ExtractionUnavailable("Text extraction is temporarily unavailable") from e
@@ -1,21 +1,27 @@
+import argparse
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from fpdf import FPDF
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import random
 
 from models import AcademicSource
-from settings import settings
+from database import create_db_engine
 
 # Database setup
-SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_db_engine(name="generate_papers", pool_size=1, max_overflow=0)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def create_pdf(title, content, output_dir="/app/generated_papers"):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    file_path = os.path.join(output_dir, f"{title.replace(' ', '_').lower()}.pdf")
+    write_pdf(file_path, title, content)
+    print(f"Generated PDF: {file_path}")
+
+def write_pdf(file_path, title, content):
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Arial", size=12)
@@ -28,10 +34,7 @@ def create_pdf(title, content, output_dir="/app/generated_papers"):
     # Add content
     pdf.set_font("Arial", size=12)
     pdf.multi_cell(0, 10, txt=content)
-    
-    file_path = os.path.join(output_dir, f"{title.replace(' ', '_').lower()}.pdf")
     pdf.output(file_path)
-    print(f"Generated PDF: {file_path}")
 
 def generate_plagiarized_paper_1(sources):
     """
@@ -103,7 +106,123 @@ def generate_original_paper():
     
     create_pdf(title, content)
 
-if __name__ == "__main__":
+# --- synthetic corpus for load tests ---
+# every item is generated from (seed, index) alone, so workers need no shared state
+SUBJECTS = [
+    "machine learning", "climate adaptation", "urban planning", "gene regulation", "monetary policy",
+    "language acquisition", "renewable energy", "medieval trade", "protein folding", "social networks",
+    "public health", "quantum computing", "soil ecology", "labor markets", "cognitive load",
+]
+NOUNS = [
+    "model", "framework", "dataset", "hypothesis", "population", "mechanism", "policy", "signal",
+    "structure", "process", "network", "outcome", "method", "variable", "system", "pattern",
+]
+VERBS = [
+    "influences", "explains", "constrains", "predicts", "reshapes", "reveals", "supports",
+    "undermines", "accelerates", "stabilizes", "measures", "transforms",
+]
+ADJECTIVES = [
+    "robust", "nonlinear", "empirical", "longitudinal", "latent", "regional", "adaptive",
+    "significant", "theoretical", "heterogeneous", "scalable", "causal",
+]
+# paraphrasing: synonyms and function-word swaps, in the spirit of generate_plagiarized_paper_2
+SYNONYMS = {
+    "influences": "affects", "explains": "accounts for", "constrains": "limits", "predicts": "forecasts",
+    "reshapes": "alters", "reveals": "shows", "supports": "backs", "measures": "quantifies",
+    "robust": "reliable", "significant": "notable", "method": "approach", "outcome": "result",
+    "structure": "organization", "pattern": "regularity", "the": "this", "a": "one",
+}
+
+
+def _sentence(rng, subject):
+    return (
+        f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} of {subject} {rng.choice(VERBS)} "
+        f"a {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} in {rng.choice(SUBJECTS)}, "
+        f"as the {rng.choice(NOUNS)} {rng.choice(VERBS)} the {rng.choice(NOUNS)}."
+    )
+
+
+def synthetic_source(seed, index, sentences=40):
+    rng = random.Random(f"{seed}-source-{index}")
+    subject = rng.choice(SUBJECTS)
+    body = [_sentence(rng, subject) for _ in range(sentences)]
+    return {
+        "title": f"Synthetic study {index}: the {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} of {subject}",
+        "authors": f"Author {rng.randrange(1000)}, Author {rng.randrange(1000)}",
+        "publication_year": rng.randrange(1990, 2025),
+        "abstract": " ".join(body[:3]),
+        "full_text": " ".join(body),
+        "source_type": rng.choice(["paper", "textbook", "course_material"]),
+    }
+
+
+def paraphrase(text, rng):
+    words = [SYNONYMS.get(word, word) if rng.random() < 0.6 else word for word in text.split(" ")]
+    sentences = " ".join(words).split(". ")
+    # swap neighbouring sentences now and then
+    for i in range(0, len(sentences) - 1, 2):
+        if rng.random() < 0.3:
+            sentences[i], sentences[i + 1] = sentences[i + 1], sentences[i]
+    return ". ".join(sentences)
+
+
+def synthetic_assignment(seed, index, source_count, kinds):
+    """
+    Returns (title, text, manifest entry). `kinds` maps "original", "copied" and
+    "paraphrased" to their share of the assignments.
+    """
+    rng = random.Random(f"{seed}-assignment-{index}")
+    kind = rng.choices(list(kinds), weights=list(kinds.values()))[0]
+    own = [_sentence(rng, rng.choice(SUBJECTS)) for _ in range(rng.randrange(15, 30))]
+    used = []
+    if kind != "original":
+        used = rng.sample(range(source_count), k=min(source_count, rng.randrange(1, 3)))
+        for source_index in used:
+            sentences = synthetic_source(seed, source_index)["full_text"].split(". ")
+            start = rng.randrange(max(len(sentences) - 10, 1))
+            passage = ". ".join(sentences[start:start + 10])
+            if kind == "paraphrased":
+                passage = paraphrase(passage, rng)
+            own.insert(rng.randrange(len(own) + 1), passage)
+    title = f"Synthetic assignment {index} ({kind})"
+    return title, " ".join(own), {"index": index, "kind": kind, "source_indexes": used}
+
+
+def _write_assignment(job):
+    seed, index, source_count, kinds, output_dir = job
+    title, text, entry = synthetic_assignment(seed, index, source_count, kinds)
+    file_path = os.path.join(output_dir, "assignments", f"assignment_{index:06d}.pdf")
+    write_pdf(file_path, title, text)
+    return {**entry, "file": file_path}
+
+
+def _source_line(job):
+    seed, index = job
+    return json.dumps(synthetic_source(seed, index))
+
+
+def generate_corpus(sources, assignments, output_dir, workers=None, seed=0, kinds=None):
+    """
+    Writes `sources.jsonl` (N synthetic sources, ingest it with ingest_data.py), M assignment
+    PDFs and `assignments.jsonl` with the kind and the source lines every assignment copies.
+    Sources and PDFs are generated in parallel on `workers` processes.
+    """
+    kinds = kinds or {"original": 0.4, "copied": 0.3, "paraphrased": 0.3}
+    os.makedirs(os.path.join(output_dir, "assignments"), exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        with open(os.path.join(output_dir, "sources.jsonl"), "w") as f:
+            for line in executor.map(_source_line, [(seed, i) for i in range(sources)], chunksize=256):
+                f.write(line + "\n")
+        print(f"Wrote {sources} sources to {output_dir}/sources.jsonl")
+
+        jobs = [(seed, i, sources, kinds, output_dir) for i in range(assignments)]
+        with open(os.path.join(output_dir, "assignments.jsonl"), "w") as f:
+            for entry in executor.map(_write_assignment, jobs, chunksize=16):
+                f.write(json.dumps(entry) + "\n")
+        print(f"Wrote {assignments} assignments to {output_dir}/assignments")
+
+
+def generate_sample_papers():
     db = SessionLocal()
     try:
         academic_sources = db.query(AcademicSource).all()
@@ -116,3 +235,20 @@ if __name__ == "__main__":
             generate_original_paper()
     finally:
         db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate test papers.")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Generate a synthetic corpus for load tests instead of the three sample papers")
+    parser.add_argument("--sources", type=int, default=1000)
+    parser.add_argument("--assignments", type=int, default=100)
+    parser.add_argument("--output-dir", default="/app/generated_corpus")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: one per CPU)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        generate_corpus(args.sources, args.assignments, args.output_dir, workers=args.workers, seed=args.seed)
+    else:
+        generate_sample_papers()
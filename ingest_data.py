@@ -1,81 +1,348 @@
+import argparse
+import hashlib
 import json
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import sqlalchemy as sa
-from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import sessionmaker
-from google import genai
 from pgvector.sqlalchemy import Vector
 from pgvector.psycopg2 import register_vector
+from tenacity import retry, stop_after_attempt, wait_exponential
 
 from settings import settings
-from models import Base, AcademicSource
+from database import create_db_engine
+from models import Base, AcademicSource, SourceChunk
+from plagiarism import index_sources
+from chunking import chunk_text
+from vector_snapshot import read_manifest, refresh_snapshot
+from embeddings import embedding_provider
 
-# Database setup
-SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Database setup, a single connection is enough as batches are written in order
+engine = create_db_engine(name="ingest", pool_size=1, max_overflow=1)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Gemini client setup
-client = genai.Client(api_key=settings.GEMINI_API_KEY)
-
-from google.genai import types
+# --- constants ---
+DEFAULT_BATCH_SIZE = 50  # source texts per batch, the provider splits them into calls of its own max size
+DEFAULT_CONCURRENCY = 4
+READ_CHUNK_SIZE = 64 * 1024
 
 ...
 
-def get_embedding(text: str, model: str = "gemini-embedding-001", dimension: int = 1536):
+@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, max=30), reraise=True)
+def get_embeddings(texts: list[str]):
+    """
+    Embeds many texts with the configured embedding provider, retrying transient failures with backoff.
+
+    Returns:
+        A list of embedding vectors, in the same order as `texts`.
+    """
+    return embedding_provider.embed_many(texts)
+
+
+def content_hash(full_text: str) -> str:
+    """
+    SHA-256 of the whitespace-normalized full text, used to skip sources that are already ingested.
+    """
+    return hashlib.sha256(" ".join(full_text.split()).encode("utf-8")).hexdigest()
+
+
+def iter_json_records(json_file_path: str):
+    """
+    Streams records from a JSON array (or a JSON Lines file) without loading the whole file.
+    """
+    if json_file_path.endswith((".jsonl", ".ndjson")):
+        with open(json_file_path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    decoder = json.JSONDecoder()
+    with open(json_file_path, "r") as f:
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+        while True:
+            # skip whitespace and separators between records
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position < len(buffer):
+                if not started:
+                    if buffer[position] != "[":
+                        raise ValueError(f"{json_file_path} must contain a JSON array")
+                    started = True
+                    position += 1
+                    continue
+                if buffer[position] == "]":
+                    return
+                try:
+                    record, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield record
+                    continue
+
+            if eof:
+                raise ValueError(f"Unexpected end of file in {json_file_path}")
+
+            # the current record is incomplete, read more
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def load_checkpoint(checkpoint_path: str, json_file_path: str) -> int:
+    """
+    Returns how many input records a previous run already committed (0 if none).
+    """
+    if not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path, "r") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != os.path.abspath(json_file_path):
+        return 0
+    return checkpoint.get("records", 0)
+
+
+def save_checkpoint(checkpoint_path: str, json_file_path: str, records: int, inserted: int):
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {"source": os.path.abspath(json_file_path), "records": records, "inserted": inserted},
+            f,
+        )
+    os.replace(tmp_path, checkpoint_path)  # atomic, a crash never leaves a torn checkpoint
+
+
+def _prepare_batch(db, records, seen_hashes: set):
+    """
+    Drops records without text, duplicates within this run and records whose
+    content hash is already stored, so no embedding is requested for them.
+    """
+    rows = {}
+    for source_data in records:
+        full_text = source_data.get("full_text", "")
+        if not full_text:
+            print(f"Skipping source due to missing full_text: {source_data.get('title', 'N/A')}")
+            continue
+        digest = content_hash(full_text)
+        if digest in seen_hashes:
+            continue
+        seen_hashes.add(digest)
+        rows[digest] = {
+            "title": source_data.get("title"),
+            "authors": source_data.get("authors"),
+            "publication_year": source_data.get("publication_year"),
+            "abstract": source_data.get("abstract"),
+            "full_text": full_text,
+            "source_type": source_data.get("source_type"),
+            "content_hash": digest,
+        }
+
+    if rows:
+        existing = db.execute(
+            sa.select(AcademicSource.content_hash).where(AcademicSource.content_hash.in_(rows))
+        ).scalars().all()
+        for digest in existing:
+            del rows[digest]
+    return list(rows.values())
+
+
+def _embed_chunks(full_texts: list[str]) -> list[list[dict]]:
+    """
+    Chunks every text and embeds all chunks in as few provider calls as possible.
+
+    Returns:
+        For every text, its `source_chunks` rows without `source_id`.
+    """
+    chunk_rows = []
+    for full_text in full_texts:
+        chunk_rows.append([
+            {
+                "chunk_index": chunk.index,
+                "start_char": chunk.start_char,
+                "end_char": chunk.end_char,
+                "token_count": chunk.token_count,
+                "text": chunk.text,
+            }
+            for chunk in chunk_text(full_text)
+        ])
+
+    flat = [row for rows in chunk_rows for row in rows]
+    for start in range(0, len(flat), embedding_provider.max_batch_size):
+        part = flat[start:start + embedding_provider.max_batch_size]
+        for row, embedding in zip(part, get_embeddings([row.pop("text") for row in part])):
+            row["embedding"] = embedding
+    return chunk_rows
+
+
+def _embed_batch(rows):
     """
-    Generates an embedding for the given text using Google Gemini API.
-    
-    Args:
-        text: The text to embed.
-        model: The Gemini embedding model to use.
-        dimension: Output dimension (e.g., 1536 to match DB column).
-        
+    Embeds the full text of every source and its chunks.
+
     Returns:
-        A list of floats representing the embedding vector.
+        (rows, chunks) where `chunks` maps a content hash to the chunk rows of that source.
     """
-    text = text.replace("\n", " ")
-    result = client.models.embed_content(
-        model=model,
-        contents=[text],
-        config=types.EmbedContentConfig(output_dimensionality=dimension)
+    embeddings = get_embeddings([row["full_text"] for row in rows]) if rows else []
+    for row, embedding in zip(rows, embeddings):
+        row["embedding"] = embedding
+    chunks = _embed_chunks([row["full_text"] for row in rows])
+    return rows, {row["content_hash"]: source_chunks for row, source_chunks in zip(rows, chunks)}
+
+
+def _write_chunks(db, chunks_by_source: list[tuple[int, list[dict]]]):
+    rows = [
+        {"source_id": source_id, **chunk}
+        for source_id, source_chunks in chunks_by_source
+        for chunk in source_chunks
+    ]
+    if rows:
+        db.execute(insert(SourceChunk), rows)
+
+
+def _write_batch(db, batch) -> int:
+    """
+    Bulk inserts one batch in its own transaction, together with the chunks and the
+    plagiarism index entries of the new sources; returns the number of new rows.
+    """
+    rows, chunks = batch
+    if not rows:
+        return 0
+    result = db.execute(
+        insert(AcademicSource)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+        .returning(AcademicSource.id, AcademicSource.content_hash)
     )
-    return result.embeddings[0].values
+    texts = {row["content_hash"]: row["full_text"] for row in rows}
+    inserted = [(source_id, digest) for source_id, digest in result.all()]
+    _write_chunks(db, [(source_id, chunks[digest]) for source_id, digest in inserted])
+    index_sources(db, [(source_id, texts[digest]) for source_id, digest in inserted])
+    db.commit()
+    return len(inserted)
 
-def ingest_academic_sources(json_file_path: str):
+
+def rechunk_sources(batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Re-chunks and re-embeds the chunks of every stored source, e.g. after the chunk
+    settings changed or for sources ingested before `source_chunks` existed.
+    Every batch replaces its sources' chunks in one transaction.
+    """
     db = SessionLocal()
     try:
-        with open(json_file_path, 'r') as f:
-            sources_data = json.load(f)
-
-        for source_data in sources_data:
-            full_text = source_data.get("full_text", "")
-            if not full_text:
-                print(f"Skipping source due to missing full_text: {source_data.get('title', 'N/A')}")
-                continue
-
-            embedding = get_embedding(full_text)
-            
-            academic_source = AcademicSource(
-                title=source_data.get("title"),
-                authors=source_data.get("authors"),
-                publication_year=source_data.get("publication_year"),
-                abstract=source_data.get("abstract"),
-                full_text=full_text,
-                source_type=source_data.get("source_type"),
-                embedding=embedding
-            )
-            db.add(academic_source)
-        
-        db.commit()
-        print(f"Successfully ingested {len(sources_data)} academic sources.")
+        last_id = 0
+        total = 0
+        while True:
+            sources = db.execute(
+                sa.select(AcademicSource.id, AcademicSource.full_text)
+                .where(AcademicSource.id > last_id)
+                .order_by(AcademicSource.id)
+                .limit(batch_size)
+            ).all()
+            if not sources:
+                break
+            db.commit()  # end the read transaction while the batch is embedded
+            chunks = _embed_chunks([full_text or "" for _, full_text in sources])
+            source_ids = [source_id for source_id, _ in sources]
+            db.execute(sa.delete(SourceChunk).where(SourceChunk.source_id.in_(source_ids)))
+            _write_chunks(db, list(zip(source_ids, chunks)))
+            db.commit()
+            last_id = source_ids[-1]
+            total += len(sources)
+            print(f"Re-chunked {total} sources.")
+    finally:
+        db.close()
+
+
+def ingest_academic_sources(
+    json_file_path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    checkpoint_path: str | None = None,
+    resume: bool = True,
+):
+    """
+    Streams sources from `json_file_path`, embeds them in batches with a bounded number of
+    concurrent embedding calls and commits every batch with a single bulk insert.
+
+    Re-runs are idempotent: sources whose content hash is already stored are skipped
+    before embedding. Progress is checkpointed after every committed batch so an
+    interrupted run resumes where it stopped.
+    """
+    checkpoint_path = checkpoint_path or f"{json_file_path}.checkpoint"
+    skip = load_checkpoint(checkpoint_path, json_file_path) if resume else 0
+    if skip:
+        print(f"Resuming after {skip} already processed records.")
+
+    records = islice(iter_json_records(json_file_path), skip, None)
+    processed = skip
+    inserted = 0
+    pending = deque()  # (future, records consumed through this batch)
+    seen_hashes = set()
+
+    db = SessionLocal()
+
+    def flush_oldest():
+        nonlocal inserted
+        future, consumed = pending.popleft()
+        inserted += _write_batch(db, future.result())
+        save_checkpoint(checkpoint_path, json_file_path, consumed, inserted)
+        print(f"Committed {consumed} records ({inserted} new sources).")
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                processed += len(batch)
+                rows = _prepare_batch(db, batch, seen_hashes)
+                db.commit()  # end the read transaction while the batch is embedded
+                pending.append((executor.submit(_embed_batch, rows), processed))
+
+                # batches are written in input order so the checkpoint stays contiguous
+                while len(pending) >= concurrency:
+                    flush_oldest()
+
+            while pending:
+                flush_oldest()
+
+        print(f"Successfully ingested {inserted} new academic sources ({processed} records read).")
+        # API workers using SEARCH_BACKEND=numpy pick the new segment up on their next reload
+        if inserted and read_manifest(settings.VECTOR_SNAPSHOT_DIR) is not None:
+            print(f"Added {refresh_snapshot(db)} embeddings to the vector snapshot.")
     except Exception as e:
         db.rollback()
         print(f"Error during ingestion: {e}")
+        print(f"Committed batches are kept, re-run to resume from {checkpoint_path}.")
+        raise
     finally:
         db.close()
 
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest academic sources into the vector database.")
+    parser.add_argument(
+        "json_file",
+        nargs="?",
+        default="/app/data/sample_academic_sources.json",  # Path inside the container
+        help="JSON array or JSON Lines file of sources",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Texts per embedding call")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Embedding calls in flight")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <json_file>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    parser.add_argument("--rechunk", action="store_true", help="Re-chunk the stored sources instead of ingesting")
+    args = parser.parse_args()
+
     # Ensure the vector extension is enabled
     conn = engine.connect()
     conn.execute(sa.text("CREATE EXTENSION IF NOT EXISTS vector"))
@@ -85,5 +352,13 @@ if __name__ == "__main__":
     # Register pgvector type with psycopg2
     # register_vector(engine.raw_connection().connection)
 
-    json_file = "/app/data/sample_academic_sources.json" # Path inside the container
-    ingest_academic_sources(json_file)
+    if args.rechunk:
+        rechunk_sources(batch_size=args.batch_size)
+    else:
+        ingest_academic_sources(
+            args.json_file,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            checkpoint_path=args.checkpoint,
+            resume=not args.restart,
+        )
@@ -0,0 +1,295 @@
+"""
+Durable analysis job queue on top of the `analysis_jobs` table.
+
+Jobs are claimed with `SELECT ... FOR UPDATE SKIP LOCKED`, so any number of worker
+coroutines, in any number of processes, can poll the same table without handing
+out a job twice. Failed dispatches are retried with exponential backoff and jobs
+that exhaust their attempts are parked in the 'dead' state for inspection/replay.
+
+The API starts ANALYSIS_WORKER_CONCURRENCY workers in its lifespan; workers can
+also run as a separate process:
+
+    python job_queue.py --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+from datetime import timedelta
+
+import aiohttp
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from database import AsyncSessionLocal
+from extraction import extract_text_async
+from metrics import analysis_queue_wait
+from models import AnalysisJob, Assignment
+from n8n_client import remove_upload, send_to_n8n
+from notifications import notify_statement
+from plagiarism import detect_plagiarism
+from settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# --- states ---
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_DEAD = "dead"
+
+ASSIGNMENT_QUEUED = "queued"
+ASSIGNMENT_RUNNING = "running"  # dispatched, waiting for the n8n result
+ASSIGNMENT_FAILED = "failed"
+ASSIGNMENT_COMPLETED = "completed"
+
+# set by enqueue() so idle workers of this process wake up without waiting for the next poll
+_wakeup = asyncio.Event()
+
+
+def enqueue_analysis_job(db: AsyncSession, assignment: Assignment, email: str) -> AnalysisJob:
+    """
+    Adds a job to the caller's session, it becomes visible to workers when the caller commits.
+    """
+    assignment.status = ASSIGNMENT_QUEUED
+    job = AnalysisJob(
+        assignment=assignment,
+        email=email,
+        filename=assignment.filename,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    )
+    db.add(job)
+    return job
+
+
+def wake_workers():
+    _wakeup.set()
+
+
+def retry_delay(attempts: int) -> float:
+    delay = settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0)
+    return min(delay, settings.JOB_RETRY_BACKOFF_MAX_SECONDS)
+
+
+async def claim_next_job(db: AsyncSession) -> AnalysisJob | None:
+    """
+    Locks the next due job (or a 'running' job whose worker died) and marks it running.
+    """
+    stale_before = func.now() - timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS)
+    result = await db.execute(
+        select(AnalysisJob, func.extract("epoch", func.now() - AnalysisJob.run_after))
+        .where(
+            or_(
+                and_(AnalysisJob.status == JOB_QUEUED, AnalysisJob.run_after <= func.now()),
+                and_(AnalysisJob.status == JOB_RUNNING, AnalysisJob.locked_at < stale_before),
+            )
+        )
+        .order_by(AnalysisJob.run_after, AnalysisJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    row = result.first()
+    if row is None:
+        await db.commit()
+        return None
+
+    job, due_seconds = row
+    if job.status == JOB_QUEUED:  # not for jobs taken over from a dead worker
+        analysis_queue_wait.observe(max(float(due_seconds), 0.0))
+    job.status = JOB_RUNNING
+    job.attempts += 1
+    job.locked_at = func.now()
+    await db.execute(
+        update(Assignment)
+        .where(Assignment.id == job.assignment_id, Assignment.status != ASSIGNMENT_COMPLETED)
+        .values(status=ASSIGNMENT_RUNNING)
+    )
+    await db.execute(notify_statement(job.assignment_id))
+    await db.commit()
+    return job
+
+
+async def _load_text(job: AnalysisJob) -> tuple[str, int | None, dict | None]:
+    async with AsyncSessionLocal() as db:
+        assignment = await db.get(Assignment, job.assignment_id)
+        if assignment.original_text is None and job.file_path:
+            # jobs queued before text extraction moved into the upload handler still carry the file
+            assignment.original_text, assignment.word_count = await extract_text_async(
+                job.file_path, job.content_type
+            )
+            await db.commit()
+
+        report = None
+        try:
+            report = (await detect_plagiarism(db, assignment.original_text or "")).model_dump()
+        except Exception as e:
+            # the analysis still goes out, n8n just gets no local score
+            logger.warning(f"Local plagiarism check failed for assignment {job.assignment_id}: {e!r}")
+        return assignment.original_text, assignment.word_count, report
+
+
+async def _dispatch(job: AnalysisJob):
+    original_text, word_count, plagiarism = await _load_text(job)
+
+    # short in-attempt retries for network blips, longer backoff happens at the job level
+    async for attempt in AsyncRetrying(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=0.5, max=5),
+        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError)),
+        reraise=True,
+    ):
+        with attempt:
+            await send_to_n8n(
+                job.assignment_id, job.email, job.filename, original_text, word_count, plagiarism
+            )
+
+
+async def _finish_job(db: AsyncSession, job: AnalysisJob, error: Exception | None):
+    """
+    Writes the outcome of the attempt this worker claimed. A worker that ran past
+    JOB_VISIBILITY_TIMEOUT_SECONDS may have lost the job to another worker, which
+    claimed it with a higher attempt count; its outcome is then dropped.
+    """
+    values = {"locked_at": None}
+    if error is None:
+        values.update(status=JOB_SUCCEEDED, last_error=None)
+        assignment_status = ASSIGNMENT_RUNNING
+    elif job.attempts >= job.max_attempts:
+        values.update(status=JOB_DEAD, last_error=repr(error))
+        assignment_status = ASSIGNMENT_FAILED
+    else:
+        delay = retry_delay(job.attempts)
+        values.update(status=JOB_QUEUED, last_error=repr(error), run_after=func.now() + timedelta(seconds=delay))
+        assignment_status = ASSIGNMENT_QUEUED
+
+    # job is detached, its attempts are still the ones set when this worker claimed it
+    result = await db.execute(
+        update(AnalysisJob)
+        .where(AnalysisJob.id == job.id, AnalysisJob.status == JOB_RUNNING, AnalysisJob.attempts == job.attempts)
+        .values(**values)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        logger.warning(
+            f"Analysis job {job.id} was taken over by another worker, dropping the outcome of attempt {job.attempts}"
+        )
+        return
+
+    await db.execute(
+        update(Assignment)
+        .where(Assignment.id == job.assignment_id, Assignment.status != ASSIGNMENT_COMPLETED)
+        .values(status=assignment_status)
+    )
+    await db.execute(notify_statement(job.assignment_id))
+    await db.commit()
+
+    if error is None:
+        remove_upload(job.file_path)
+    elif values["status"] == JOB_DEAD:
+        logger.error(f"Analysis job {job.id} moved to dead-letter after {job.attempts} attempts: {error!r}")
+    else:
+        logger.warning(f"Analysis job {job.id} failed (attempt {job.attempts}), retrying in {delay:.0f}s: {error!r}")
+
+
+async def run_one_job() -> bool:
+    """
+    Claims and processes a single job. Returns False when no job was due.
+    """
+    async with AsyncSessionLocal() as db:
+        job = await claim_next_job(db)
+    if job is None:
+        return False
+
+    error = None
+    try:
+        await _dispatch(job)
+    except Exception as e:
+        error = e
+
+    async with AsyncSessionLocal() as db:
+        await _finish_job(db, job, error)
+    return True
+
+
+async def worker_loop(worker_id: int):
+    while True:
+        try:
+            if await run_one_job():
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # database hiccups must not kill the worker
+            logger.exception(f"Analysis worker {worker_id} crashed on a job: {e}")
+
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+class WorkerPool:
+    """
+    A fixed number of worker coroutines polling the job table.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self.tasks = [
+            asyncio.create_task(worker_loop(i), name=f"analysis-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+
+async def requeue_job(db: AsyncSession, job_id: int) -> AnalysisJob | None:
+    """
+    Moves a dead-lettered job back to the queue with a fresh attempt budget.
+    """
+    job = await db.get(AnalysisJob, job_id)
+    if job is None or job.status != JOB_DEAD:
+        return None
+    job.status = JOB_QUEUED
+    job.attempts = 0
+    job.run_after = func.now()
+    # the result may have arrived although the dispatch was reported as failed
+    await db.execute(
+        update(Assignment)
+        .where(Assignment.id == job.assignment_id, Assignment.status != ASSIGNMENT_COMPLETED)
+        .values(status=ASSIGNMENT_QUEUED)
+    )
+    await db.execute(notify_statement(job.assignment_id))
+    await db.commit()
+    wake_workers()
+    return job
+
+
+async def _run_standalone(concurrency: int):
+    from n8n_client import close_http_client, start_http_client
+
+    await start_http_client()
+    pool = WorkerPool(concurrency)
+    pool.start()
+    try:
+        await asyncio.gather(*pool.tasks)
+    finally:
+        await pool.stop()
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run analysis job workers.")
+    parser.add_argument("--concurrency", type=int, default=settings.ANALYSIS_WORKER_CONCURRENCY or 4)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run_standalone(args.concurrency))
@@ -4,77 +4,149 @@ from fastapi import (
     HTTPException,
     status,
     File,
+    Query,
     UploadFile,
     APIRouter,
     Security,
-    BackgroundTasks,
+    Header,
+    Response,
+    Body,
 )
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security.api_key import APIKeyHeader
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Integer, Text, column, func, select, tuple_, update, values
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased, joinedload, load_only
+from contextlib import asynccontextmanager
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+from datetime import datetime
 from typing import List
-import aiohttp
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import uvicorn
 import os
 
-from auth import auth_router, get_current_user
+from auth import Principal, auth_router, get_auth_cache_stats, get_current_user
 from models import (
-    Student,
     AcademicSourceResponse,
     Assignment,
     AnalysisResultResponse,
+    AssignmentListResponse,
+    AssignmentSummary,
     N8nAnalysisResultCreate,
     AnalysisResult,
-    AcademicSource
+    AcademicSource,
+    PlagiarismReport,
+    AssignmentSimilarityReport,
+    N8nAnalysisResultBatchItem,
+    N8nAnalysisResultBatchResponse,
+    AnalysisJob,
+)
+from database import AsyncSessionLocal, get_async_db, get_db, get_pool_stats
+from rag_service import (
+    MatryoshkaIndexMismatch,
+    check_prefix_index,
+    find_relevant_passages,
+    find_relevant_sources,
+    PassageAggregate,
+    Quantization,
+    SearchBackend,
+    SearchMetric,
+    SearchMode,
+)
+from vector_snapshot import vector_snapshot
+from embedding_cache import embedding_cache
+from embeddings import embedding_provider
+from metrics import (
+    RequestMetricsMiddleware,
+    analysis_end_to_end,
+    analysis_workflow,
+    clear_multiprocess_dir,
+    render_metrics,
+)
+from passwords import password_hasher
+from profiling import ProfilingMiddleware, list_profiles, profile_path
+from notifications import analysis_notifier, notify_many_statement
+from plagiarism import detect_plagiarism
+from similarity import analyze_assignment
+from n8n_client import (
+    UploadTooLarge,
+    close_http_client,
+    remove_upload,
+    save_upload,
+    start_http_client,
+)
+from extraction import (
+    DOCX_MIME_TYPE,
+    PDF_MIME_TYPE,
+    ExtractionError,
+    ExtractionUnavailable,
+    extract_text_async,
+    shutdown_extraction_pool,
+    start_extraction_pool,
+)
+from job_queue import (
+    ASSIGNMENT_COMPLETED,
+    ASSIGNMENT_FAILED,
+    JOB_SUCCEEDED,
+    WorkerPool,
+    enqueue_analysis_job,
+    requeue_job,
+    wake_workers,
 )
-from database import get_db
-from rag_service import find_relevant_sources, get_embedding
 from settings import settings
 
+logger = logging.getLogger("uvicorn.error")
+
 # --- initialization ---
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one pooled keep-alive HTTP client for the lifetime of the worker
+    await start_http_client()
+    # text extraction and password hashing are CPU-bound, they run in their own processes
+    start_extraction_pool()
+    password_hasher.start()
+    # wakes up long-polls and event streams when an analysis changes, in any worker
+    analysis_notifier.start()
+    workers = WorkerPool(settings.ANALYSIS_WORKER_CONCURRENCY)
+    workers.start()
+    embedding_cache.start_pruning()
+    # a prefix index built for another MATRYOSHKA_DIMENSION is silently ignored by the planner
+    try:
+        async with AsyncSessionLocal() as db:
+            await check_prefix_index(db)
+    except Exception as e:
+        logger.warning(f"Could not check the Matryoshka prefix index: {e!r}")
+    yield
+    await embedding_cache.stop_pruning()
+    await workers.stop()
+    await analysis_notifier.stop()
+    password_hasher.shutdown()
+    shutdown_extraction_pool()
+    await close_http_client()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 # --- Constants ---
 ALLOWED_MIME_TYPES = [
-    "application/pdf",
-    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    PDF_MIME_TYPE,
+    DOCX_MIME_TYPE,
 ]
 MAX_FILE_SIZE_MB = 5  # in mbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb
 MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024  # in bites
+# /analysis statuses after which nothing changes anymore
+ANALYSIS_FINAL_STATUSES = {ASSIGNMENT_COMPLETED.capitalize(), ASSIGNMENT_FAILED.capitalize()}
 INTERNAL_API_KEY_HEADER = APIKeyHeader(
     name="X-API-Key", scheme_name="Internal API Key", auto_error=True
 )
 
-# --- helpers ---
-async def send_to_n8n(assignment_id: int, email: str, file: UploadFile):
-    # Move the file pointer to the beginning just in case
-    file.file.seek(0)
-    
-    # read files in-memory
-    file_bytes = await file.read()
-
-
-    async with aiohttp.ClientSession() as session:
-        data = aiohttp.FormData()
-        data.add_field(
-            "data",
-            file_bytes,
-            filename=file.filename,
-            content_type=file.content_type,
-        )
-
-        headers = {
-            # "Content-Type": "multipart/form-data",
-            "X-API-Key": settings.INTERNAL_API_KEY,
-        }
-
-        async with session.post(
-            f'{settings.N8N_WEBHOOK_URL}?id={assignment_id}&email={email}', data=data, headers=headers
-        ) as response:
-            response.raise_for_status()
-
-
 # --- router dependents ---
 async def get_internal_api_key(
     api_key_header: str = Security(INTERNAL_API_KEY_HEADER),
@@ -100,6 +172,93 @@ internal_router = APIRouter(
 )
 
 
+def _apply_analysis_results(db: Session, results: List[N8nAnalysisResultCreate]) -> set[int]:
+    """
+    Applies n8n results with set-based SQL in the caller's transaction: one UPDATE ... FROM
+    VALUES for the assignments and one multi-row upsert for the analysis results, a
+    repeated callback replaces the earlier result. At most one result per assignment.
+
+    Returns:
+        The assignment ids that exist and were updated, results for other ids are ignored.
+    """
+    if not results:
+        return set()
+    rows = values(
+        column("id", Integer),
+        column("original_text", Text),
+        column("topic", Text),
+        column("academic_level", Text),
+        column("word_count", Integer),
+        name="incoming",
+    ).data([
+        (r.assignment_id, r.original_text, r.topic, r.academic_level, r.word_count)
+        for r in results
+    ])
+    # the self-join sees the row as it was before the update, so repeated callbacks are not timed again
+    previous = aliased(Assignment)
+    dispatched_at = (
+        select(func.max(AnalysisJob.updated_at))
+        .where(AnalysisJob.assignment_id == Assignment.id, AnalysisJob.status == JOB_SUCCEEDED)
+        .scalar_subquery()
+    )
+    updated = db.execute(
+        update(Assignment)
+        .where(Assignment.id == rows.c.id, previous.id == Assignment.id)
+        .values(
+            original_text=rows.c.original_text,
+            topic=rows.c.topic,
+            academic_level=rows.c.academic_level,
+            word_count=rows.c.word_count,
+            status=ASSIGNMENT_COMPLETED,
+        )
+        .returning(
+            Assignment.id,
+            previous.status,
+            func.extract("epoch", func.now() - Assignment.uploaded_at),
+            func.extract("epoch", func.now() - dispatched_at),
+        )
+    ).all()
+    found = {assignment_id for assignment_id, _, _, _ in updated}
+    if not found:
+        return found
+    for _, previous_status, since_upload, since_dispatch in updated:
+        if previous_status == ASSIGNMENT_COMPLETED:
+            continue
+        if since_upload is not None:
+            analysis_end_to_end.observe(max(float(since_upload), 0.0))
+        if since_dispatch is not None:  # None when n8n answered before the job was marked done
+            analysis_workflow.observe(max(float(since_dispatch), 0.0))
+
+    insert_stmt = pg_insert(AnalysisResult).values([
+        {
+            "assignment_id": r.assignment_id,
+            "suggested_sources": r.suggested_sources,
+            "plagiarism_score": r.plagiarism_score,
+            "research_suggestions": r.research_suggestions,
+            "citation_recommendations": r.citation_recommendations,
+            "confidence_score": r.confidence_score,
+        }
+        for r in results
+        if r.assignment_id in found
+    ])
+    db.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=["assignment_id"],
+            set_={
+                "suggested_sources": insert_stmt.excluded.suggested_sources,
+                "plagiarism_score": insert_stmt.excluded.plagiarism_score,
+                "research_suggestions": insert_stmt.excluded.research_suggestions,
+                "citation_recommendations": insert_stmt.excluded.citation_recommendations,
+                "confidence_score": insert_stmt.excluded.confidence_score,
+                "analyzed_at": func.now(),
+            },
+        )
+    )
+    # delivered on commit, wakes up clients waiting on these assignments
+    db.execute(notify_many_statement(sorted(found)))
+    return found
+
+
 @internal_router.post("/analysis-results")
 def create_analysis_result(
     result_data: N8nAnalysisResultCreate, db: Session = Depends(get_db)
@@ -107,74 +266,267 @@ def create_analysis_result(
     """
     Internal endpoint for n8n to post analysis results.
     """
-    db_assignment = (
-        db.query(Assignment)
-        .filter(Assignment.id == result_data.assignment_id)
-        .first()
-    )
-    if not db_assignment:
+    if not _apply_analysis_results(db, [result_data]):
         raise HTTPException(status_code=404, detail="Assignment not found")
+    db.commit()
 
-    # Update Assignment table
-    db_assignment.original_text = result_data.original_text
-    db_assignment.topic = result_data.topic
-    db_assignment.academic_level = result_data.academic_level
-    db_assignment.word_count = result_data.word_count
-
-    # Create AnalysisResult record
-    db_analysis_result = AnalysisResult(
-        assignment_id=result_data.assignment_id,
-        suggested_sources=result_data.suggested_sources,
-        plagiarism_score=result_data.plagiarism_score,
-        research_suggestions=result_data.research_suggestions,
-        citation_recommendations=result_data.citation_recommendations,
-        confidence_score=result_data.confidence_score,
-    )
+    return {"message": "Analysis result created successfully"}
+
+
+@internal_router.post("/analysis-results/batch", response_model=N8nAnalysisResultBatchResponse)
+def create_analysis_results_batch(
+    items: List[dict] = Body(...), db: Session = Depends(get_db)
+):
+    """
+    Internal endpoint to post many analysis results in one transaction (backlog replays,
+    bulk re-analysis). Items are validated one by one, so a bad item does not reject the
+    batch; the response reports the status of every item, in request order.
+    """
+    if len(items) > settings.ANALYSIS_RESULTS_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.ANALYSIS_RESULTS_BATCH_MAX} results per batch.",
+        )
 
-    db.add(db_analysis_result)
+    statuses: list[N8nAnalysisResultBatchItem] = []
+    latest: dict[int, tuple[int, N8nAnalysisResultCreate]] = {}
+    for index, item in enumerate(items):
+        try:
+            result = N8nAnalysisResultCreate.model_validate(item)
+        except ValidationError as e:
+            statuses.append(N8nAnalysisResultBatchItem(
+                index=index,
+                assignment_id=item.get("assignment_id") if isinstance(item.get("assignment_id"), int) else None,
+                status="invalid",
+                detail=str(e),
+            ))
+            continue
+        if result.assignment_id in latest:
+            superseded_index, _ = latest[result.assignment_id]
+            statuses[superseded_index].status = "superseded"
+        latest[result.assignment_id] = (index, result)
+        statuses.append(N8nAnalysisResultBatchItem(index=index, assignment_id=result.assignment_id, status="upserted"))
+
+    found = _apply_analysis_results(db, [result for _, result in latest.values()])
     db.commit()
-    db.refresh(db_analysis_result)
 
-    return {"message": "Analysis result created successfully"}
+    for index, result in latest.values():
+        if result.assignment_id not in found:
+            statuses[index].status = "not_found"
+            statuses[index].detail = "Assignment not found"
+    return N8nAnalysisResultBatchResponse(upserted=len(found), items=statuses)
 
 
 @internal_router.get("/sources", response_model=List[AcademicSourceResponse])
 async def get_academic_sources(
     q: str,
-    db: Session = Depends(get_db),
+    metric: SearchMetric = "cosine",
+    mode: SearchMode = "vector",
+    backend: SearchBackend | None = None,
+    quantization: Quantization | None = None,
+    top_k: int = Query(5, ge=1, le=50),
+    ef_search: int | None = Query(None, ge=1, le=1000),
+    probes: int | None = Query(None, ge=1, le=1000),
+    passages: bool = False,
+    aggregate: PassageAggregate = "max",
+    passages_per_source: int = Query(3, ge=1, le=20),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Searches for academic sources relevant to the query string 'q' and returns them with a similarity score.
+    With `passages=true` sources are ranked by their best matching chunks, which are returned as snippets.
+    `mode` selects vector (default), lexical (full-text only, no embedding call) or hybrid search.
+    `backend` and `quantization` override SEARCH_BACKEND and EMBEDDING_QUANTIZATION.
     """
     if not q:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Query parameter 'q' cannot be empty.",
         )
+    if passages and mode != "vector":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Passage search only supports mode=vector.",
+        )
 
-    # Get relevant sources from the database (ordered by similarity)
-    relevant_sources_db = find_relevant_sources(query_text=q, db=db)
-
-    # Calculate query embedding
-    query_embedding = np.array(get_embedding(q)).reshape(1, -1)
+    if passages:
+        scored_sources = await find_relevant_passages(
+            query_text=q,
+            db=db,
+            top_k=top_k,
+            metric=metric,
+            aggregate=aggregate,
+            passages_per_source=passages_per_source,
+            ef_search=ef_search,
+            probes=probes,
+        )
+        return [
+            AcademicSourceResponse(
+                id=source.id,
+                title=source.title,
+                authors=source.authors,
+                publication_year=source.publication_year,
+                abstract=source.abstract,
+                source_type=source.source_type,
+                similarity_score=score,
+                passages=source_passages,
+            )
+            for source, score, source_passages in scored_sources
+        ]
+
+    # Scores come straight from the database, in the same query as the ranking
+    try:
+        scored_sources = await find_relevant_sources(
+            query_text=q,
+            db=db,
+            top_k=top_k,
+            metric=metric,
+            ef_search=ef_search,
+            probes=probes,
+            mode=mode,
+            backend=backend,
+            quantization=quantization,
+        )
+    except MatryoshkaIndexMismatch as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
-    # Prepare response with similarity scores
-    response_sources = []
-    for source in relevant_sources_db:
-        source_embedding = np.array(source.embedding).reshape(1, -1)
-        similarity = cosine_similarity(query_embedding, source_embedding)[0][0]
-        
-        response_sources.append(AcademicSourceResponse(
+    return [
+        AcademicSourceResponse(
             id=source.id,
             title=source.title,
             authors=source.authors,
             publication_year=source.publication_year,
             abstract=source.abstract,
             source_type=source.source_type,
-            similarity_score=float(similarity)
-        ))
-    
-    return response_sources
+            similarity_score=score,
+        )
+        for source, score in scored_sources
+    ]
+
+
+@internal_router.get("/assignments/{assignment_id}/plagiarism", response_model=PlagiarismReport)
+async def get_plagiarism_report(assignment_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Scores an assignment against the local MinHash/LSH index of academic sources.
+    """
+    assignment = await db.get(Assignment, assignment_id)
+    if assignment is None or assignment.original_text is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Assignment not found or its text has not been extracted yet.",
+        )
+    return await detect_plagiarism(db, assignment.original_text)
+
+
+@internal_router.get("/assignments/{assignment_id}/similarity", response_model=AssignmentSimilarityReport)
+async def get_similarity_report(
+    assignment_id: int,
+    threshold: float | None = Query(None, ge=-1, le=1),
+    matches_per_passage: int | None = Query(None, ge=1, le=20),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Matches every passage of an assignment against the source passages in one batched pass.
+    """
+    assignment = await db.get(Assignment, assignment_id)
+    if assignment is None or assignment.original_text is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Assignment not found or its text has not been extracted yet.",
+        )
+    return await analyze_assignment(
+        db, assignment.original_text, threshold=threshold, matches_per_passage=matches_per_passage
+    )
+
+
+@internal_router.post("/jobs/{job_id}/retry")
+async def retry_analysis_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Requeues a dead-lettered analysis job.
+    """
+    job = await requeue_job(db, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No dead-lettered job with this id.",
+        )
+    return {"message": "Job requeued", "assignment_id": job.assignment_id}
+
+
+@internal_router.get("/embedding-cache/stats")
+async def get_embedding_cache_stats():
+    """
+    Hit/miss and eviction counters of this worker's embedding cache.
+    """
+    return embedding_cache.stats()
+
+
+@internal_router.get("/embeddings/stats")
+async def get_embedding_provider_stats():
+    """
+    Calls, errors, timeouts and mean call latency of this worker's embedding provider.
+    """
+    return embedding_provider.stats()
+
+
+@internal_router.get("/profiles")
+async def get_profiles():
+    """
+    Stored request profiles of all workers, newest first (see profiling.py).
+    """
+    return await asyncio.to_thread(list_profiles)
+
+
+@internal_router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str):
+    """
+    Downloads one request profile as a self-contained pyinstrument HTML page.
+    """
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="text/html", filename=f"profile-{profile_id}.html")
+
+
+@internal_router.get("/auth-cache/stats")
+async def get_auth_cache_statistics():
+    """
+    Hit/miss counters of this worker's verified-token and principal caches.
+    """
+    return get_auth_cache_stats()
+
+
+@internal_router.get("/password-hasher/stats")
+async def get_password_hasher_stats():
+    """
+    Running, waiting and rejected password hashes of this worker's bcrypt pool.
+    """
+    return password_hasher.stats()
+
+
+@internal_router.get("/vector-snapshot/stats")
+async def get_vector_snapshot_stats():
+    """
+    Generation and size of the embedding snapshot mapped by this worker.
+    """
+    vector_snapshot.maybe_reload()
+    return vector_snapshot.stats()
+
+
+@internal_router.get("/notifications/stats")
+async def get_notification_stats():
+    """
+    Listener state and waiting requests of this worker's analysis notifier.
+    """
+    return analysis_notifier.stats()
+
+
+@internal_router.get("/pool-stats")
+async def get_database_pool_stats():
+    """
+    Connection pool contention of this worker: checkout wait times, checked-out connections and overflow events.
+    """
+    return get_pool_stats()
 
 
 
@@ -189,11 +541,19 @@ async def read_root():
     return {"Hello": "World"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """
+    Prometheus metrics in text format, for all workers when PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/upload")
 async def upload_assignment(
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    current_user: Student = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
     file: UploadFile = File(...),
 ):
     """
@@ -207,56 +567,122 @@ async def upload_assignment(
             detail=f"Invalid file type. Only PDF and DOCX allowed.",
         )
 
-    # Check file size
-    file.file.seek(0, 2)  # move to end of file
-    file_size = file.file.tell()
-    file.file.seek(0)  # reset pointer to start
-    if file_size > MAX_FILE_SIZE:
+    # Store the upload in chunks, checking the size as we go
+    try:
+        file_path, file_size = await save_upload(file, MAX_FILE_SIZE)
+    except UploadTooLarge:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File too large. Maximum allowed size is {MAX_FILE_SIZE_MB} MB.",
         )
 
+    # Extract the text in the process pool, n8n only receives the text
+    try:
+        original_text, word_count = await extract_text_async(file_path, file.content_type)
+    except ExtractionUnavailable:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Text extraction is temporarily unavailable, please retry.",
+        )
+    except ExtractionError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Could not extract text from the uploaded file.",
+        )
+    finally:
+        remove_upload(file_path)
+
     # Create assignment record in the database
     db_assignment = Assignment(
-        student_id=current_user.id, filename=file.filename
+        student_id=current_user.id,
+        filename=file.filename,
+        original_text=original_text,
+        word_count=word_count,
     )
     db.add(db_assignment)
-    db.commit()
-    db.refresh(db_assignment)
 
-    # Add background job
-    background_tasks.add_task(
-        send_to_n8n, db_assignment.id, current_user.email, file
-    )
+    # Queue the analysis job in the same transaction as the assignment
+    enqueue_analysis_job(db, db_assignment, email=current_user.email)
+    await db.commit()
+    wake_workers()
 
     return {"assignment_id": db_assignment.id}
 
 
-@app.get("/analysis/{assignment_id}", response_model=AnalysisResultResponse)
-async def get_analysis_results(
-    assignment_id: int,
-    db: Session = Depends(get_db),
-    current_user: Student = Depends(get_current_user),
+def _encode_cursor(assignment: Assignment) -> str:
+    raw = json.dumps([assignment.uploaded_at.isoformat(), assignment.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        uploaded_at, assignment_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(uploaded_at), int(assignment_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor.",
+        )
+
+
+@app.get("/assignments", response_model=AssignmentListResponse)
+async def list_assignments(
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     """
-    Retrieves the analysis results for a specific assignment.
+    Lists the current student's assignments, newest first.
+
+    Keyset-paginated on (uploaded_at, id): every page is one range scan of the
+    (student_id, uploaded_at, id) index, however many pages came before it.
     """
-    assignment = (
-        db.query(Assignment)
+    query = (
+        select(Assignment)
+        .options(load_only(
+            Assignment.id, Assignment.filename, Assignment.uploaded_at, Assignment.word_count, Assignment.status
+        ))
+        .where(Assignment.student_id == current_user.id)
+        .order_by(Assignment.uploaded_at.desc(), Assignment.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        uploaded_at, assignment_id = _decode_cursor(cursor)
+        query = query.where(tuple_(Assignment.uploaded_at, Assignment.id) < tuple_(uploaded_at, assignment_id))
+
+    result = await db.execute(query)
+    assignments = result.scalars().all()
+    page = assignments[:limit]
+
+    return AssignmentListResponse(
+        items=[
+            AssignmentSummary(
+                id=assignment.id,
+                filename=assignment.filename,
+                uploaded_at=assignment.uploaded_at,
+                word_count=assignment.word_count,
+                status=(assignment.status or "pending").capitalize(),
+            )
+            for assignment in page
+        ],
+        next_cursor=_encode_cursor(page[-1]) if len(assignments) > limit else None,
+    )
+
+
+async def _load_analysis(db: AsyncSession, assignment_id: int, student_id: int) -> AnalysisResultResponse | None:
+    result = await db.execute(
+        select(Assignment)
         .options(joinedload(Assignment.analysis_results))
-        .filter(
+        .where(
             Assignment.id == assignment_id,
-            Assignment.student_id == current_user.id,
+            Assignment.student_id == student_id,
         )
-        .first()
     )
+    assignment = result.scalars().first()
 
     if not assignment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Assignment not found.",
-        )
+        return None
 
     if assignment.analysis_results:
         return AnalysisResultResponse(
@@ -271,11 +697,122 @@ async def get_analysis_results(
             id=assignment.id,
             filename=assignment.filename,
             uploaded_at=assignment.uploaded_at,
-            status="Pending",
+            # queued / running / failed while the job is in flight, assignments from before the job queue have no status
+            status=(assignment.status or "pending").capitalize(),
             analysis=None,
         )
 
 
+def _etag(body: str) -> str:
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+@app.get("/analysis/{assignment_id}", response_model=AnalysisResultResponse)
+async def get_analysis_results(
+    assignment_id: int,
+    wait: int = Query(0, ge=0, le=settings.ANALYSIS_LONG_POLL_MAX_SECONDS),
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Retrieves the analysis results for a specific assignment.
+
+    Unchanged results answer 304 to `If-None-Match`. With `wait` (seconds) the request is
+    held open until the analysis changes (from the state in `If-None-Match`, or while it
+    is not finished yet) and returns as soon as it does.
+    """
+    with analysis_notifier.subscribe(assignment_id) as changed:
+        response = await _load_analysis(db, assignment_id, current_user.id)
+        if response is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Assignment not found.",
+            )
+        body = response.model_dump_json()
+
+        if wait:
+            if if_none_match:
+                unchanged = _etag_matches(if_none_match, _etag(body))
+            else:
+                unchanged = response.status not in ANALYSIS_FINAL_STATUSES
+            deadline = asyncio.get_running_loop().time() + wait
+            while unchanged:
+                # do not hold a pooled connection while waiting
+                await db.commit()
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                changed.clear()
+                response = await _load_analysis(db, assignment_id, current_user.id)
+                new_body = response.model_dump_json() if response else body
+                unchanged = new_body == body
+                body = new_body
+
+    etag = _etag(body)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@app.get("/analysis/{assignment_id}/events")
+async def stream_analysis_results(
+    assignment_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Server-Sent Events stream of an assignment's analysis: a `status` event with the same
+    body as GET /analysis/{assignment_id} whenever it changes, closed once it is finished.
+    """
+    if await _load_analysis(db, assignment_id, current_user.id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Assignment not found.",
+        )
+    await db.commit()
+
+    async def events():
+        with analysis_notifier.subscribe(assignment_id) as changed:
+            last_body = None
+            while True:
+                changed.clear()
+                # short-lived sessions, the stream itself never holds a connection
+                async with AsyncSessionLocal() as stream_db:
+                    response = await _load_analysis(stream_db, assignment_id, current_user.id)
+                if response is None:
+                    yield "event: error\ndata: {\"detail\": \"Assignment not found.\"}\n\n"
+                    return
+                body = response.model_dump_json()
+                if body != last_body:
+                    yield f"event: status\nid: {_etag(body)}\ndata: {body}\n\n"
+                    last_body = body
+                if response.status in ANALYSIS_FINAL_STATUSES:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=settings.ANALYSIS_SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
+    clear_multiprocess_dir()  # samples of an earlier run, before any worker starts
     uvicorn.run("main:app", host="0.0.0.0", port=settings.PORT, reload=True)
 
@@ -0,0 +1,192 @@
+"""
+Prometheus metrics of the API and the analysis pipeline, served as text by `GET /metrics`.
+
+Series:
+  http_request_duration_seconds        per route template, method and status code
+  embedding_call_duration_seconds      every embedding provider call (see embeddings.py)
+  embedding_call_errors_total          failed and timed out embedding calls
+  n8n_dispatch_duration_seconds        every POST to the n8n webhook, by outcome
+  n8n_dispatch_failures_total          failed webhook posts, by exception type
+  db_query_duration_seconds            every statement, by engine and SQL verb
+  analysis_queue_wait_seconds          job due -> claimed by a worker
+  analysis_workflow_seconds            dispatched to n8n -> result received
+  analysis_end_to_end_seconds          upload -> result received
+
+Every uvicorn worker (and `python job_queue.py`) is its own process with its own
+counters. With PROMETHEUS_MULTIPROC_DIR set, all of them write their samples to
+memory-mapped files in that directory and `/metrics` merges the files of every
+process, so any worker answers for all of them. The directory must be shared by
+the processes and emptied before the server starts (`python main.py` does it);
+without the setting every worker only reports its own samples.
+"""
+import os
+import re
+import shutil
+import time
+
+from sqlalchemy import event
+
+from settings import settings
+
+# prometheus_client picks its value storage when it is imported
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = settings.PROMETHEUS_MULTIPROC_DIR
+    os.makedirs(settings.PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CALL_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# the pipeline spans queueing, retries with backoff and the n8n workflow
+PIPELINE_BUCKETS = (1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 4 * 3600.0, 24 * 3600.0)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to answer an HTTP request, streamed bodies included.",
+    ["method", "route", "status"],
+)
+embedding_call_duration = Histogram(
+    "embedding_call_duration_seconds",
+    "Duration of one embedding provider call (a batch of texts), failed calls included.",
+    ["provider"],
+    buckets=CALL_BUCKETS,
+)
+embedding_call_errors = Counter(
+    "embedding_call_errors_total",
+    "Embedding provider calls that failed or timed out.",
+    ["provider", "kind"],
+)
+n8n_dispatch_duration = Histogram(
+    "n8n_dispatch_duration_seconds",
+    "Duration of one POST of an assignment to the n8n webhook.",
+    ["outcome"],
+    buckets=CALL_BUCKETS,
+)
+n8n_dispatch_failures = Counter(
+    "n8n_dispatch_failures_total",
+    "POSTs to the n8n webhook that failed, retried ones included.",
+    ["error"],
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Execution time of one SQL statement, as seen by the driver.",
+    ["engine", "operation"],
+    buckets=DB_BUCKETS,
+)
+analysis_queue_wait = Histogram(
+    "analysis_queue_wait_seconds",
+    "Time an analysis job was due before a worker claimed it.",
+    buckets=PIPELINE_BUCKETS,
+)
+analysis_workflow = Histogram(
+    "analysis_workflow_seconds",
+    "Time from the successful dispatch to n8n to the analysis result.",
+    buckets=PIPELINE_BUCKETS,
+)
+analysis_end_to_end = Histogram(
+    "analysis_end_to_end_seconds",
+    "Time from the upload of an assignment to its analysis result.",
+    buckets=PIPELINE_BUCKETS,
+)
+
+
+def clear_multiprocess_dir():
+    """
+    Removes the samples of earlier runs. Only call it before any worker process started.
+    """
+    directory = settings.PROMETHEUS_MULTIPROC_DIR
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    The text exposition of all metrics, merged over all processes in multiprocess mode.
+    """
+    if settings.PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+WRITE_VERB = re.compile(r"\b(insert|update|delete)\b", re.IGNORECASE)
+
+
+def sql_operation(statement: str) -> str:
+    """
+    First keyword of a statement ("SELECT", "INSERT", ...), "WITH" queries count as the statement they end in.
+    """
+    words = statement.lstrip(" (\n").split(None, 1)
+    operation = words[0].upper() if words else "OTHER"
+    if operation == "WITH":
+        match = WRITE_VERB.search(statement)
+        return match.group(1).upper() if match else "SELECT"
+    return operation if operation.isalpha() else "OTHER"
+
+
+def instrument_engine(engine, name: str):
+    """
+    Times every statement of a (sync) SQLAlchemy engine; pass `async_engine.sync_engine` for async ones.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def observe(conn, statement):
+        started = conn.info.get("query_started")
+        if started:
+            db_query_duration.labels(name, sql_operation(statement)).observe(time.perf_counter() - started.pop())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        observe(conn, statement)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None:
+            observe(context.connection, context.statement or "")
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording `http_request_duration_seconds`. The route label is the
+    path template of the matched route ("/analysis/{assignment_id}"), unmatched
+    requests share "unmatched" so random paths cannot blow up the label set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - started)
@@ -1,11 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, TIMESTAMP, FLOAT, ForeignKey, JSON
+from sqlalchemy import cast, create_engine, Computed, Column, Integer, String, Text, TIMESTAMP, FLOAT, ForeignKey, JSON, Index, SmallInteger, BigInteger, LargeBinary
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from pgvector.sqlalchemy import Vector
-from sqlalchemy.sql import func
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.sql import func, literal_column
 from pydantic import BaseModel
 from datetime import datetime
 from typing import List, Optional
 
+from settings import settings
+
 Base = declarative_base()
 
 class Student(Base):
@@ -29,14 +32,21 @@ class Assignment(Base):
     academic_level = Column(Text)
     word_count = Column(Integer)
     uploaded_at = Column(TIMESTAMP, server_default=func.now())
+    status = Column(Text)  # 'queued', 'running', 'failed', 'completed' (see job_queue.py)
 
     student = relationship("Student", back_populates="assignments")
     analysis_results = relationship("AnalysisResult", back_populates="assignment", uselist=False)
+    analysis_jobs = relationship("AnalysisJob", back_populates="assignment")
+
+    __table_args__ = (
+        # per-student listing, keyset-paginated on (uploaded_at, id)
+        Index('ix_assignments_student_id_uploaded_at', 'student_id', 'uploaded_at', 'id'),
+    )
 
 class AnalysisResult(Base):
     __tablename__ = 'analysis_results'
     id = Column(Integer, primary_key=True, autoincrement=True)
-    assignment_id = Column(Integer, ForeignKey('assignments.id'), nullable=False)
+    assignment_id = Column(Integer, ForeignKey('assignments.id'), nullable=False)  # unique, one result per assignment
     suggested_sources = Column(JSON)
     plagiarism_score = Column(FLOAT)
     research_suggestions = Column(Text)
@@ -46,6 +56,62 @@ class AnalysisResult(Base):
 
     assignment = relationship("Assignment", back_populates="analysis_results")
 
+    __table_args__ = (
+        # duplicate n8n callbacks update the existing row, see create_analysis_result
+        Index('ix_analysis_results_assignment_id', 'assignment_id', unique=True),
+    )
+
+class AnalysisJob(Base):
+    __tablename__ = 'analysis_jobs'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    assignment_id = Column(Integer, ForeignKey('assignments.id'), nullable=False, index=True)
+    status = Column(Text, nullable=False, server_default='queued')  # 'queued', 'running', 'succeeded', 'dead'
+    attempts = Column(Integer, nullable=False, server_default='0')
+    max_attempts = Column(Integer, nullable=False)
+    run_after = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    locked_at = Column(TIMESTAMP)
+    last_error = Column(Text)
+    email = Column(Text, nullable=False)
+    file_path = Column(Text)
+    filename = Column(Text)
+    content_type = Column(Text)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+    assignment = relationship("Assignment", back_populates="analysis_jobs")
+
+    __table_args__ = (
+        # the claim query scans queued jobs by due time
+        Index('ix_analysis_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+# title and authors weigh most, then the abstract, then the body
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(authors, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(abstract, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(full_text, '')), 'C')"
+)
+
+# reduced representations of academic_sources.embedding for the coarse search pass
+# (see rag_service.nearest_sources), only stored in their expression indexes
+EMBEDDING_DIMENSION = 1536
+
+def halfvec_embedding(embedding):
+    return cast(embedding, HALFVEC(EMBEDDING_DIMENSION))
+
+def binary_embedding(embedding):
+    return cast(func.binary_quantize(embedding), BIT(EMBEDDING_DIMENSION))
+
+# Matryoshka prefix: Gemini embeddings are trained so that their first dimensions are an embedding on their own
+def prefix_embedding(embedding):
+    dimension = int(settings.MATRYOSHKA_DIMENSION)
+    # constants, not bound parameters, or the expression would not match the index under asyncpg
+    return cast(func.subvector(embedding, literal_column("1"), literal_column(str(dimension))), Vector(dimension))
+
+# indexes built by migrations with options chosen at upgrade time, ignored by autogenerate (alembic/env.py)
+MIGRATION_ONLY_INDEXES = frozenset({'ix_academic_sources_embedding'})
+
 class AcademicSource(Base):
     __tablename__ = 'academic_sources'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -55,7 +121,77 @@ class AcademicSource(Base):
     abstract = Column(Text)
     full_text = Column(Text)
     source_type = Column(Text)  # 'paper', 'textbook', 'course_material'
-    embedding = Column(Vector(1536))
+    embedding = Column(Vector(EMBEDDING_DIMENSION))
+    content_hash = Column(Text, unique=True)  # sha256 of the normalized full_text, see ingest_data.py
+    # lexical search document, kept up to date by Postgres (see rag_service.find_lexical_sources)
+    search_vector = Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True))
+
+    # the ANN index on embedding, ix_academic_sources_embedding, is not declared here: migration
+    # b84f0c2d6e31 chooses its type and operator class at upgrade time (see MIGRATION_ONLY_INDEXES)
+    __table_args__ = (
+        Index('ix_academic_sources_search_vector', 'search_vector', postgresql_using='gin'),
+        Index(
+            'ix_academic_sources_embedding_halfvec',
+            halfvec_embedding(embedding).label('embedding_halfvec'),
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding_halfvec': 'halfvec_cosine_ops'},
+        ),
+        Index(
+            'ix_academic_sources_embedding_binary',
+            binary_embedding(embedding).label('embedding_binary'),
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding_binary': 'bit_hamming_ops'},
+        ),
+        Index(
+            'ix_academic_sources_embedding_prefix',
+            prefix_embedding(embedding).label('embedding_prefix'),
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding_prefix': 'vector_cosine_ops'},
+        ),
+    )
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = 'embedding_cache'
+    key = Column(Text, primary_key=True)  # sha256 of (normalized text, model, dimension)
+    model = Column(Text, nullable=False)
+    dimension = Column(Integer, nullable=False)
+    embedding = Column(Vector(), nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now(), index=True)  # expiry and pruning, see embedding_cache.py
+
+class SourceShingles(Base):
+    __tablename__ = 'source_shingles'
+    source_id = Column(Integer, ForeignKey('academic_sources.id', ondelete='CASCADE'), primary_key=True)
+    hashes = Column(LargeBinary, nullable=False)  # sorted distinct shingle hashes as uint32, see plagiarism.py
+
+class SourceLSHBucket(Base):
+    __tablename__ = 'source_lsh_buckets'
+    # primary key order doubles as the (band, bucket) lookup index
+    band = Column(SmallInteger, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    source_id = Column(Integer, ForeignKey('academic_sources.id', ondelete='CASCADE'), primary_key=True, index=True)
+    window_index = Column(Integer, primary_key=True)
+
+class SourceChunk(Base):
+    __tablename__ = 'source_chunks'
+    source_id = Column(Integer, ForeignKey('academic_sources.id', ondelete='CASCADE'), primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
+    start_char = Column(Integer, nullable=False)  # [start_char, end_char) offsets in full_text, see chunking.py
+    end_char = Column(Integer, nullable=False)
+    token_count = Column(Integer, nullable=False)
+    embedding = Column(Vector(EMBEDDING_DIMENSION), nullable=False)
+
+    __table_args__ = (
+        Index(
+            'ix_source_chunks_embedding',
+            'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'vector_cosine_ops'},
+        ),
+    )
 
 # Pydantic models for API
 class StudentCreate(BaseModel):
@@ -73,6 +209,13 @@ class Token(BaseModel):
     token_type: str
 
 
+class SourcePassage(BaseModel):
+    chunk_index: int
+    start_char: int
+    end_char: int
+    similarity_score: float
+    snippet: str
+
 class AcademicSourceResponse(BaseModel):
     id: int
     title: str | None
@@ -81,10 +224,22 @@ class AcademicSourceResponse(BaseModel):
     abstract: str | None
     source_type: str | None
     similarity_score: float | None
+    passages: Optional[List[SourcePassage]] = None  # only for passage search
 
     class Config:
         from_attributes = True
 
+class AssignmentSummary(BaseModel):
+    id: int
+    filename: Optional[str] = None
+    uploaded_at: Optional[datetime] = None
+    word_count: Optional[int] = None
+    status: str
+
+class AssignmentListResponse(BaseModel):
+    items: List[AssignmentSummary]
+    next_cursor: Optional[str] = None  # pass as `cursor` to get the next page, None on the last page
+
 class AnalysisResultModel(BaseModel):
     suggested_sources: Optional[List[dict]] = None
     plagiarism_score: Optional[float] = None
@@ -106,6 +261,35 @@ class AnalysisResultResponse(BaseModel):
         from_attributes = True
 
 
+class PlagiarismMatch(BaseModel):
+    source_id: int
+    title: str | None
+    similarity: float
+    spans: List[List[int]]  # [start, end) character offsets in the assignment text
+
+class PlagiarismReport(BaseModel):
+    score: float
+    matches: List[PlagiarismMatch]
+
+
+class PassageMatch(BaseModel):
+    source_id: int
+    title: str | None
+    chunk_index: int
+    start_char: int  # offsets of the chunk in the source's full_text
+    end_char: int
+    similarity: float
+
+class AssignmentPassageMatches(BaseModel):
+    passage_index: int
+    start_char: int  # offsets of the passage in the assignment text
+    end_char: int
+    matches: List[PassageMatch]
+
+class AssignmentSimilarityReport(BaseModel):
+    passages: List[AssignmentPassageMatches]
+
+
 class N8nAnalysisResultCreate(BaseModel):
     assignment_id: int
     suggested_sources: List[dict]
@@ -117,3 +301,14 @@ class N8nAnalysisResultCreate(BaseModel):
     topic: str
     academic_level: str
     word_count: int
+
+
+class N8nAnalysisResultBatchItem(BaseModel):
+    index: int  # position in the request body
+    assignment_id: Optional[int] = None
+    status: str  # 'upserted', 'not_found', 'invalid' or 'superseded' (a later item has the same assignment)
+    detail: Optional[str] = None
+
+class N8nAnalysisResultBatchResponse(BaseModel):
+    upserted: int
+    items: List[N8nAnalysisResultBatchItem]
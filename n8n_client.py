@@ -0,0 +1,126 @@
+import asyncio
+import os
+import time
+import uuid
+
+import aiohttp
+from fastapi import UploadFile
+
+from metrics import n8n_dispatch_duration, n8n_dispatch_failures
+from settings import settings
+
+# --- app-lifetime HTTP client ---
+_session: aiohttp.ClientSession | None = None
+
+
+async def start_http_client():
+    """
+    Opens the pooled keep-alive session used for every call to n8n. Called from the app lifespan.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.N8N_HTTP_POOL_LIMIT,
+            limit_per_host=settings.N8N_HTTP_POOL_LIMIT,
+            keepalive_timeout=settings.N8N_HTTP_KEEPALIVE_SECONDS,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=settings.N8N_HTTP_TIMEOUT_SECONDS),
+        )
+    return _session
+
+
+async def close_http_client():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    # lazily started for callers outside the app lifespan (scripts, workers)
+    if _session is None or _session.closed:
+        return await start_http_client()
+    return _session
+
+
+# --- uploads ---
+class UploadTooLarge(Exception):
+    pass
+
+
+async def save_upload(file: UploadFile, max_size: int) -> tuple[str, int]:
+    """
+    Copies an upload chunk by chunk into UPLOAD_DIR, where the extraction processes can read it.
+
+    Returns:
+        The stored file path and its size in bytes.
+
+    Raises:
+        UploadTooLarge: if the upload exceeds `max_size` bytes (nothing is kept).
+    """
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4().hex}{extension}")
+
+    size = 0
+    out = await asyncio.to_thread(open, path, "wb")
+    try:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge()
+            await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        out.close()
+        remove_upload(path)
+        raise
+    out.close()
+    return path, size
+
+
+def remove_upload(path: str | None):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+async def send_to_n8n(
+    assignment_id: int,
+    email: str,
+    filename: str | None,
+    original_text: str,
+    word_count: int | None,
+    plagiarism: dict | None = None,
+):
+    """
+    Posts the extracted assignment text and the local plagiarism report to the n8n webhook.
+    """
+    payload = {
+        "assignment_id": assignment_id,
+        "email": email,
+        "filename": filename,
+        "original_text": original_text,
+        "word_count": word_count,
+        "plagiarism_score": plagiarism["score"] if plagiarism else None,
+        "plagiarism_matches": plagiarism["matches"] if plagiarism else [],
+    }
+    headers = {
+        "X-API-Key": settings.INTERNAL_API_KEY,
+    }
+
+    session = await get_http_session()
+    started = time.perf_counter()
+    try:
+        async with session.post(
+            settings.N8N_WEBHOOK_URL,
+            params={"id": assignment_id, "email": email},
+            json=payload,
+            headers=headers,
+        ) as response:
+            response.raise_for_status()
+    except Exception as e:
+        n8n_dispatch_duration.labels("error").observe(time.perf_counter() - started)
+        n8n_dispatch_failures.labels(type(e).__name__).inc()
+        raise
+    n8n_dispatch_duration.labels("ok").observe(time.perf_counter() - started)
@@ -0,0 +1,128 @@
+"""
+Cross-worker notifications for assignment status changes, over Postgres LISTEN/NOTIFY.
+
+Writers add `notify_statement(assignment_id)` to the transaction that changes an
+assignment; Postgres delivers the notification on commit to every listening
+connection. Each API worker keeps one dedicated asyncpg connection listening on
+the channel and wakes up the requests of that worker waiting on the assignment
+(long-poll and Server-Sent Events on /analysis/{assignment_id}).
+
+A lost notification only delays a waiter until its next timeout, waiters always
+re-read the assignment from the database.
+"""
+import asyncio
+import logging
+from contextlib import contextmanager
+
+import asyncpg
+from sqlalchemy import func, select, text
+
+from database import make_database_url
+from settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+RECONNECT_DELAY_SECONDS = 5
+
+
+def notify_statement(assignment_id: int):
+    """
+    `SELECT pg_notify(...)` for an assignment, to execute in the transaction that changes it.
+    """
+    return select(func.pg_notify(settings.ANALYSIS_NOTIFY_CHANNEL, str(assignment_id)))
+
+
+def notify_many_statement(assignment_ids: list[int]):
+    """
+    One notification per assignment, for set-based writes (see POST /internal/analysis-results/batch).
+    """
+    return text(
+        "SELECT pg_notify(:channel, assignment_id::text) FROM unnest(CAST(:ids AS integer[])) AS assignment_id"
+    ).bindparams(channel=settings.ANALYSIS_NOTIFY_CHANNEL, ids=list(assignment_ids))
+
+
+class AnalysisNotifier:
+    """
+    Fans Postgres notifications out to the asyncio waiters of this worker.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self._waiters: dict[int, set[asyncio.Event]] = {}
+        self._task: asyncio.Task | None = None
+        self.connected = False
+        self.notifications = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(), name="analysis-notifier")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(make_database_url("postgresql"))
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notification)
+                self.connected = True
+                # anything may have changed while we were not listening
+                self._wake_all()
+                await closed.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Analysis notification listener failed, reconnecting: {e!r}")
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        self.notifications += 1
+        try:
+            assignment_id = int(payload)
+        except ValueError:
+            return
+        for event in self._waiters.get(assignment_id, ()):
+            event.set()
+
+    def _wake_all(self):
+        for events in self._waiters.values():
+            for event in events:
+                event.set()
+
+    @contextmanager
+    def subscribe(self, assignment_id: int):
+        """
+        Registers a waiter for an assignment; subscribe before reading its state so a
+        change committed in between is not missed.
+        """
+        event = asyncio.Event()
+        self._waiters.setdefault(assignment_id, set()).add(event)
+        try:
+            yield event
+        finally:
+            events = self._waiters.get(assignment_id)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self._waiters[assignment_id]
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "notifications": self.notifications,
+            "waiting_assignments": len(self._waiters),
+            "waiters": sum(len(events) for events in self._waiters.values()),
+        }
+
+
+analysis_notifier = AnalysisNotifier(settings.ANALYSIS_NOTIFY_CHANNEL)
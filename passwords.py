@@ -0,0 +1,142 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from settings import settings
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when the hashing pool and its wait queue are full, or the wait timed out.
+    """
+
+
+# --- hashing (runs inside the worker processes) ---
+def hash_password(password: str, rounds: int) -> str:
+    # store the hash as text not bytes
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+
+
+def hash_rounds(password_hash: str) -> int | None:
+    """
+    Cost factor of a bcrypt hash ("$2b$12$..." -> 12), None if it is not a bcrypt hash.
+    """
+    parts = password_hash.split("$")
+    return int(parts[2]) if len(parts) > 3 and parts[2].isdigit() else None
+
+
+def needs_rehash(password_hash: str) -> bool:
+    return hash_rounds(password_hash) != settings.BCRYPT_ROUNDS
+
+
+# --- process pool with admission control ---
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated process pool so a login spike never occupies the shared
+    threadpool. At most `workers` hashes run at once and at most `queue_size` callers
+    wait for a slot, for up to `queue_timeout` seconds; anyone else is rejected at once
+    with `PasswordHasherBusy`. A slot is held until its hash finished in the pool, also
+    when the caller was cancelled in the meantime.
+    """
+
+    def __init__(self, workers: int, queue_size: int, queue_timeout: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _release_if_acquired(self, acquire: asyncio.Future):
+        if not acquire.cancelled() and acquire.exception() is None:
+            self._slots.release()
+
+    def _finished(self, future: asyncio.Future):
+        self.running -= 1
+        self.completed += 1
+        self._slots.release()
+        if not future.cancelled():
+            future.exception()  # retrieved, also when the caller is gone
+
+    async def _run(self, fn, *args):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        # checked before the first await, so concurrent callers see each other
+        if self.running + self.waiting >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        # wait_for cancels what it awaits on timeout, but the acquire may already have
+        # succeeded by then; the shielded task tells whether it did, and a slot acquired
+        # by an abandoned wait (timeout or cancelled caller) is handed back
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(acquire), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            acquire.cancel()
+            acquire.add_done_callback(self._release_if_acquired)
+            raise PasswordHasherBusy("Timed out waiting for a password hashing slot")
+        except asyncio.CancelledError:
+            acquire.cancel()
+            acquire.add_done_callback(self._release_if_acquired)
+            raise
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+        # the slot is released when the job finishes in its worker process, not when the
+        # caller stops waiting: a cancelled request cannot stop a running bcrypt
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self.start(), fn, *args)
+        except Exception:
+            self.running -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(self._finished)
+        return await asyncio.shield(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, settings.BCRYPT_ROUNDS)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(verify_password, password, password_hash)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE,
+    queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,374 @@
+"""
+Local plagiarism detection with MinHash signatures and an LSH band index.
+
+Every academic source is split into word shingles, grouped into overlapping
+windows; each window gets a MinHash signature whose bands are stored in
+`source_lsh_buckets`. Windows keep the index sensitive to a copied passage of a
+long source, which whole-document Jaccard similarity would miss.
+
+Scoring an assignment hashes its own windows, looks the band buckets up in one
+query to get candidate sources, then verifies candidates by exact overlap with
+their shingle hashes, stored in `source_shingles`, to produce a score and the
+matched character spans.
+
+Changing the shingle, permutation, band or window settings requires a rebuild:
+
+    python plagiarism.py --rebuild
+"""
+import argparse
+import re
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import (
+    AcademicSource,
+    PlagiarismMatch,
+    PlagiarismReport,
+    SourceLSHBucket,
+    SourceShingles,
+)
+from settings import settings
+
+# --- constants ---
+TOKEN_PATTERN = re.compile(r"\w+")
+# function words are dropped before shingling, so swapping "the" for "this" does not hide a copy
+STOPWORDS = frozenset("""
+a an the this that these those it its is are was were be been being am of in on at to for from by
+with as and or but nor not no so if then than there here which who whom whose what when where why how
+all any each some such can could would should will shall may might must do does did has have had
+i we you he she they me us him her them my our your his their
+""".split())
+PRIME = (1 << 31) - 1  # hashes are < 2**32 and coefficients < 2**31, products fit in uint64
+SHINGLE_MULTIPLIERS = np.random.default_rng(0).integers(1, 2**63, size=16, dtype=np.uint64) | np.uint64(1)
+
+CANDIDATES_SQL = text(
+    """
+    SELECT b.source_id, count(*) AS hits
+    FROM source_lsh_buckets b
+    JOIN unnest(CAST(:bands AS smallint[]), CAST(:buckets AS bigint[])) AS q(band, bucket)
+      ON b.band = q.band AND b.bucket = q.bucket
+    GROUP BY b.source_id
+    ORDER BY hits DESC
+    LIMIT :limit
+    """
+)
+
+
+# --- shingling ---
+@dataclass
+class Fingerprint:
+    token_spans: list[tuple[int, int]]  # character offsets of every content word
+    hashes: np.ndarray  # uint64 hash of shingle i, covering words i .. i + k - 1
+
+
+def fingerprint(text: str, shingle_size: int | None = None, with_spans: bool = True) -> Fingerprint:
+    """
+    Content-word shingle hashes of a text. Character spans are only needed for the
+    assignment side, candidate sources skip them for a faster C-level tokenization.
+    """
+    k = shingle_size or settings.PLAGIARISM_SHINGLE_SIZE
+    if with_spans:
+        matches = [m for m in TOKEN_PATTERN.finditer(text) if m.group().lower() not in STOPWORDS]
+        words = [m.group().lower() for m in matches]
+        token_spans = [m.span() for m in matches]
+    else:
+        words = [word for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+        token_spans = []
+    word_hashes = np.fromiter(
+        (zlib.crc32(word.encode("utf-8")) for word in words),
+        dtype=np.uint64,
+        count=len(words),
+    )
+    # shingle hash = multiply-add of its word hashes (wrapping uint64), folded to 32 bits
+    count = max(len(words) - k + 1, 1) if words else 0
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(min(k, len(words))):
+        hashes += word_hashes[offset:offset + count] * SHINGLE_MULTIPLIERS[offset]
+    hashes = (hashes ^ (hashes >> np.uint64(32))) & np.uint64(0xFFFFFFFF)
+    return Fingerprint(token_spans=token_spans, hashes=hashes)
+
+
+def window_slices(shingle_count: int, window: int | None = None):
+    """
+    Overlapping windows (50% step) over the shingles, the last one aligned to the end.
+    """
+    window = window or settings.PLAGIARISM_WINDOW_SHINGLES
+    if shingle_count <= window:
+        return [slice(0, shingle_count)] if shingle_count else []
+    step = max(window // 2, 1)
+    starts = list(range(0, shingle_count - window + 1, step))
+    if starts[-1] + window < shingle_count:
+        starts.append(shingle_count - window)
+    return [slice(start, start + window) for start in starts]
+
+
+def shingle_set(fp: Fingerprint) -> np.ndarray:
+    """
+    Sorted distinct shingle hashes of a source, the form kept in `source_shingles`.
+    """
+    return np.unique(fp.hashes).astype(np.uint32)
+
+
+# --- MinHash / LSH ---
+class MinHasher:
+    def __init__(self, num_perm: int, bands: int, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.a = rng.integers(1, PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, size=num_perm, dtype=np.uint64)
+        self.row_multipliers = rng.integers(1, 2**63, size=num_perm // bands, dtype=np.uint64) | np.uint64(1)
+
+    def signatures(self, fp: Fingerprint, window: int | None = None) -> np.ndarray:
+        """
+        MinHash signature of every window of a document, shape (windows, num_perm), uint32.
+        """
+        slices = window_slices(len(fp.hashes), window)
+        if not slices:
+            return np.empty((0, self.num_perm), dtype=np.uint32)
+        permuted = (fp.hashes[:, None] * self.a + self.b) % PRIME
+        return np.stack([permuted[window].min(axis=0) for window in slices]).astype(np.uint32)
+
+    def buckets(self, signatures: np.ndarray) -> np.ndarray:
+        """
+        LSH bucket of every band of every signature, shape (windows, bands), int64 to fit a BIGINT.
+        """
+        rows = signatures.reshape(len(signatures), self.bands, -1).astype(np.uint64)
+        mixed = (rows * self.row_multipliers).sum(axis=2)
+        mixed ^= mixed >> np.uint64(29)
+        return mixed.view(np.int64)
+
+
+hasher = MinHasher(settings.PLAGIARISM_NUM_PERM, settings.PLAGIARISM_LSH_BANDS)
+
+
+def _band_keys(buckets: np.ndarray) -> set[tuple[int, int]]:
+    bands = np.broadcast_to(np.arange(buckets.shape[1]), buckets.shape)
+    return set(zip(bands.ravel().tolist(), buckets.ravel().tolist()))
+
+
+def query_buckets(fp: Fingerprint) -> list[tuple[int, int]]:
+    """
+    (band, bucket) keys of the assignment at the index window size and at a quarter of
+    it: the small windows keep a short copied passage (or a short source) from being
+    diluted by the rest of the assignment.
+    """
+    window = settings.PLAGIARISM_WINDOW_SHINGLES
+    keys = set()
+    for size in (window, max(window // 4, 1)):
+        keys |= _band_keys(hasher.buckets(hasher.signatures(fp, size)))
+    return sorted(keys)
+
+
+# --- exact verification ---
+def _covered_tokens(fp: Fingerprint, matched: np.ndarray, shingle_size: int) -> np.ndarray:
+    """
+    Marks every word that is part of at least one matched shingle.
+    """
+    covered = np.zeros(len(fp.token_spans) + 1, dtype=np.int32)
+    positions = np.flatnonzero(matched)
+    np.add.at(covered, positions, 1)
+    np.add.at(covered, np.minimum(positions + shingle_size, len(fp.token_spans)), -1)
+    return np.cumsum(covered)[:-1] > 0
+
+
+def _token_runs_to_spans(fp: Fingerprint, covered: np.ndarray) -> list[list[int]]:
+    spans = []
+    start = None
+    for i, is_covered in enumerate(covered):
+        if is_covered and start is None:
+            start = i
+        elif not is_covered and start is not None:
+            spans.append([fp.token_spans[start][0], fp.token_spans[i - 1][1]])
+            start = None
+    if start is not None:
+        spans.append([fp.token_spans[start][0], fp.token_spans[len(covered) - 1][1]])
+    return spans
+
+
+def score_candidates(fp: Fingerprint, candidates: list[tuple[int, str | None, np.ndarray]]) -> PlagiarismReport:
+    """
+    Verifies candidate sources by exact shingle overlap.
+
+    Args:
+        fp: Fingerprint of the assignment.
+        candidates: (source_id, title, shingle_set) of the sources returned by the LSH lookup.
+
+    Returns:
+        The share of the assignment's words covered by text found in any candidate,
+        and per-source similarity with the matched spans (assignment character offsets).
+    """
+    k = settings.PLAGIARISM_SHINGLE_SIZE
+    if not len(fp.hashes):
+        return PlagiarismReport(score=0.0, matches=[])
+
+    any_covered = np.zeros(len(fp.token_spans), dtype=bool)
+    matches = []
+    for source_id, title, shingles in candidates:
+        matched = np.isin(fp.hashes, shingles.astype(np.uint64))
+        if not matched.any():
+            continue
+        covered = _covered_tokens(fp, matched, k)
+        similarity = float(covered.mean())
+        if similarity < settings.PLAGIARISM_MIN_SIMILARITY:
+            continue
+        any_covered |= covered
+        matches.append(PlagiarismMatch(
+            source_id=source_id,
+            title=title,
+            similarity=round(similarity, 4),
+            spans=_token_runs_to_spans(fp, covered),
+        ))
+
+    matches.sort(key=lambda match: match.similarity, reverse=True)
+    return PlagiarismReport(score=round(float(any_covered.mean()), 4), matches=matches)
+
+
+# --- persisted index ---
+def _index_rows(source_id: int, full_text: str):
+    fp = fingerprint(full_text, with_spans=False)
+    buckets = hasher.buckets(hasher.signatures(fp)).tolist()
+    shingle_row = {"source_id": source_id, "hashes": shingle_set(fp).tobytes()}
+    bucket_rows = [
+        {"band": band, "bucket": bucket, "source_id": source_id, "window_index": window_index}
+        for window_index, window_buckets in enumerate(buckets)
+        for band, bucket in enumerate(window_buckets)
+    ]
+    return shingle_row, bucket_rows
+
+
+def index_sources(db: Session, sources: list[tuple[int, str]]):
+    """
+    (Re)computes shingle hashes and LSH buckets for the given (source_id, full_text) pairs
+    in the caller's transaction, so ingestion keeps the index up to date incrementally.
+    """
+    if not sources:
+        return
+    source_ids = [source_id for source_id, _ in sources]
+    db.execute(delete(SourceLSHBucket).where(SourceLSHBucket.source_id.in_(source_ids)))
+    db.execute(delete(SourceShingles).where(SourceShingles.source_id.in_(source_ids)))
+
+    shingles, buckets = [], []
+    for source_id, full_text in sources:
+        shingle_row, bucket_rows = _index_rows(source_id, full_text or "")
+        shingles.append(shingle_row)
+        buckets.extend(bucket_rows)
+    db.execute(insert(SourceShingles), shingles)
+    if buckets:
+        db.execute(insert(SourceLSHBucket), buckets)
+
+
+async def detect_plagiarism(db: AsyncSession, assignment_text: str) -> PlagiarismReport:
+    """
+    Scores an assignment against the persisted LSH index.
+    """
+    fp = fingerprint(assignment_text)
+    keys = query_buckets(fp)
+    if not keys:
+        return PlagiarismReport(score=0.0, matches=[])
+
+    result = await db.execute(
+        CANDIDATES_SQL,
+        {
+            "bands": [band for band, _ in keys],
+            "buckets": [bucket for _, bucket in keys],
+            "limit": settings.PLAGIARISM_MAX_CANDIDATES,
+        },
+    )
+    candidate_ids = [row.source_id for row in result]
+    if not candidate_ids:
+        return PlagiarismReport(score=0.0, matches=[])
+
+    result = await db.execute(
+        select(AcademicSource.id, AcademicSource.title, SourceShingles.hashes)
+        .outerjoin(SourceShingles, SourceShingles.source_id == AcademicSource.id)
+        .where(AcademicSource.id.in_(candidate_ids))
+    )
+    rows = result.all()
+    candidates = [
+        (row.id, row.title, np.frombuffer(row.hashes, dtype=np.uint32))
+        for row in rows if row.hashes is not None
+    ]
+    # indexed before shingle hashes were stored, until `python plagiarism.py --rebuild`
+    missing = [row.id for row in rows if row.hashes is None]
+    if missing:
+        result = await db.execute(
+            select(AcademicSource.id, AcademicSource.title, AcademicSource.full_text)
+            .where(AcademicSource.id.in_(missing))
+        )
+        candidates.extend(
+            (row.id, row.title, shingle_set(fingerprint(row.full_text or "", with_spans=False)))
+            for row in result
+        )
+    return score_candidates(fp, candidates)
+
+
+# --- in-memory index (benchmarks, tests) ---
+class InMemoryLSHIndex:
+    """
+    Same banding as the persisted index, kept in dicts.
+    """
+
+    def __init__(self):
+        self.buckets: dict[tuple[int, int], set[int]] = {}
+        self.sources: dict[int, tuple[str | None, np.ndarray]] = {}
+
+    def add(self, source_id: int, title: str | None, full_text: str):
+        fp = fingerprint(full_text, with_spans=False)
+        self.sources[source_id] = (title, shingle_set(fp))
+        for key in _band_keys(hasher.buckets(hasher.signatures(fp))):
+            self.buckets.setdefault(key, set()).add(source_id)
+
+    def detect(self, assignment_text: str) -> PlagiarismReport:
+        fp = fingerprint(assignment_text)
+        hits = Counter()
+        for key in query_buckets(fp):
+            hits.update(self.buckets.get(key, ()))
+        candidates = [
+            (source_id, *self.sources[source_id])
+            for source_id, _ in hits.most_common(settings.PLAGIARISM_MAX_CANDIDATES)
+        ]
+        return score_candidates(fp, candidates)
+
+
+def rebuild_index(batch_size: int = 200):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        last_id = 0
+        total = 0
+        while True:
+            rows = db.execute(
+                select(AcademicSource.id, AcademicSource.full_text)
+                .where(AcademicSource.id > last_id)
+                .order_by(AcademicSource.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            index_sources(db, [tuple(row) for row in rows])
+            db.commit()
+            last_id = rows[-1].id
+            total += len(rows)
+            print(f"Indexed {total} sources.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the MinHash/LSH plagiarism index.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute shingle hashes and LSH buckets for every source")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild_index()
+    else:
+        parser.print_help()
@@ -0,0 +1,160 @@
+"""
+Opt-in sampling profiles of single API requests.
+
+A request is profiled when it carries `X-Profile: 1` together with the internal API
+key (`X-API-Key`), or at random with probability PROFILING_SAMPLE_RATE. pyinstrument
+samples the stack every PROFILING_INTERVAL_SECONDS, following the request across
+its awaits, and the result is written as HTML to PROFILING_DIR with a JSON sidecar
+(method, route, status, duration). The response of a profiled request carries the
+profile id in `X-Profile-Id`; `GET /internal/profiles` lists the stored profiles
+and `GET /internal/profiles/{profile_id}` downloads one. Only the newest
+PROFILING_MAX_PROFILES are kept. The directory may be shared by all workers.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import time
+from datetime import datetime, timezone
+
+from pyinstrument import Profiler
+
+from settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{12}$")
+
+
+def _headers(scope) -> dict[bytes, bytes]:
+    return {name.lower(): value for name, value in scope.get("headers", [])}
+
+
+def _requested(scope) -> bool:
+    headers = _headers(scope)
+    if headers.get(PROFILE_HEADER, b"").strip() not in (b"1", b"true"):
+        return False
+    return secrets.compare_digest(headers.get(b"x-api-key", b""), settings.INTERNAL_API_KEY.encode())
+
+
+def new_profile_id() -> str:
+    return f"{datetime.now(tz=timezone.utc):%Y%m%dT%H%M%S}-{secrets.token_hex(6)}"
+
+
+def _write_profile(profile_id: str, profiler: Profiler, meta: dict):
+    html = profiler.output_html()  # renders the whole call tree, kept off the event loop
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    base = os.path.join(settings.PROFILING_DIR, profile_id)
+    with open(f"{base}.html.tmp", "w") as f:
+        f.write(html)
+    os.replace(f"{base}.html.tmp", f"{base}.html")
+    with open(f"{base}.json.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{base}.json.tmp", f"{base}.json")
+    _prune()
+
+
+def _prune():
+    sidecars = sorted(name for name in os.listdir(settings.PROFILING_DIR) if name.endswith(".json"))
+    for name in sidecars[:max(len(sidecars) - settings.PROFILING_MAX_PROFILES, 0)]:
+        for extension in (".json", ".html"):
+            try:
+                os.remove(os.path.join(settings.PROFILING_DIR, name.removesuffix(".json") + extension))
+            except FileNotFoundError:
+                pass  # pruned by another worker
+
+
+def list_profiles() -> list[dict]:
+    """
+    Metadata of the stored profiles, newest first.
+    """
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(settings.PROFILING_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(settings.PROFILING_DIR, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # being written or pruned
+    return profiles
+
+
+def profile_path(profile_id: str) -> str | None:
+    """
+    Path of a stored HTML profile, None for unknown or malformed ids.
+    """
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(settings.PROFILING_DIR, f"{profile_id}.html")
+    return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requested or sampled requests, see the module docstring.
+    Sampled profiles are skipped while another request of this worker is profiled, so a
+    sample rate never stacks profilers on a busy worker.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.active = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = _requested(scope)
+        sampled = (
+            not requested
+            and settings.PROFILING_SAMPLE_RATE > 0
+            and self.active == 0
+            and random.random() < settings.PROFILING_SAMPLE_RATE
+        )
+        if not (requested or sampled):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = new_profile_id()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = Profiler(interval=settings.PROFILING_INTERVAL_SECONDS, async_mode="enabled")
+        self.active += 1
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            self.active -= 1
+            route = scope.get("route")
+            meta = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "trigger": "header" if requested else "sample",
+                "created_at": datetime.now(tz=timezone.utc).isoformat(),
+            }
+            try:
+                await asyncio.to_thread(_write_profile, profile_id, profiler, meta)
+            except Exception as e:
+                # a failed profile must never fail the request
+                logger.warning(f"Could not store profile {profile_id}: {e!r}")
@@ -1,56 +1,536 @@
-from sqlalchemy.orm import Session
-from google import genai
+import logging
+import re
 
-from models import AcademicSource
-from settings import settings
+from sqlalchemy import Float, cast, func, literal, select, text
+from sqlalchemy.dialects.postgresql import REGCONFIG, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from typing import Literal
+
+from pgvector.sqlalchemy import Vector
 
-# Gemini client setup
-client = genai.Client(api_key=settings.GEMINI_API_KEY)  # set your Gemini API key in settings
+from models import (
+    EMBEDDING_DIMENSION,
+    AcademicSource,
+    SourceChunk,
+    binary_embedding,
+    halfvec_embedding,
+    prefix_embedding,
+)
+from settings import settings
+from embedding_cache import embedding_cache, make_cache_key
+from vector_snapshot import vector_snapshot
+from embeddings import embedding_provider
 
-from google.genai import types
+logger = logging.getLogger("uvicorn.error")
 
-...
 
-def get_embedding(text: str, model: str = "gemini-embedding-001", dimension: int = 1536):
+def get_embedding(text: str):
     """
-    Generates an embedding for the given text using Google Gemini API.
-    
+    Generates an embedding for the given text with the configured embedding provider.
+    Results are served from the embedding cache when the same (text, model, dimension) was seen before.
+
     Args:
         text: The text to embed.
-        model: The Gemini embedding model to use.
-        dimension: Output dimension (e.g., 1536 to match DB column).
-        
+
     Returns:
         A list of floats representing the embedding vector.
     """
-    text = text.replace("\n", " ")
-    result = client.models.embed_content(
-        model=model,
-        contents=[text],
-        config=types.EmbedContentConfig(output_dimensionality=dimension)
+    key = make_cache_key(text, embedding_provider.model, embedding_provider.dimension)
+    cached = embedding_cache.get(key)
+    if cached is not None:
+        return cached
+
+    embedding = embedding_provider.embed(text)
+    embedding_cache.put(key, embedding_provider.model, embedding_provider.dimension, embedding)
+    return embedding
+
+async def aget_embedding(text: str):
+    """
+    Async variant of `get_embedding` for the request path: the provider call goes through
+    its async interface so a slow response never blocks the event loop.
+    """
+    key = make_cache_key(text, embedding_provider.model, embedding_provider.dimension)
+    cached = await embedding_cache.aget(key)
+    if cached is not None:
+        return cached
+
+    embedding = await embedding_provider.aembed(text)
+    await embedding_cache.aput(key, embedding_provider.model, embedding_provider.dimension, embedding)
+    return embedding
+
+async def aget_embeddings(texts: list[str]):
+    """
+    Embeds many texts in batched, concurrent provider calls.
+    Assignment passages are rarely seen twice, so this bypasses the embedding cache.
+
+    Returns:
+        A list of embedding vectors, in the same order as `texts`.
+    """
+    return await embedding_provider.aembed_many(texts)
+
+# --- search metrics ---
+# maps a metric name to (pgvector distance expression, distance -> similarity score)
+SEARCH_METRICS = {
+    "cosine": (
+        lambda column, vector: column.cosine_distance(vector),
+        lambda distance: 1.0 - distance,
+    ),
+    "l2": (
+        lambda column, vector: column.l2_distance(vector),
+        lambda distance: 1.0 / (1.0 + distance),
+    ),
+    # pgvector's <#> returns the negative inner product so that ascending order ranks best first
+    "inner_product": (
+        lambda column, vector: column.max_inner_product(vector),
+        lambda distance: -distance,
+    ),
+}
+SearchMetric = Literal["cosine", "l2", "inner_product"]
+
+# how the scores of a source's best passages are combined into the source score
+PASSAGE_AGGREGATES = {
+    "max": func.max,
+    "sum": func.sum,  # sum of the top `passages_per_source` passages, favours sources matching in several places
+}
+PassageAggregate = Literal["max", "sum"]
+
+# "vector": ANN over the embeddings, "lexical": full-text search only (no embedding call),
+# "hybrid": both, fused with reciprocal rank fusion
+SearchMode = Literal["vector", "lexical", "hybrid"]
+TEXT_SEARCH_CONFIG = "english"  # must match models.SEARCH_VECTOR_EXPRESSION
+
+def _query_vector(vector):
+    return cast(literal(vector, Vector(EMBEDDING_DIMENSION)), Vector(EMBEDDING_DIMENSION))
+
+
+# coarse pass over a quantized or truncated copy of the embeddings (an expression index each, see models.py),
+# maps a representation to its distance to the query; candidates are re-ranked with the full vectors
+QUANTIZED_DISTANCES = {
+    "halfvec": lambda vector: halfvec_embedding(AcademicSource.embedding).cosine_distance(
+        halfvec_embedding(_query_vector(vector))
+    ),
+    "binary": lambda vector: binary_embedding(AcademicSource.embedding).op("<~>", return_type=Float)(
+        binary_embedding(_query_vector(vector))
+    ),  # hamming distance
+    # the query's own prefix, no second embedding call
+    "matryoshka": lambda vector: prefix_embedding(AcademicSource.embedding).cosine_distance(
+        prefix_embedding(_query_vector(vector))
+    ),
+}
+Quantization = Literal["none", "halfvec", "binary", "matryoshka"]
+
+# where "vector" searches run: "pgvector" (ANN index) or "numpy" (exact, vector_snapshot.py)
+SearchBackend = Literal["pgvector", "numpy"]
+
+# columns needed to build an AcademicSourceResponse, embedding and full_text are never loaded
+SOURCE_RESPONSE_COLUMNS = (
+    AcademicSource.id,
+    AcademicSource.title,
+    AcademicSource.authors,
+    AcademicSource.publication_year,
+    AcademicSource.abstract,
+    AcademicSource.source_type,
+)
+
+
+class MatryoshkaIndexMismatch(ValueError):
+    """
+    Raised for "matryoshka" searches when the prefix index was built for another
+    dimension than MATRYOSHKA_DIMENSION, or does not exist: the planner would silently
+    fall back to a sequential scan of the table.
+    """
+
+
+PREFIX_INDEX_NAME = "ix_academic_sources_embedding_prefix"
+PREFIX_INDEX_DIMENSION = re.compile(r"subvector\(embedding, 1, (\d+)\)")
+# (checked, dimension of the prefix index) as found by check_prefix_index, unchecked in scripts
+_prefix_index: tuple[bool, int | None] = (False, None)
+
+
+async def check_prefix_index(db: AsyncSession) -> int | None:
+    """
+    Reads the dimension the Matryoshka prefix index was built with (`alembic -x
+    matryoshka_dimension`) and logs an error when it differs from MATRYOSHKA_DIMENSION.
+    From then on "matryoshka" searches fail with `MatryoshkaIndexMismatch` instead of
+    scanning the whole table.
+
+    Returns:
+        The dimension of the index, None when it does not exist.
+    """
+    global _prefix_index
+    indexdef = (await db.execute(
+        text("SELECT indexdef FROM pg_indexes WHERE indexname = :name"), {"name": PREFIX_INDEX_NAME}
+    )).scalar_one_or_none()
+    match = PREFIX_INDEX_DIMENSION.search(indexdef or "")
+    dimension = int(match.group(1)) if match else None
+    _prefix_index = (True, dimension)
+    if dimension != settings.MATRYOSHKA_DIMENSION and settings.EMBEDDING_QUANTIZATION == "matryoshka":
+        logger.error(_prefix_index_problem(dimension))
+    return dimension
+
+
+def _prefix_index_problem(dimension: int | None) -> str:
+    if dimension is None:
+        return f"There is no {PREFIX_INDEX_NAME} index, matryoshka searches would scan the table"
+    return (
+        f"{PREFIX_INDEX_NAME} was built for {dimension} dimensions but MATRYOSHKA_DIMENSION is "
+        f"{settings.MATRYOSHKA_DIMENSION}; rebuild it with `alembic -x matryoshka_dimension=...` or fix the setting"
     )
-    return result.embeddings[0].values
 
-def find_relevant_sources(query_text: str, db: Session, top_k: int = 5):
+
+def nearest_sources(query_embedding, metric: SearchMetric, limit: int, quantization: Quantization = "none"):
+    """
+    The `limit` sources nearest to the query as a (id, distance) select, closest first.
+
+    With a quantization, the quantized index yields max(QUANTIZED_RERANK_CANDIDATES, limit)
+    candidates, which are then re-ranked by their full-precision distance. The coarse pass
+    always ranks by cosine (hamming for binary), only the re-rank uses `metric`.
+    "matryoshka" searches the first MATRYOSHKA_DIMENSION dimensions of the embeddings.
+    """
+    distance_fn, _ = SEARCH_METRICS[metric]
+    if quantization == "none":
+        distance = distance_fn(AcademicSource.embedding, query_embedding)
+        return select(AcademicSource.id, distance.label("distance")).order_by(distance).limit(limit)
+    if quantization not in QUANTIZED_DISTANCES:
+        raise ValueError(f"Unknown embedding quantization: {quantization}")
+    checked, dimension = _prefix_index
+    if quantization == "matryoshka" and checked and dimension != settings.MATRYOSHKA_DIMENSION:
+        raise MatryoshkaIndexMismatch(_prefix_index_problem(dimension))
+
+    coarse_distance = QUANTIZED_DISTANCES[quantization](query_embedding)
+    candidates = (
+        select(AcademicSource.id, AcademicSource.embedding)
+        .order_by(coarse_distance)
+        .limit(max(settings.QUANTIZED_RERANK_CANDIDATES, limit))
+        .subquery("candidates")
+    )
+    distance = distance_fn(candidates.c.embedding, query_embedding)
+    return select(candidates.c.id, distance.label("distance")).order_by(distance).limit(limit)
+
+
+HNSW_MAX_EF_SEARCH = 1000  # pgvector rejects larger hnsw.ef_search values
+
+
+def _ef_search_for(quantization: Quantization, limit: int, ef_search: int | None) -> int | None:
+    # HNSW returns at most ef_search rows, the quantized pass has to cover all candidates
+    if ef_search is None and quantization != "none":
+        return min(max(settings.HNSW_EF_SEARCH or 40, settings.QUANTIZED_RERANK_CANDIDATES, limit), HNSW_MAX_EF_SEARCH)
+    return ef_search
+
+
+async def set_ann_search_params(db: AsyncSession, ef_search: int | None = None, probes: int | None = None):
+    """
+    Applies HNSW / IVFFlat query-time parameters to the current transaction only.
+
+    Args:
+        db: The database session the search will run on.
+        ef_search: Size of the HNSW candidate list, higher means better recall and slower queries.
+        probes: Number of IVFFlat lists scanned, higher means better recall and slower queries.
+    """
+    ef_search = settings.HNSW_EF_SEARCH if ef_search is None else ef_search
+    probes = settings.IVFFLAT_PROBES if probes is None else probes
+
+    # set_config(..., true) behaves like SET LOCAL but accepts bound parameters
+    if ef_search is not None:
+        await db.execute(text("SELECT set_config('hnsw.ef_search', :value, true)"), {"value": str(int(ef_search))})
+    if probes is not None:
+        await db.execute(text("SELECT set_config('ivfflat.probes', :value, true)"), {"value": str(int(probes))})
+
+
+async def find_relevant_sources(
+    query_text: str,
+    db: AsyncSession,
+    top_k: int = 5,
+    metric: SearchMetric = "cosine",
+    ef_search: int | None = None,
+    probes: int | None = None,
+    mode: SearchMode = "vector",
+    backend: SearchBackend | None = None,
+    quantization: Quantization | None = None,
+):
     """
     Finds relevant academic sources from the database using vector similarity search.
+    The ranking and the returned score are computed by Postgres in the same query,
+    or in this process with the "numpy" backend.
 
     Args:
         query_text: The text to search for (e.g., assignment topic).
-        db: The database session.
+        db: The async database session.
         top_k: The number of top results to return.
+        metric: Distance used for ranking and scoring ("cosine", "l2" or "inner_product").
+            Only the metric matching the ANN index operator class (cosine by default) uses the index.
+        ef_search: Per-query `hnsw.ef_search` override.
+        probes: Per-query `ivfflat.probes` override.
+        mode: "vector" (default), "lexical" (see `find_lexical_sources`) or "hybrid"
+            (see `find_hybrid_sources`).
+        backend: Backend of the "vector" mode, SEARCH_BACKEND by default. "numpy" only
+            serves the cosine metric and needs a snapshot, otherwise pgvector is used.
+        quantization: Coarse pgvector pass over "halfvec", "binary" or "matryoshka" (prefix)
+            embeddings, re-ranked with the full vectors, EMBEDDING_QUANTIZATION by default.
+
+    Returns:
+        A list of (AcademicSource, score) tuples, best match first. Only the response
+        columns of each source are loaded; higher scores mean more similar. Scores
+        depend on the mode: a similarity for "vector", ts_rank_cd for "lexical" and the
+        fused reciprocal rank for "hybrid".
+    """
+    if mode == "lexical":
+        return await find_lexical_sources(query_text, db, top_k=top_k)
+    if mode == "hybrid":
+        return await find_hybrid_sources(
+            query_text, db, top_k=top_k, metric=metric, ef_search=ef_search, probes=probes,
+            quantization=quantization,
+        )
+    if mode != "vector":
+        raise ValueError(f"Unknown search mode: {mode}")
+    if metric not in SEARCH_METRICS:
+        raise ValueError(f"Unknown search metric: {metric}")
+    _, score_fn = SEARCH_METRICS[metric]
+    backend = backend or settings.SEARCH_BACKEND
+    quantization = quantization or settings.EMBEDDING_QUANTIZATION
+    if backend not in ("pgvector", "numpy"):
+        raise ValueError(f"Unknown search backend: {backend}")
+
+    query_embedding = await aget_embedding(query_text)
+    if backend == "numpy" and metric == "cosine" and vector_snapshot.available():
+        return await find_snapshot_sources(query_embedding, db, top_k=top_k)
+
+    if quantization == "none":
+        distance_fn, _ = SEARCH_METRICS[metric]
+        distance = distance_fn(AcademicSource.embedding, query_embedding).label("distance")
+        statement = select(AcademicSource, distance).order_by(distance)
+    else:
+        nearest = nearest_sources(query_embedding, metric, top_k, quantization).subquery("nearest")
+        statement = (
+            select(AcademicSource, nearest.c.distance)
+            .join(nearest, nearest.c.id == AcademicSource.id)
+            .order_by(nearest.c.distance)
+        )
+
+    await set_ann_search_params(db, ef_search=_ef_search_for(quantization, top_k, ef_search), probes=probes)
+    result = await db.execute(
+        statement
+        .options(load_only(*SOURCE_RESPONSE_COLUMNS))
+        .limit(top_k)
+    )
+    rows = result.all()
+
+    return [(source, score_fn(float(dist))) for source, dist in rows]
+
+
+async def find_snapshot_sources(query_embedding, db: AsyncSession, top_k: int = 5):
+    """
+    Exact cosine search over the memory-mapped embedding snapshot (see vector_snapshot.py);
+    only the response columns of the top k sources are read from the database.
+
+    Returns:
+        A list of (AcademicSource, cosine similarity) tuples, best match first. Sources
+        deleted since the snapshot was exported are skipped.
+    """
+    ids, scores = await vector_snapshot.asearch(query_embedding, top_k)
+    if not len(ids):
+        return []
+    result = await db.execute(
+        select(AcademicSource)
+        .options(load_only(*SOURCE_RESPONSE_COLUMNS))
+        .where(AcademicSource.id.in_(ids.tolist()))
+    )
+    sources = {source.id: source for source in result.scalars()}
+    return [
+        (sources[source_id], float(score))
+        for source_id, score in zip(ids.tolist(), scores)
+        if source_id in sources
+    ]
+
+
+def _text_query(query_text: str):
+    # websearch syntax: "exact phrase", -excluded, or
+    return func.websearch_to_tsquery(literal(TEXT_SEARCH_CONFIG).cast(REGCONFIG), query_text)
+
+
+async def find_lexical_sources(query_text: str, db: AsyncSession, top_k: int = 5):
+    """
+    Full-text search over title, authors, abstract and full_text (the `search_vector`
+    GIN index). No embedding is requested, so exact phrases, author names and rare
+    terms are cheap to look up.
+
+    Returns:
+        A list of (AcademicSource, ts_rank_cd score) tuples, best match first.
+    """
+    tsquery = _text_query(query_text)
+    rank = func.ts_rank_cd(AcademicSource.search_vector, tsquery).label("rank")
+    result = await db.execute(
+        select(AcademicSource, rank)
+        .options(load_only(*SOURCE_RESPONSE_COLUMNS))
+        .where(AcademicSource.search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), AcademicSource.id)
+        .limit(top_k)
+    )
+    return [(source, float(score)) for source, score in result.all()]
+
+
+async def find_hybrid_sources(
+    query_text: str,
+    db: AsyncSession,
+    top_k: int = 5,
+    metric: SearchMetric = "cosine",
+    ef_search: int | None = None,
+    probes: int | None = None,
+    quantization: Quantization | None = None,
+):
+    """
+    Runs the lexical and the ANN search and fuses both rankings with reciprocal rank
+    fusion, score = sum over both lists of 1 / (RRF_K + rank). Both candidate lists
+    (HYBRID_CANDIDATES each) and the fusion are computed by Postgres in one query.
 
     Returns:
-        A list of AcademicSource objects.
+        A list of (AcademicSource, fused score) tuples, best match first.
     """
-    query_embedding = get_embedding(query_text)
+    if metric not in SEARCH_METRICS:
+        raise ValueError(f"Unknown search metric: {metric}")
+    candidates = max(settings.HYBRID_CANDIDATES, top_k)
+    rrf_k = settings.RRF_K
+    quantization = quantization or settings.EMBEDDING_QUANTIZATION
+
+    query_embedding = await aget_embedding(query_text)
+    # ORDER BY + LIMIT first so the ANN index is used, ranks are numbered on the result
+    nearest = nearest_sources(query_embedding, metric, candidates, quantization).subquery("nearest")
+    vector_ranked = select(
+        nearest.c.id, func.row_number().over(order_by=nearest.c.distance).label("rank")
+    ).cte("vector_ranked")
+
+    tsquery = _text_query(query_text)
+    text_rank = func.ts_rank_cd(AcademicSource.search_vector, tsquery)
+    lexical_ranked = (
+        select(
+            AcademicSource.id,
+            func.row_number().over(order_by=(text_rank.desc(), AcademicSource.id)).label("rank"),
+        )
+        .where(AcademicSource.search_vector.op("@@")(tsquery))
+        .order_by(text_rank.desc(), AcademicSource.id)
+        .limit(candidates)
+        .cte("lexical_ranked")
+    )
+
+    fused_score = (
+        func.coalesce(1.0 / (rrf_k + vector_ranked.c.rank), 0.0)
+        + func.coalesce(1.0 / (rrf_k + lexical_ranked.c.rank), 0.0)
+    )
+    fused = (
+        select(
+            func.coalesce(vector_ranked.c.id, lexical_ranked.c.id).label("id"),
+            fused_score.label("score"),
+        )
+        .select_from(vector_ranked.join(lexical_ranked, vector_ranked.c.id == lexical_ranked.c.id, full=True))
+        .subquery("fused")
+    )
+
+    await set_ann_search_params(db, ef_search=_ef_search_for(quantization, candidates, ef_search), probes=probes)
+    result = await db.execute(
+        select(AcademicSource, fused.c.score)
+        .options(load_only(*SOURCE_RESPONSE_COLUMNS))
+        .join(fused, fused.c.id == AcademicSource.id)
+        .order_by(fused.c.score.desc(), AcademicSource.id)
+        .limit(top_k)
+    )
+    return [(source, float(score)) for source, score in result.all()]
+
+
+async def find_relevant_passages(
+    query_text: str,
+    db: AsyncSession,
+    top_k: int = 5,
+    metric: SearchMetric = "cosine",
+    aggregate: PassageAggregate = "max",
+    passages_per_source: int = 3,
+    ef_search: int | None = None,
+    probes: int | None = None,
+):
+    """
+    Finds relevant academic sources by their best matching passages (`source_chunks`).
+    The nearest chunks are ranked, aggregated per source and cut into snippets by Postgres
+    in one query, so `full_text` never leaves the database.
+
+    Args:
+        query_text: The text to search for.
+        db: The async database session.
+        top_k: The number of sources to return.
+        metric: Distance used for ranking and scoring, see `find_relevant_sources`.
+        aggregate: "max" scores a source by its best passage, "sum" by the sum of its
+            top `passages_per_source` passages.
+        passages_per_source: Passages aggregated and returned per source.
+        ef_search: Per-query `hnsw.ef_search` override.
+        probes: Per-query `ivfflat.probes` override.
+
+    Returns:
+        A list of (AcademicSource, score, passages) tuples, best match first. `passages`
+        are dicts with chunk_index, start_char, end_char, similarity_score and snippet,
+        best first.
+    """
+    if metric not in SEARCH_METRICS:
+        raise ValueError(f"Unknown search metric: {metric}")
+    if aggregate not in PASSAGE_AGGREGATES:
+        raise ValueError(f"Unknown passage aggregate: {aggregate}")
+    distance_fn, score_fn = SEARCH_METRICS[metric]
+
+    query_embedding = await aget_embedding(query_text)
+    distance = distance_fn(SourceChunk.embedding, query_embedding)
+    # an HNSW scan returns at most HNSW_MAX_EF_SEARCH chunks, more candidates cannot be found
+    candidate_count = min(max(settings.PASSAGE_SEARCH_CANDIDATES, top_k * passages_per_source), HNSW_MAX_EF_SEARCH)
+
+    candidates = (
+        select(
+            SourceChunk.source_id,
+            SourceChunk.chunk_index,
+            SourceChunk.start_char,
+            SourceChunk.end_char,
+            distance.label("distance"),
+        )
+        .order_by(distance)
+        .limit(candidate_count)
+        .cte("candidates")
+    )
+    ranked = select(
+        candidates,
+        func.row_number().over(
+            partition_by=candidates.c.source_id, order_by=candidates.c.distance
+        ).label("passage_rank"),
+    ).subquery("ranked")
+
+    # score_fn works on SQL expressions too, scores are computed by the database
+    passage_score = score_fn(ranked.c.distance)
+    passage = func.json_build_object(
+        "chunk_index", ranked.c.chunk_index,
+        "start_char", ranked.c.start_char,
+        "end_char", ranked.c.end_char,
+        "similarity_score", passage_score,
+        # substr is 1-based and counts characters, like the Python offsets
+        "snippet", func.substr(
+            AcademicSource.full_text, ranked.c.start_char + 1, ranked.c.end_char - ranked.c.start_char
+        ),
+    )
+    per_source = (
+        select(
+            ranked.c.source_id,
+            PASSAGE_AGGREGATES[aggregate](passage_score).label("score"),
+            func.json_agg(aggregate_order_by(passage, ranked.c.passage_rank)).label("passages"),
+        )
+        .join(AcademicSource, AcademicSource.id == ranked.c.source_id)
+        .where(ranked.c.passage_rank <= passages_per_source)
+        .group_by(ranked.c.source_id)
+        .subquery("per_source")
+    )
 
-    # Use pgvector l2_distance operator to find nearest neighbors
-    relevant_sources = (
-        db.query(AcademicSource)
-        .order_by(AcademicSource.embedding.l2_distance(query_embedding))
+    # HNSW returns at most ef_search rows, it has to cover the candidate chunks
+    if ef_search is None:
+        ef_search = min(max(settings.HNSW_EF_SEARCH or 40, candidate_count), HNSW_MAX_EF_SEARCH)
+    await set_ann_search_params(db, ef_search=ef_search, probes=probes)
+    result = await db.execute(
+        select(AcademicSource, per_source.c.score, per_source.c.passages)
+        .options(load_only(*SOURCE_RESPONSE_COLUMNS))
+        .join(per_source, per_source.c.source_id == AcademicSource.id)
+        .order_by(per_source.c.score.desc())
         .limit(top_k)
-        .all()
     )
-    
-    return relevant_sources
\ No newline at end of file
+    return [(source, float(score), passages) for source, score, passages in result.all()]
@@ -10,9 +10,127 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     INTERNAL_API_KEY: str
     N8N_WEBHOOK_URL: str | None = None
-    GEMINI_API_KEY: str
+    N8N_HTTP_POOL_LIMIT: int = 20
+    N8N_HTTP_KEEPALIVE_SECONDS: int = 30
+    N8N_HTTP_TIMEOUT_SECONDS: int = 120
+    GEMINI_API_KEY: str | None = None  # only needed with EMBEDDING_PROVIDER=gemini
+    GEMINI_BASE_URL: str | None = None  # e.g. the stub of benchmarks/stubs.py, None uses Google's endpoint
     PORT: int = 8000
 
+    # uploads are written here while their text is extracted (see extraction.py)
+    UPLOAD_DIR: str = "/tmp/assignment-uploads"
+    UPLOAD_CHUNK_SIZE: int = 64 * 1024
+    EXTRACTION_WORKERS: int = 2
+    EXTRACTION_TIMEOUT_SECONDS: float = 60.0  # a parse running longer fails and its worker is killed
+
+    # analysis job queue (see job_queue.py), 0 workers disables the in-app worker pool
+    ANALYSIS_WORKER_CONCURRENCY: int = 4
+    JOB_POLL_INTERVAL_SECONDS: float = 2.0
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BACKOFF_SECONDS: int = 30
+    JOB_RETRY_BACKOFF_MAX_SECONDS: int = 15 * 60
+    JOB_VISIBILITY_TIMEOUT_SECONDS: int = 10 * 60
+
+    # analysis completion push (see notifications.py)
+    ANALYSIS_NOTIFY_CHANNEL: str = "analysis_status"
+    ANALYSIS_LONG_POLL_MAX_SECONDS: int = 60
+    ANALYSIS_SSE_HEARTBEAT_SECONDS: int = 15
+    ANALYSIS_RESULTS_BATCH_MAX: int = 1000  # items per POST /internal/analysis-results/batch
+
+    # connection pools (see database.create_db_engine). Every uvicorn worker opens up to
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW connections per engine (one sync, one async), keep
+    # workers * 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below Postgres max_connections.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_SLOW_CHECKOUT_MS: int = 500
+    DB_STATEMENT_TIMEOUT_MS: int = 30000  # 0 disables
+    DB_LOCK_TIMEOUT_MS: int = 5000  # 0 disables
+    DB_SLOW_QUERY_MS: int = 1000  # statements running longer are logged with their parameter shape, 0 disables
+    DB_SLOW_QUERY_EXPLAIN: bool = True  # add the EXPLAIN plan, at most once a minute per statement
+
+    # per-request profiling (see profiling.py): requests with `X-Profile: 1` and the internal API key,
+    # or this fraction of all requests, are profiled and stored in PROFILING_DIR
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL_SECONDS: float = 0.001
+    PROFILING_DIR: str = "data/profiles"
+    PROFILING_MAX_PROFILES: int = 200
+
+    # Prometheus metrics (see metrics.py), set to a directory shared by all uvicorn workers
+    # so GET /metrics aggregates every worker; None keeps per-process metrics
+    PROMETHEUS_MULTIPROC_DIR: str | None = None
+
+    # embedding provider (see embeddings.py): "gemini" or "hashing" (deterministic, local, no API calls)
+    EMBEDDING_PROVIDER: str = "gemini"
+    EMBEDDING_MODEL: str = "gemini-embedding-001"
+    EMBEDDING_MAX_CONCURRENCY: int = 8  # embedding calls in flight per process
+    EMBEDDING_TIMEOUT_SECONDS: float = 30.0  # per call, including the wait for a slot
+
+    # embedding cache (see embedding_cache.py)
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 2048
+    EMBEDDING_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    EMBEDDING_CACHE_PERSIST: bool = True
+    # rows of the embedding_cache table: ignored and pruned after the TTL, and the newest
+    # MAX_ROWS are kept; the API prunes every PRUNE_INTERVAL (None: only `python embedding_cache.py --prune`)
+    EMBEDDING_CACHE_PERSIST_TTL_SECONDS: int | None = 30 * 24 * 60 * 60
+    EMBEDDING_CACHE_PERSIST_MAX_ROWS: int | None = 500_000
+    EMBEDDING_CACHE_PRUNE_INTERVAL_SECONDS: int | None = 60 * 60
+
+    # authenticated-principal cache (see auth.py), a changed student is seen by other workers after the TTL
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CACHE_TTL_SECONDS: int = 300
+
+    # password hashing (see passwords.py), logins rehash stored passwords whose cost differs from BCRYPT_ROUNDS
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 32  # callers waiting for a worker, more are rejected with 503
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 5.0
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 2
+
+    # ANN search tuning, None keeps the pgvector defaults (ef_search=40, probes=1)
+    HNSW_EF_SEARCH: int | None = None
+    IVFFLAT_PROBES: int | None = None
+
+    # vector search backend: "pgvector" (ANN index) or "numpy" (exact search over the memory-mapped
+    # snapshot, see vector_snapshot.py), numpy falls back to pgvector while there is no snapshot
+    SEARCH_BACKEND: str = "pgvector"
+    VECTOR_SNAPSHOT_DIR: str = "data/vector_snapshot"
+    VECTOR_SNAPSHOT_RELOAD_SECONDS: float = 5.0  # how often workers check for a refreshed snapshot
+    VECTOR_SNAPSHOT_MAX_SEGMENTS: int = 16  # a refresh beyond this rewrites the snapshot as one segment
+    VECTOR_SNAPSHOT_QUANTIZATION: str = "none"  # "int8" also writes int8 codes for a coarse pass, re-ranked in float32
+
+    # two-pass vector search (see rag_service.nearest_sources): "none", "halfvec", "binary" or "matryoshka"
+    EMBEDDING_QUANTIZATION: str = "none"
+    QUANTIZED_RERANK_CANDIDATES: int = 100  # coarse candidates re-ranked with the full vectors
+    MATRYOSHKA_DIMENSION: int = 256  # prefix searched by "matryoshka", must match the index (alembic -x matryoshka_dimension)
+
+    # local plagiarism detection, changing the index settings needs `python plagiarism.py --rebuild`
+    PLAGIARISM_SHINGLE_SIZE: int = 3  # content words per shingle, stopwords are dropped
+    PLAGIARISM_NUM_PERM: int = 128
+    PLAGIARISM_LSH_BANDS: int = 64  # 2 rows per band, favours recall, candidates are verified exactly
+    PLAGIARISM_WINDOW_SHINGLES: int = 40
+    PLAGIARISM_MAX_CANDIDATES: int = 20
+    PLAGIARISM_MIN_SIMILARITY: float = 0.02  # share of the assignment a source must cover to be reported
+
+    # passage chunks (see chunking.py), changing them needs `python ingest_data.py --rechunk`
+    CHUNK_ENCODING: str = "cl100k_base"
+    CHUNK_TOKENS: int = 512
+    CHUNK_OVERLAP_TOKENS: int = 64
+    PASSAGE_SEARCH_CANDIDATES: int = 100  # nearest chunks fetched before they are aggregated to sources
+
+    # hybrid search (see rag_service.find_hybrid_sources)
+    HYBRID_CANDIDATES: int = 50  # taken from each of the lexical and the vector ranking
+    RRF_K: int = 60  # reciprocal rank fusion constant, higher flattens the rank differences
+
+    # whole-assignment similarity (see similarity.py)
+    SIMILARITY_PASSAGE_TOKENS: int = 256
+    SIMILARITY_PASSAGE_OVERLAP_TOKENS: int = 32
+    SIMILARITY_CANDIDATES_PER_PASSAGE: int = 10  # nearest chunks fetched per passage for the similarity matrix
+    SIMILARITY_MATCHES_PER_PASSAGE: int = 3
+    SIMILARITY_THRESHOLD: float = 0.75  # cosine similarity
+
 
     class Config:
         env_file = ".env"
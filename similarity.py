@@ -0,0 +1,161 @@
+"""
+Whole-assignment similarity against the passages of the academic sources.
+
+Instead of one search (one embedding call, one database round trip) per query string,
+an assignment is analyzed in one pass:
+
+1. its `original_text` is split into passages (token-aware, see chunking.py),
+2. all passages are embedded in batched, concurrent embedding calls (see embeddings.py),
+3. the nearest source chunks of every passage are fetched, with their vectors,
+   in a single query (one HNSW lookup per passage through a LATERAL join),
+4. the full passage x candidate cosine similarity matrix is computed with one
+   float32 matmul, and `argpartition` picks the best matches of every passage.
+"""
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chunking import chunk_text
+from models import (
+    AcademicSource,
+    AssignmentPassageMatches,
+    AssignmentSimilarityReport,
+    PassageMatch,
+)
+from rag_service import aget_embeddings, set_ann_search_params
+from settings import settings
+
+# --- constants ---
+# the vectors come back as real[] so asyncpg decodes them without a pgvector codec
+CANDIDATE_CHUNKS_SQL = text(
+    """
+    SELECT DISTINCT ON (c.source_id, c.chunk_index)
+        c.source_id, c.chunk_index, c.start_char, c.end_char, CAST(c.embedding AS real[]) AS embedding
+    FROM unnest(CAST(:queries AS text[])) AS q(vector)
+    CROSS JOIN LATERAL (
+        SELECT source_id, chunk_index, start_char, end_char, embedding
+        FROM source_chunks
+        ORDER BY embedding <=> CAST(q.vector AS vector)
+        LIMIT :per_passage
+    ) AS c
+    ORDER BY c.source_id, c.chunk_index
+    """
+)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.float32(1e-12))
+
+
+def best_matches(
+    passage_vectors: np.ndarray,
+    candidate_vectors: np.ndarray,
+    top_n: int,
+    threshold: float,
+) -> list[list[tuple[int, float]]]:
+    """
+    Cosine similarity of every passage with every candidate, best first.
+
+    Args:
+        passage_vectors: (passages, dimension) embeddings of the assignment passages.
+        candidate_vectors: (candidates, dimension) embeddings of the candidate chunks.
+        top_n: Matches kept per passage.
+        threshold: Minimum cosine similarity of a match.
+
+    Returns:
+        For every passage, (candidate row, similarity) pairs above the threshold.
+    """
+    if not len(passage_vectors) or not len(candidate_vectors):
+        return [[] for _ in range(len(passage_vectors))]
+
+    passages = _normalize(np.asarray(passage_vectors, dtype=np.float32))
+    candidates = _normalize(np.asarray(candidate_vectors, dtype=np.float32))
+    scores = passages @ candidates.T  # (passages, candidates)
+
+    top_n = min(top_n, scores.shape[1])
+    # unordered top n of every row in O(candidates), then only those n are sorted
+    top = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    return [
+        [(int(column), float(score)) for column, score in zip(row, row_scores) if score >= threshold]
+        for row, row_scores in zip(top, top_scores)
+    ]
+
+
+async def analyze_assignment(
+    db: AsyncSession,
+    assignment_text: str,
+    threshold: float | None = None,
+    matches_per_passage: int | None = None,
+) -> AssignmentSimilarityReport:
+    """
+    Matches every passage of an assignment against the source chunks in one pass.
+
+    Args:
+        db: The async database session.
+        assignment_text: The assignment's `original_text`.
+        threshold: Minimum cosine similarity of a match (default `settings.SIMILARITY_THRESHOLD`).
+        matches_per_passage: Matches kept per passage (default `settings.SIMILARITY_MATCHES_PER_PASSAGE`).
+
+    Returns:
+        The passages of the assignment, each with its best source chunks above the threshold.
+    """
+    threshold = settings.SIMILARITY_THRESHOLD if threshold is None else threshold
+    matches_per_passage = matches_per_passage or settings.SIMILARITY_MATCHES_PER_PASSAGE
+
+    passages = chunk_text(
+        assignment_text,
+        chunk_tokens=settings.SIMILARITY_PASSAGE_TOKENS,
+        overlap_tokens=settings.SIMILARITY_PASSAGE_OVERLAP_TOKENS,
+    )
+    if not passages:
+        return AssignmentSimilarityReport(passages=[])
+
+    passage_vectors = np.asarray(await aget_embeddings([passage.text for passage in passages]), dtype=np.float32)
+
+    per_passage = max(settings.SIMILARITY_CANDIDATES_PER_PASSAGE, matches_per_passage)
+    await set_ann_search_params(db, ef_search=max(settings.HNSW_EF_SEARCH or 40, per_passage))
+    result = await db.execute(
+        CANDIDATE_CHUNKS_SQL,
+        {
+            # pgvector's text form of a vector is the same as a JSON array
+            "queries": ["[" + ",".join(map(str, vector.tolist())) + "]" for vector in passage_vectors],
+            "per_passage": per_passage,
+        },
+    )
+    candidates = result.all()
+    candidate_vectors = np.asarray([row.embedding for row in candidates], dtype=np.float32)
+
+    titles = {}
+    if candidates:
+        source_ids = {row.source_id for row in candidates}
+        title_rows = await db.execute(
+            select(AcademicSource.id, AcademicSource.title).where(AcademicSource.id.in_(source_ids))
+        )
+        titles = dict(title_rows.all())
+
+    matches = best_matches(passage_vectors, candidate_vectors, matches_per_passage, threshold)
+    return AssignmentSimilarityReport(passages=[
+        AssignmentPassageMatches(
+            passage_index=passage.index,
+            start_char=passage.start_char,
+            end_char=passage.end_char,
+            matches=[
+                PassageMatch(
+                    source_id=candidates[column].source_id,
+                    title=titles.get(candidates[column].source_id),
+                    chunk_index=candidates[column].chunk_index,
+                    start_char=candidates[column].start_char,
+                    end_char=candidates[column].end_char,
+                    similarity=round(score, 4),
+                )
+                for column, score in passage_matches
+            ],
+        )
+        for passage, passage_matches in zip(passages, matches)
+    ])
@@ -0,0 +1,432 @@
+"""
+Exact nearest-neighbour search over a memory-mapped snapshot of `academic_sources.embedding`.
+
+Up to a few hundred thousand sources, a brute-force matmul over a contiguous
+float32 matrix in the API process is faster than an ANN round trip to Postgres,
+and exact. The snapshot lives in VECTOR_SNAPSHOT_DIR:
+
+    manifest.json                 dimension and the list of segments
+    segment-000001.vectors.npy    (rows, dimension) float32, L2-normalized once at export
+    segment-000001.ids.npy        (rows,) int64 academic_sources.id of every row
+    segment-000001.int8.npy       (rows, dimension) int8 codes, with VECTOR_SNAPSHOT_QUANTIZATION=int8
+
+With int8 codes (a quarter of the float32 size), the search scans the codes and
+re-ranks the best QUANTIZED_RERANK_CANDIDATES rows with their float32 vectors, so
+only those rows of the float32 file are ever paged in.
+
+Segments are opened with `np.load(mmap_mode="r")`, so every uvicorn worker maps
+the same page-cache pages instead of holding its own copy. Ingestion appends a
+segment with the sources whose ids are not in the snapshot yet (`refresh_snapshot`),
+so a source committed after one with a higher id is not missed; workers notice the
+changed manifest within VECTOR_SNAPSHOT_RELOAD_SECONDS. Exports and refreshes hold
+a Postgres advisory lock, so concurrent runs never write the same generation. Once there are more than
+VECTOR_SNAPSHOT_MAX_SEGMENTS segments, a refresh rewrites the snapshot as one.
+Updated or deleted sources are only picked up by a full export:
+
+    python vector_snapshot.py --export
+    python vector_snapshot.py --refresh
+
+Only cosine similarity is served from the snapshot, see rag_service.find_relevant_sources.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+from models import AcademicSource
+from settings import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# --- constants ---
+MANIFEST = "manifest.json"
+EXPORT_BATCH_SIZE = 2000
+SCAN_BLOCK_ROWS = 1024  # int8 rows converted to float32 at a time, small enough to stay in cache
+SEGMENT_FILES = ("vectors", "ids", "int8")
+SNAPSHOT_LOCK_KEY = 7318402019  # pg_advisory_lock key of exports and refreshes
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.float32(1e-12))
+
+
+# --- writing ---
+def read_manifest(path: str | Path) -> dict | None:
+    try:
+        with open(Path(path) / MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(path: Path, manifest: dict):
+    # readers only ever see a complete manifest
+    tmp = path / f"{MANIFEST}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path / MANIFEST)
+
+
+def _write_int8_codes(path: Path, name: str, vectors: np.ndarray) -> float:
+    """
+    Scalar-quantizes normalized vectors with one scale per segment, returns the scale.
+    """
+    max_abs = max(
+        (float(np.abs(vectors[start:start + SCAN_BLOCK_ROWS]).max()) for start in range(0, len(vectors), SCAN_BLOCK_ROWS)),
+        default=1.0,
+    )
+    scale = 127.0 / max(max_abs, 1e-12)
+    codes_tmp = path / f"{name}.int8.tmp.npy"
+    codes = np.lib.format.open_memmap(codes_tmp, mode="w+", dtype=np.int8, shape=vectors.shape)
+    for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+        block = vectors[start:start + SCAN_BLOCK_ROWS]
+        codes[start:start + len(block)] = np.clip(np.rint(block * scale), -127, 127)
+    codes.flush()
+    del codes
+    os.replace(codes_tmp, path / f"{name}.int8.npy")
+    return scale
+
+
+def write_segment(
+    path: str | Path, name: str, rows: int, dimension: int, batches, quantization: str = "none"
+) -> dict:
+    """
+    Writes one segment from `batches` of (ids, vectors) arrays, normalizing the vectors,
+    plus int8 codes with `quantization="int8"`. The files are written under temporary
+    names and renamed once complete.
+
+    Returns:
+        The manifest entry of the segment.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    vectors_tmp = path / f"{name}.vectors.tmp.npy"
+    ids_tmp = path / f"{name}.ids.tmp.npy"
+
+    vectors = np.lib.format.open_memmap(vectors_tmp, mode="w+", dtype=np.float32, shape=(rows, dimension))
+    ids = np.lib.format.open_memmap(ids_tmp, mode="w+", dtype=np.int64, shape=(rows,))
+    written = 0
+    for batch_ids, batch_vectors in batches:
+        end = written + len(batch_ids)
+        if end > rows:
+            raise ValueError(f"Segment {name} got more than the expected {rows} rows")
+        ids[written:end] = batch_ids
+        vectors[written:end] = _normalize(np.asarray(batch_vectors, dtype=np.float32))
+        written = end
+    if written != rows:
+        raise ValueError(f"Segment {name} got {written} of the expected {rows} rows")
+    vectors.flush()
+    ids.flush()
+    segment = {"name": name, "rows": rows, "dimension": dimension}
+    if quantization == "int8":
+        segment["int8_scale"] = _write_int8_codes(path, name, vectors)
+    elif quantization != "none":
+        raise ValueError(f"Unknown snapshot quantization: {quantization}")
+    del vectors, ids
+
+    os.replace(vectors_tmp, path / f"{name}.vectors.npy")
+    os.replace(ids_tmp, path / f"{name}.ids.npy")
+    return segment
+
+
+def _source_batches(db: Session, ids: np.ndarray, batch_size: int = EXPORT_BATCH_SIZE):
+    for start in range(0, len(ids), batch_size):
+        batch_ids = ids[start:start + batch_size]
+        rows = db.execute(
+            select(AcademicSource.id, AcademicSource.embedding)
+            .where(AcademicSource.id.in_(batch_ids.tolist()))
+            .order_by(AcademicSource.id)
+        ).all()
+        if len(rows) != len(batch_ids):
+            raise ValueError("Sources changed during the export, the session must use REPEATABLE READ")
+        yield (
+            np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows)),
+            np.stack([np.asarray(row.embedding, dtype=np.float32) for row in rows]),
+        )
+
+
+def _export_new(db: Session, path: Path, name: str, exported_ids: np.ndarray) -> dict | None:
+    # one consistent view for the ids and the batches, the session must not be in a transaction yet
+    db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    try:
+        return _write_new(db, path, name, exported_ids)
+    finally:
+        db.commit()
+
+
+def _write_new(db: Session, path: Path, name: str, exported_ids: np.ndarray) -> dict | None:
+    """
+    Writes the sources with an embedding whose id is not in `exported_ids` (sorted) as
+    one segment. Comparing id sets, not an id watermark, picks up a source whose
+    transaction committed after the last refresh had exported a higher id.
+    """
+    committed = np.fromiter(
+        db.execute(
+            select(AcademicSource.id).where(AcademicSource.embedding.is_not(None)).order_by(AcademicSource.id)
+        ).scalars(),
+        dtype=np.int64,
+    )
+    ids = np.setdiff1d(committed, exported_ids, assume_unique=True)
+    if not len(ids):
+        return None
+    dimension = len(db.execute(
+        select(AcademicSource.embedding).where(AcademicSource.id == int(ids[0]))
+    ).scalar_one())
+    return write_segment(
+        path, name, len(ids), dimension, _source_batches(db, ids),
+        quantization=settings.VECTOR_SNAPSHOT_QUANTIZATION,
+    )
+
+
+def _snapshot_ids(path: Path, manifest: dict) -> np.ndarray:
+    """
+    Sorted ids of every row in the snapshot.
+    """
+    ids = [np.load(path / f"{s['name']}.ids.npy", mmap_mode="r") for s in manifest["segments"]]
+    return np.unique(np.concatenate(ids)) if ids else np.empty(0, dtype=np.int64)
+
+
+@contextmanager
+def _snapshot_lock(db: Session):
+    """
+    Serializes exports and refreshes across processes and hosts, each reads the manifest
+    and writes the next generation under the lock. The lock lives on a connection of its
+    own, the session commits in between.
+    """
+    with db.get_bind().connect() as conn:
+        # an export can take minutes, waiting for it must not hit the server-side timeouts
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        conn.execute(text("SET LOCAL lock_timeout = 0"))
+        conn.execute(select(func.pg_advisory_lock(SNAPSHOT_LOCK_KEY)))
+        try:
+            yield
+        finally:
+            conn.execute(select(func.pg_advisory_unlock(SNAPSHOT_LOCK_KEY)))
+
+
+def _segment_name(number: int) -> str:
+    return f"segment-{number:06d}"
+
+
+def _export_all(db: Session, path: Path, previous: dict | None) -> int:
+    previous = previous or {"generation": 0, "segments": []}
+    generation = previous["generation"] + 1
+
+    segment = _export_new(db, path, _segment_name(generation), np.empty(0, dtype=np.int64))
+    segments = [segment] if segment else []
+    _write_manifest(path, {
+        "generation": generation,
+        "dimension": segment["dimension"] if segment else None,
+        "segments": segments,
+    })
+    # workers that still map the old files keep reading them until they reload
+    for old in previous["segments"]:
+        for suffix in SEGMENT_FILES:
+            (path / f"{old['name']}.{suffix}.npy").unlink(missing_ok=True)
+    return sum(s["rows"] for s in segments)
+
+
+def export_snapshot(db: Session, path: str | Path | None = None) -> int:
+    """
+    Rewrites the snapshot from every source with an embedding, as a single segment.
+    Returns the number of exported rows.
+    """
+    path = Path(path or settings.VECTOR_SNAPSHOT_DIR)
+    with _snapshot_lock(db):
+        return _export_all(db, path, read_manifest(path))
+
+
+def refresh_snapshot(db: Session, path: str | Path | None = None) -> int:
+    """
+    Appends the sources ingested since the last export or refresh as a new segment
+    (sources with an embedding whose id is in no segment yet). Falls back to a full
+    export when there is no snapshot yet or too many segments.
+
+    Returns:
+        The number of rows added or exported.
+    """
+    path = Path(path or settings.VECTOR_SNAPSHOT_DIR)
+    with _snapshot_lock(db):
+        manifest = read_manifest(path)
+        if manifest is None or len(manifest["segments"]) >= settings.VECTOR_SNAPSHOT_MAX_SEGMENTS:
+            return _export_all(db, path, manifest)
+
+        generation = manifest["generation"] + 1
+        segment = _export_new(db, path, _segment_name(generation), _snapshot_ids(path, manifest))
+        if segment is None:
+            return 0
+        if manifest["dimension"] not in (None, segment["dimension"]):
+            for suffix in SEGMENT_FILES:
+                (path / f"{segment['name']}.{suffix}.npy").unlink(missing_ok=True)
+            raise ValueError(
+                f"New embeddings have {segment['dimension']} dimensions, the snapshot {manifest['dimension']}; "
+                "re-export it with `python vector_snapshot.py --export`"
+            )
+        _write_manifest(path, {
+            "generation": generation,
+            "dimension": segment["dimension"],
+            "segments": manifest["segments"] + [segment],
+        })
+        return segment["rows"]
+
+
+# --- searching ---
+class VectorSnapshot:
+    """
+    Read side of a snapshot directory, one instance per worker process.
+    """
+
+    def __init__(self, path: str | Path, reload_seconds: float = 5.0):
+        self.path = Path(path)
+        self.reload_seconds = reload_seconds
+        self.generation = None
+        self.dimension = None
+        # (ids, vectors, int8 codes or None)
+        self._segments: list[tuple[np.ndarray, np.ndarray, np.ndarray | None]] = []
+        self._manifest_mtime = None
+        self._checked_at = 0.0
+        self.searches = 0
+
+    @property
+    def rows(self) -> int:
+        return sum(len(segment[0]) for segment in self._segments)
+
+    def _load(self):
+        manifest = read_manifest(self.path)
+        if manifest is None:
+            self._segments = []
+            self.generation = None
+            return
+        self._segments = [
+            (
+                np.load(self.path / f"{s['name']}.ids.npy", mmap_mode="r"),
+                np.load(self.path / f"{s['name']}.vectors.npy", mmap_mode="r"),
+                # one scale per segment does not change the ranking, it is only kept in the manifest
+                np.load(self.path / f"{s['name']}.int8.npy", mmap_mode="r") if "int8_scale" in s else None,
+            )
+            for s in manifest["segments"]
+        ]
+        self.generation = manifest["generation"]
+        self.dimension = manifest["dimension"]
+        logger.info(f"Loaded vector snapshot generation {self.generation} ({self.rows} rows)")
+
+    def maybe_reload(self):
+        """
+        Re-opens the snapshot when its manifest changed, checked at most every `reload_seconds`.
+        """
+        now = time.monotonic()
+        if self._manifest_mtime is not None and now - self._checked_at < self.reload_seconds:
+            return
+        self._checked_at = now
+        try:
+            mtime = (self.path / MANIFEST).stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = 0
+        if mtime != self._manifest_mtime:
+            try:
+                self._load()
+            except (OSError, ValueError) as e:
+                # a full export removed the files between reading the manifest and opening them
+                logger.warning(f"Could not load the vector snapshot, retrying later: {e!r}")
+                return
+            self._manifest_mtime = mtime
+
+    def available(self) -> bool:
+        self.maybe_reload()
+        return self.rows > 0
+
+    @staticmethod
+    def _segment_top_k(vectors, codes, query, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        if codes is None:
+            scores = vectors @ query  # (rows,), vectors are normalized at export
+            k = min(top_k, len(scores))
+            # unordered top k in O(rows), merged and sorted by the caller
+            top = np.argpartition(-scores, k - 1)[:k]
+            return top, scores[top]
+
+        coarse = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            block = codes[start:start + SCAN_BLOCK_ROWS]
+            coarse[start:start + len(block)] = block.astype(np.float32) @ query
+        candidates = min(max(settings.QUANTIZED_RERANK_CANDIDATES, top_k), len(coarse))
+        # sorted rows read the float32 file front to back
+        rows = np.sort(np.argpartition(-coarse, candidates - 1)[:candidates])
+        scores = vectors[rows] @ query
+        k = min(top_k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return rows[top], scores[top]
+
+    def search(self, query_vector, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Cosine top k over all segments, exact for float32 segments and re-ranked from
+        the int8 candidates for quantized ones.
+
+        Returns:
+            (ids, similarities) arrays, best match first.
+        """
+        self.maybe_reload()
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        best_ids, best_scores = [], []
+        for ids, vectors, codes in self._segments:
+            if not len(ids) or top_k <= 0:
+                continue
+            top, scores = self._segment_top_k(vectors, codes, query, top_k)
+            best_ids.append(ids[top])
+            best_scores.append(scores)
+        self.searches += 1
+        if not best_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        ids = np.concatenate(best_ids)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return ids[order], scores[order]
+
+    async def asearch(self, query_vector, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        # numpy releases the GIL in the matmul, the event loop keeps serving requests
+        return await asyncio.to_thread(self.search, query_vector, top_k)
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "generation": self.generation,
+            "rows": self.rows,
+            "segments": len(self._segments),
+            "dimension": self.dimension,
+            "searches": self.searches,
+        }
+
+
+vector_snapshot = VectorSnapshot(settings.VECTOR_SNAPSHOT_DIR, settings.VECTOR_SNAPSHOT_RELOAD_SECONDS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the memory-mapped embedding snapshot.")
+    parser.add_argument("--export", action="store_true", help="Rewrite the snapshot from every source")
+    parser.add_argument("--refresh", action="store_true", help="Append the sources ingested since the last run")
+    parser.add_argument("--path", help="Snapshot directory (default: settings.VECTOR_SNAPSHOT_DIR)")
+    args = parser.parse_args()
+    if not (args.export or args.refresh):
+        parser.print_help()
+    else:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            if args.export:
+                print(f"Exported {export_snapshot(db, args.path)} embeddings.")
+            else:
+                print(f"Added {refresh_snapshot(db, args.path)} embeddings.")
+        finally:
+            db.close()